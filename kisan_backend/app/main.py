@@ -1,22 +1,60 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 
 from app.models import models
-from app.models.database import engine
+from app.models.database import async_engine, engine
+from app.models.migrations import upgrade_schema
+from app.models.eligibility import register_listeners as register_eligibility_listeners
+from app.models.diagnosis_ml import start_loading, shutdown as shutdown_diagnosis
+from app.models.alerts import start_scheduler as start_alerts, stop_scheduler as stop_alerts
+from app.models.upload_store import start_cleanup as start_upload_cleanup, stop_cleanup as stop_upload_cleanup
+from app.models.metrics import METRICS_ENABLED
+from app.routes.metrics_routes import MetricsMiddleware
+from app.routes.compression import CompressionMiddleware
 
 # Routers
 from app.routes.user_routes import router as user_router
 from app.routes.login_routes import router as login_router
 from app.routes.market_routes import router as market_router
-from app.routes.diagnosis_routes import router as diagnosis_router
+from app.routes.diagnosis_routes import PredictSizeLimitMiddleware, router as diagnosis_router
 from app.routes.scheme_routes import router as scheme_router
 from app.routes.notification_routes import router as notification_router
 from app.routes.help_routes import router as help_router
+from app.routes.sync_routes import router as sync_router
 from app.routes.voice_agent_routes import router as voice_agent_router
+from app.routes.health_routes import router as health_router
+from app.routes.metrics_routes import router as metrics_router
 
 models.Base.metadata.create_all(bind=engine)
+upgrade_schema(engine, models.Base.metadata)
+# Profile and scheme writes refresh scheme_eligibility in the same transaction
+register_eligibility_listeners()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Loads and warms up the CNN in a background thread; /predict answers 503 until it's ready
+    start_loading()
+    # Price-threshold alerts: drains ingest's price_events every ALERTS_INTERVAL_S (ALERTS_ENABLED=0 to disable)
+    start_alerts()
+    # Photo retention: every UPLOAD_CLEANUP_INTERVAL_S, drops old photos and keeps the store under UPLOAD_MAX_TOTAL_BYTES
+    start_upload_cleanup()
+    yield
+    stop_upload_cleanup()
+    stop_alerts()
+    shutdown_diagnosis()
+    await async_engine.dispose()
+
 
-app = FastAPI(title="Kisan+ Backend", version="1.0.0")
+# orjson renders every JSON response; the cacheable GETs skip jsonable_encoder as well
+app = FastAPI(title="Kisan+ Backend", version="1.0.0", lifespan=lifespan, default_response_class=ORJSONResponse)
+
+# Oversized /predict uploads get a 413 from their Content-Length, before the body is read;
+# added first so CORS headers still go on that 413
+app.add_middleware(PredictSizeLimitMiddleware)
 
 # CORS MUST COME BEFORE ROUTERS
 app.add_middleware(
@@ -31,6 +69,13 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# gzip/brotli above COMPRESS_MIN_BYTES; streams pass through
+app.add_middleware(CompressionMiddleware)
+
+# Outermost, so its latency covers compression, CORS and error handling too (METRICS_ENABLED=0 to disable)
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
 # ROUTERS
 app.include_router(login_router)
 app.include_router(user_router)
@@ -39,7 +84,10 @@ app.include_router(diagnosis_router)
 app.include_router(scheme_router)
 app.include_router(notification_router)
 app.include_router(help_router)
+app.include_router(sync_router)
 app.include_router(voice_agent_router)
+app.include_router(health_router)
+app.include_router(metrics_router)
 
 
 @app.get("/")
@@ -0,0 +1,240 @@
+# app/models/alerts.py
+# Price-threshold alerts. Ingest writes a PriceEvent (old -> new latest price) for every crop/mandi
+# whose price changed; a scheduled job drains those events, finds the crossed PriceAlerts through a
+# sorted in-memory index and writes all resulting Notifications with one bulk insert per batch.
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left, bisect_right
+
+from apscheduler.schedulers.background import BackgroundScheduler
+from sqlalchemy import bindparam, delete, insert, select, update
+
+from app.models.database import engine as default_engine
+from app.models.data_versions import get_data_version
+from app.models.models import Notification, PriceAlert, PriceEvent
+from app.models.notification_hub import notification_hub
+
+logger = logging.getLogger(__name__)
+
+ALERTS_ENABLED = os.environ.get("ALERTS_ENABLED", "1") == "1"
+ALERTS_INTERVAL_S = float(os.environ.get("ALERTS_INTERVAL_S", "60"))
+# Events claimed (and notifications written) per transaction
+ALERTS_BATCH_SIZE = int(os.environ.get("ALERTS_BATCH_SIZE", "5000"))
+
+NOTIFICATION_TYPE = "price_alert"
+
+
+def record_price_events(conn, current_rows, before, after):
+    """
+    Queue a PriceEvent for each key whose latest price changed in this ingest chunk.
+
+    before: {(crop_key, mandi_key): (last_date, last_price)} read before the stats refresh,
+    after: the refreshed stats dicts. Keys with no earlier price have nothing to cross from.
+    """
+    names = {(r["crop_key"], r["mandi_key"]): (r["crop"], r["mandi"]) for r in current_rows}
+    events = []
+    for s in after:
+        key = (s["crop_key"], s["mandi_key"])
+        previous = before.get(key)
+        if previous is None or previous[1] is None or previous[1] == s["last_price"]:
+            continue
+        crop, mandi = names.get(key, (s["crop_key"], s["mandi_key"]))
+        events.append({
+            "crop": crop, "mandi": mandi, "crop_key": key[0], "mandi_key": key[1],
+            "price_date": s["last_date"], "old_price": previous[1], "new_price": s["last_price"],
+        })
+    if events:
+        conn.execute(insert(PriceEvent), events)
+    return len(events)
+
+
+class ThresholdIndex:
+    """
+    Active alerts bucketed by (crop_key, mandi_key, direction), thresholds sorted ascending.
+
+    A move old -> new crosses "above" alerts with old < threshold <= new and "below" alerts with
+    new <= threshold < old: two bisects per bucket, independent of how many alerts exist.
+    Alerts without a mandi live under mandi_key None and match every mandi of their crop.
+    """
+
+    def __init__(self, rows=()):
+        # rows: (alert_id, user_id, crop_key, mandi_key, direction, threshold)
+        grouped = {}
+        for alert_id, user_id, crop_key, mandi_key, direction, threshold in rows:
+            grouped.setdefault((crop_key, mandi_key, direction), []).append((threshold, alert_id, user_id))
+        self._buckets = {}
+        for key, items in grouped.items():
+            items.sort()
+            self._buckets[key] = ([t for t, _, _ in items], [(a, u, t) for t, a, u in items])
+        self.size = sum(len(items) for items in grouped.values())
+
+    def match(self, crop_key, mandi_key, old_price, new_price):
+        """Crossed alerts as (alert_id, user_id, threshold, direction) tuples."""
+        if new_price == old_price:
+            return []
+        direction = "above" if new_price > old_price else "below"
+        matched = []
+        for mk in (mandi_key, None):
+            bucket = self._buckets.get((crop_key, mk, direction))
+            if bucket is None:
+                continue
+            thresholds, alerts = bucket
+            if direction == "above":
+                lo, hi = bisect_right(thresholds, old_price), bisect_right(thresholds, new_price)
+            else:
+                lo, hi = bisect_left(thresholds, new_price), bisect_left(thresholds, old_price)
+            matched.extend((a, u, t, direction) for a, u, t in alerts[lo:hi])
+        return matched
+
+
+def _format_price(value):
+    return f"{value:,.2f}".rstrip("0").rstrip(".")
+
+
+def notification_content(event, threshold, direction):
+    word = "risen above" if direction == "above" else "fallen below"
+    return (
+        f"{event.crop} at {event.mandi} has {word} your alert of Rs {_format_price(threshold)}: "
+        f"now Rs {_format_price(event.new_price)} (was Rs {_format_price(event.old_price)})"
+    )
+
+
+class AlertEngine:
+    def __init__(self, engine=default_engine, batch_size=ALERTS_BATCH_SIZE):
+        self.engine = engine
+        self.batch_size = batch_size
+        self.index = None
+        self._index_version = None
+        self._lock = threading.Lock()
+        self.runs = 0
+        self.events = 0
+        self.notifications = 0
+        self.last_run = None
+
+    def _refresh_index(self, conn):
+        # Rebuilt only when price_alerts changed (its data version is bumped on every ORM write)
+        version = get_data_version(conn, "price_alerts")
+        if self.index is not None and version == self._index_version:
+            return
+        rows = conn.execute(
+            select(PriceAlert.id, PriceAlert.user_id, PriceAlert.crop_key, PriceAlert.mandi_key,
+                   PriceAlert.direction, PriceAlert.threshold)
+            .where(PriceAlert.active.is_(True))
+        ).all()
+        self.index = ThresholdIndex(rows)
+        self._index_version = version
+
+    def _drain_batch(self, conn):
+        # DELETE ... RETURNING claims the events, so two app processes never notify twice
+        claim = select(PriceEvent.id).order_by(PriceEvent.id).limit(self.batch_size).scalar_subquery()
+        events = conn.execute(
+            delete(PriceEvent).where(PriceEvent.id.in_(claim)).returning(
+                PriceEvent.id, PriceEvent.crop, PriceEvent.mandi, PriceEvent.crop_key, PriceEvent.mandi_key,
+                PriceEvent.price_date, PriceEvent.old_price, PriceEvent.new_price,
+            )
+        ).all()
+        events.sort(key=lambda e: e.id)  # RETURNING order isn't guaranteed
+        matches = [
+            (event, match) for event in events
+            for match in self.index.match(event.crop_key, event.mandi_key, event.old_price, event.new_price)
+        ]
+        if not matches:
+            return len(events), 0
+
+        # An alert fires at most once per price date: a day re-ingested, or a price bouncing
+        # across the threshold within one day, doesn't notify again
+        last_fired = self._last_triggered(conn, {alert_id for _, (alert_id, _, _, _) in matches})
+        fired = {}
+        notifications = []
+        for event, (alert_id, user_id, threshold, direction) in matches:
+            last = last_fired.get(alert_id)
+            if event.price_date is not None and last is not None and event.price_date <= last:
+                continue
+            if event.price_date is not None:
+                last_fired[alert_id] = fired[alert_id] = event.price_date
+            notifications.append({
+                "user_id": user_id,
+                "type": NOTIFICATION_TYPE,
+                "content": notification_content(event, threshold, direction),
+                "read_flag": False,
+            })
+        if notifications:
+            conn.execute(insert(Notification), notifications)
+        if fired:
+            # Core executemany: not an ORM write, so the price_alerts data version (and index) stays put
+            conn.execute(
+                update(PriceAlert.__table__).where(PriceAlert.__table__.c.id == bindparam("alert_id"))
+                .values(last_triggered_date=bindparam("price_date")),
+                [{"alert_id": a, "price_date": d} for a, d in fired.items()],
+            )
+        return len(events), len(notifications)
+
+    def _last_triggered(self, conn, alert_ids):
+        ids = sorted(alert_ids)
+        last = {}
+        for start in range(0, len(ids), 500):
+            last.update(conn.execute(
+                select(PriceAlert.id, PriceAlert.last_triggered_date)
+                .where(PriceAlert.id.in_(ids[start:start + 500]), PriceAlert.last_triggered_date.is_not(None))
+            ).all())
+        return last
+
+    def run_once(self):
+        """Drain every pending price event; returns a report dict."""
+        with self._lock:
+            started = time.perf_counter()
+            events = notifications = 0
+            while True:
+                with self.engine.begin() as conn:
+                    self._refresh_index(conn)
+                    n_events, n_notes = self._drain_batch(conn)
+                events += n_events
+                notifications += n_notes
+                if n_events < self.batch_size:
+                    break
+            elapsed = time.perf_counter() - started
+            self.runs += 1
+            self.events += events
+            self.notifications += notifications
+            self.last_run = {"events": events, "notifications": notifications, "seconds": round(elapsed, 3)}
+            if notifications:
+                notification_hub.wake()  # push to connected streams now instead of on the next poll
+            if events:
+                logger.info("Price alerts: %d events -> %d notifications in %.2fs", events, notifications, elapsed)
+            return self.last_run
+
+    def stats(self):
+        return {
+            "enabled": ALERTS_ENABLED,
+            "interval_s": ALERTS_INTERVAL_S,
+            "active_alerts": self.index.size if self.index is not None else None,
+            "runs": self.runs,
+            "events": self.events,
+            "notifications": self.notifications,
+            "last_run": self.last_run,
+        }
+
+
+alert_engine = AlertEngine()
+_scheduler = None
+
+
+def start_scheduler():
+    global _scheduler
+    if not ALERTS_ENABLED or _scheduler is not None:
+        return
+    _scheduler = BackgroundScheduler(daemon=True)
+    _scheduler.add_job(
+        alert_engine.run_once, "interval", seconds=ALERTS_INTERVAL_S,
+        id="price_alerts", max_instances=1, coalesce=True,
+    )
+    _scheduler.start()
+
+
+def stop_scheduler():
+    global _scheduler
+    if _scheduler is not None:
+        _scheduler.shutdown(wait=False)
+        _scheduler = None
@@ -0,0 +1,142 @@
+# app/models/batcher.py
+import asyncio
+import os
+import time
+from collections import deque
+
+import numpy as np
+
+# Tuning knobs: bigger batches = more throughput, longer wait = worse tail latency
+MAX_BATCH_SIZE = int(os.environ.get("DIAGNOSIS_MAX_BATCH_SIZE", "16"))
+MAX_WAIT_MS = float(os.environ.get("DIAGNOSIS_MAX_WAIT_MS", "10"))
+
+# How many recent batches to keep for the stats percentiles
+STATS_WINDOW = 1000
+
+
+class MicroBatcher:
+    """
+    Collects concurrent single-image predictions into one batched forward pass.
+
+    Callers await submit(img) with a (224,224,3) array; a background task takes
+    the first queued image, waits up to max_wait_ms for up to max_batch_size - 1
+    more, stacks them and runs predict_fn once, then resolves each caller's future.
+    Up to max_in_flight batches predict at once (one per inference process); the
+    next batch keeps collecting while they run.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_WAIT_MS, executor=None, max_in_flight=1):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.executor = executor
+        self.max_in_flight = max(1, int(max_in_flight))
+
+        self._queue = None
+        self._worker = None
+        self._loop = None
+        self._slots = None
+        self._in_flight = set()
+
+        self.total_requests = 0
+        self.total_batches = 0
+        self.total_errors = 0
+        self._batch_sizes = deque(maxlen=STATS_WINDOW)
+        self._wait_ms = deque(maxlen=STATS_WINDOW)
+        self._predict_ms = deque(maxlen=STATS_WINDOW)
+
+    def _ensure_worker(self):
+        loop = asyncio.get_running_loop()
+        # (Re)start the worker if this is the first call or the loop changed (tests, reloads)
+        if self._worker is None or self._worker.done() or self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._slots = asyncio.Semaphore(self.max_in_flight)
+            self._worker = loop.create_task(self._run())
+
+    async def submit(self, img_array):
+        self._ensure_worker()
+        future = self._loop.create_future()
+        await self._queue.put((img_array, future, time.perf_counter()))
+        return await future
+
+    async def _collect(self):
+        first = await self._queue.get()
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+        # Drain anything that is already waiting without blocking further
+        while len(batch) < self.max_batch_size and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _run(self):
+        while True:
+            # Wait for a free slot first: while every slot is busy, requests keep queueing into the next batch
+            slots = self._slots
+            await slots.acquire()
+            try:
+                batch = await self._collect()
+            except BaseException:
+                slots.release()
+                raise
+            task = self._loop.create_task(self._predict(batch, slots))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+
+    async def _predict(self, batch, slots):
+        started = time.perf_counter()
+        for _, _, enqueued in batch:
+            self._wait_ms.append((started - enqueued) * 1000.0)
+        self._batch_sizes.append(len(batch))
+        self.total_batches += 1
+        self.total_requests += len(batch)
+
+        try:
+            stacked = np.stack([img for img, _, _ in batch]).astype(np.float32, copy=False)
+            results = await self._loop.run_in_executor(self.executor, self.predict_fn, stacked)
+        except Exception as e:
+            self.total_errors += 1
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            self._predict_ms.append((time.perf_counter() - started) * 1000.0)
+            slots.release()
+
+        for (_, future, _), result in zip(batch, results):
+            # Caller may have gone away (client disconnect cancels the await)
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self):
+        def pct(values, q):
+            return round(float(np.percentile(values, q)), 3) if values else 0.0
+
+        sizes = list(self._batch_sizes)
+        waits = list(self._wait_ms)
+        predict = list(self._predict_ms)
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "max_in_flight": self.max_in_flight,
+            "in_flight": len(self._in_flight),
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "total_requests": self.total_requests,
+            "total_batches": self.total_batches,
+            "total_errors": self.total_errors,
+            "batch_size": {
+                "mean": round(sum(sizes) / len(sizes), 3) if sizes else 0.0,
+                "max": max(sizes) if sizes else 0,
+            },
+            "wait_ms": {"p50": pct(waits, 50), "p95": pct(waits, 95), "p99": pct(waits, 99)},
+            "predict_ms": {"p50": pct(predict, 50), "p95": pct(predict, 95), "p99": pct(predict, 99)},
+        }
@@ -0,0 +1,36 @@
+# app/models/data_versions.py
+from sqlalchemy import event, select, update, insert
+from sqlalchemy.orm import Session
+
+from app.models.models import DataVersion, MarketPrice, PriceAlert, Scheme
+
+# ORM writes to these models bump their dataset's version automatically (bulk writes call bump_data_version)
+TRACKED_MODELS = {
+    MarketPrice: "market_prices",
+    PriceAlert: "price_alerts",
+    Scheme: "schemes",
+}
+
+def bump_data_version(conn, name):
+    # conn: Session or Connection; runs inside the caller's transaction
+    result = conn.execute(update(DataVersion).where(DataVersion.name == name).values(version=DataVersion.version + 1))
+    if result.rowcount == 0:
+        conn.execute(insert(DataVersion).values(name=name, version=1))
+
+def get_data_version(conn, name):
+    return conn.execute(select(DataVersion.version).where(DataVersion.name == name)).scalar() or 0
+
+def get_data_stamp(conn, name):
+    # (version, updated_at); (0, None) before the dataset's first write
+    row = conn.execute(select(DataVersion.version, DataVersion.updated_at).where(DataVersion.name == name)).first()
+    return (row.version, row.updated_at) if row else (0, None)
+
+@event.listens_for(Session, "after_flush")
+def _bump_tracked_versions(session, flush_context):
+    changed = {
+        TRACKED_MODELS[type(obj)]
+        for obj in (*session.new, *session.dirty, *session.deleted)
+        if type(obj) in TRACKED_MODELS
+    }
+    for name in changed:
+        bump_data_version(session.connection(), name)
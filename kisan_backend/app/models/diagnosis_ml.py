@@ -1,28 +1,279 @@
-import tensorflow as tf
-from PIL import Image
+from PIL import Image, UnidentifiedImageError
 import numpy as np
+import io
+import logging
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-# Load model ONCE at module level
-MODEL_PATH = r"C:\Users\admin\KisanAI\kisan_backend\app\models\Model_Cnn.h5"  # Change path if needed
-model = tf.keras.models.load_model(MODEL_PATH)
+from app.models.metrics import DIAGNOSIS_BATCH, DIAGNOSIS_STAGE, timed
+
+logger = logging.getLogger(__name__)
+
+# Defaults to Model_Cnn.h5 next to this file
+MODEL_PATH = os.environ.get(
+    "DIAGNOSIS_MODEL_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "Model_Cnn.h5")
+)
+
+# Inference backend: "keras" (the .h5 as trained), "tflite" or "onnx" (exported with app.models.export_model)
+DIAGNOSIS_BACKEND = os.environ.get("DIAGNOSIS_BACKEND", "keras").lower()
+# TFLite flavour to load: "float16" or "int8"
+DIAGNOSIS_QUANTIZATION = os.environ.get("DIAGNOSIS_QUANTIZATION", "float16").lower()
+# Threads per TFLite/ONNX Runtime interpreter (0 = let the runtime decide)
+DIAGNOSIS_BACKEND_THREADS = int(os.environ.get("DIAGNOSIS_BACKEND_THREADS", "0"))
+
+def exported_model_path(backend, quantization=DIAGNOSIS_QUANTIZATION, base_path=MODEL_PATH):
+    # Model_Cnn.h5 -> Model_Cnn.float16.tflite / Model_Cnn.int8.tflite / Model_Cnn.onnx
+    stem = os.path.splitext(base_path)[0]
+    if backend == "tflite":
+        return f"{stem}.{quantization}.tflite"
+    if backend == "onnx":
+        return f"{stem}.onnx"
+    return base_path
+
+class KerasBackend:
+    def __init__(self, path):
+        import tensorflow as tf
+        self.model = tf.keras.models.load_model(path)
+
+    def predict(self, batch):
+        return self.model.predict(batch, verbose=0)
+
+class TFLiteBackend:
+    def __init__(self, path, num_threads=DIAGNOSIS_BACKEND_THREADS):
+        try:
+            from tflite_runtime.interpreter import Interpreter  # small CPU-only wheel
+        except ImportError:
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+        self.interpreter = Interpreter(model_path=path, num_threads=num_threads or None)
+        self.interpreter.allocate_tensors()
+        self.input = self.interpreter.get_input_details()[0]
+        self.output = self.interpreter.get_output_details()[0]
+        self.batch_size = int(self.input["shape"][0])
+        # Interpreters hold mutable tensor buffers, so one call at a time
+        self.lock = threading.Lock()
+
+    def predict(self, batch):
+        with self.lock:
+            if len(batch) != self.batch_size:
+                self.interpreter.resize_tensor_input(self.input["index"], [len(batch), 224, 224, 3])
+                self.interpreter.allocate_tensors()
+                self.input = self.interpreter.get_input_details()[0]
+                self.output = self.interpreter.get_output_details()[0]
+                self.batch_size = len(batch)
+            self.interpreter.set_tensor(self.input["index"], self._quantize(batch))
+            self.interpreter.invoke()
+            return self._dequantize(self.interpreter.get_tensor(self.output["index"]))
+
+    def _quantize(self, batch):
+        scale, zero_point = self.input["quantization"]
+        if self.input["dtype"] == np.float32 or not scale:
+            return batch.astype(self.input["dtype"], copy=False)
+        info = np.iinfo(self.input["dtype"])
+        return np.clip(np.round(batch / scale + zero_point), info.min, info.max).astype(self.input["dtype"])
+
+    def _dequantize(self, preds):
+        scale, zero_point = self.output["quantization"]
+        if self.output["dtype"] == np.float32 or not scale:
+            return preds.astype(np.float32, copy=False)
+        return (preds.astype(np.float32) - zero_point) * scale
+
+class OnnxBackend:
+    def __init__(self, path, num_threads=DIAGNOSIS_BACKEND_THREADS):
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(path, sess_options=options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def predict(self, batch):
+        return self.session.run(None, {self.input_name: batch.astype(np.float32, copy=False)})[0]
+
+BACKENDS = {"keras": KerasBackend, "tflite": TFLiteBackend, "onnx": OnnxBackend}
+
+def load_backend(name=DIAGNOSIS_BACKEND, path=None):
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown DIAGNOSIS_BACKEND {name!r}, expected one of {sorted(BACKENDS)}")
+    return BACKENDS[name](path or exported_model_path(name))
+
+BACKEND_PATH = exported_model_path(DIAGNOSIS_BACKEND)
+
+# Inference worker processes per API process (0 = run the model inside the API process).
+# With a pool, API workers never import TensorFlow; each pool process holds one model copy.
+# Every uvicorn worker starts its own pool, so a node runs workers x DIAGNOSIS_POOL_SIZE model
+# processes: use one API worker per node with the pool, or size the two together.
+DIAGNOSIS_POOL_SIZE = int(os.environ.get("DIAGNOSIS_POOL_SIZE", "0"))
+# Largest batch a pool worker takes in one go (size of its shared-memory slot)
+DIAGNOSIS_POOL_MAX_BATCH = int(os.environ.get("DIAGNOSIS_POOL_MAX_BATCH", "32"))
+DIAGNOSIS_POOL_TASK_TIMEOUT = float(os.environ.get("DIAGNOSIS_POOL_TASK_TIMEOUT", "60"))
+# Restarting a crashed worker: much shorter than a first load, it blocks a shared executor thread
+DIAGNOSIS_POOL_RESTART_TIMEOUT = float(os.environ.get("DIAGNOSIS_POOL_RESTART_TIMEOUT", "30"))
+
+# Batch shapes run once after loading so the first real requests don't pay for graph/kernel setup
+WARMUP_BATCH_SIZES = [int(n) for n in os.environ.get("DIAGNOSIS_WARMUP_BATCH_SIZES", "1,16").split(",") if n.strip()]
+
+# A failed load (model file still syncing, OOM in warm-up) is retried by the next start_loading()
+# after this many seconds, doubling per consecutive failure up to DIAGNOSIS_LOAD_RETRY_MAX_S
+DIAGNOSIS_LOAD_RETRY_S = float(os.environ.get("DIAGNOSIS_LOAD_RETRY_S", "30"))
+DIAGNOSIS_LOAD_RETRY_MAX_S = float(os.environ.get("DIAGNOSIS_LOAD_RETRY_MAX_S", "600"))
+
+# Loaded ONCE, on first use or by start_loading() at app startup, never at import:
+# the API must boot (and serve everything else) even when the model is slow or missing
+model = None
+_model_lock = threading.Lock()
+_state = {"status": "not_loaded", "error": None, "load_s": None, "warmup_s": None, "failures": 0}
+_retry_at = 0.0
+
+def get_model():
+    global model
+    if model is None:
+        with _model_lock:
+            if model is None:
+                if DIAGNOSIS_POOL_SIZE > 0:
+                    from app.models.worker_pool import InferencePool
+                    model = InferencePool(
+                        DIAGNOSIS_POOL_SIZE, DIAGNOSIS_BACKEND, BACKEND_PATH,
+                        capacity=DIAGNOSIS_POOL_MAX_BATCH, task_timeout=DIAGNOSIS_POOL_TASK_TIMEOUT,
+                        restart_timeout=DIAGNOSIS_POOL_RESTART_TIMEOUT,
+                    )
+                else:
+                    model = load_backend(DIAGNOSIS_BACKEND, BACKEND_PATH)
+    return model
+
+def shutdown():
+    # Stops pool workers and frees their shared memory; in-process backends need nothing
+    if hasattr(model, "close"):
+        model.close()
+
+def warm_up(batch_sizes=WARMUP_BATCH_SIZES):
+    for n in batch_sizes:
+        predict_batch(np.zeros((n, 224, 224, 3), dtype=np.float32))
+
+def _load_and_warm_up():
+    global model, _retry_at
+    try:
+        started = time.perf_counter()
+        get_model()
+        _state["load_s"] = round(time.perf_counter() - started, 3)
+        _state["status"] = "warming_up"
+        started = time.perf_counter()
+        warm_up()
+        _state["warmup_s"] = round(time.perf_counter() - started, 3)
+        _state.update(status="ready", error=None, failures=0)
+        logger.info("Diagnosis model %s ready (load %.1fs, warm-up %.1fs)", BACKEND_PATH, _state["load_s"], _state["warmup_s"])
+    except Exception as e:
+        logger.exception("Diagnosis model %s failed to load", BACKEND_PATH)
+        with _model_lock:
+            # A model that loaded but failed warm-up is dropped too: the retry starts clean
+            if hasattr(model, "close"):
+                model.close()
+            model = None
+            _state["failures"] += 1
+            _retry_at = time.monotonic() + min(DIAGNOSIS_LOAD_RETRY_S * 2 ** (_state["failures"] - 1), DIAGNOSIS_LOAD_RETRY_MAX_S)
+            _state["status"] = "failed"
+            _state["error"] = f"{type(e).__name__}: {e}"
+
+def start_loading():
+    # Load + warm up in the background; safe to call repeatedly. After a failure, only
+    # starts again once the retry backoff has passed
+    with _model_lock:
+        if _state["status"] == "failed" and time.monotonic() >= _retry_at:
+            logger.info("Retrying diagnosis model load (attempt %d)", _state["failures"] + 1)
+        elif _state["status"] != "not_loaded":
+            return
+        _state["status"] = "loading"
+    threading.Thread(target=_load_and_warm_up, name="diagnosis-loader", daemon=True).start()
+
+def pool_unavailable_for():
+    # Seconds until a crashed inference pool could take work again (0 without a pool)
+    return model.unavailable_for() if hasattr(model, "unavailable_for") else 0.0
+
+def model_status():
+    status = {"backend": DIAGNOSIS_BACKEND, "path": BACKEND_PATH, **_state}
+    if _state["status"] == "failed":
+        status["retry_in_s"] = round(max(0.0, _retry_at - time.monotonic()), 1)
+    if hasattr(model, "stats"):
+        status["pool"] = model.stats()
+    return status
+
+def _model_version(path):
+    # Cached predictions are only valid for the weights (and quantization) that produced them
+    if os.environ.get("DIAGNOSIS_MODEL_VERSION"):
+        return os.environ["DIAGNOSIS_MODEL_VERSION"]
+    if os.path.exists(path):
+        stat = os.stat(path)
+        return f"{os.path.basename(path)}:{stat.st_size}:{int(stat.st_mtime)}"
+    return os.path.basename(path)
+
+MODEL_VERSION = _model_version(BACKEND_PATH)
 
 # Get class names (match order that Keras used during training)
 CLASS_NAMES = ['Pepper_bact_spot', 'Pepper_healthy', 'Potato_early_blight', 'Potato_healthy']
 # Or load dynamically:
 # CLASS_NAMES = list(train_generator.class_indices.keys()) — but hardcoded here for backend.
 
+# Dedicated pool for CPU-bound decode/resize/predict so the event loop keeps serving other routes
+DIAGNOSIS_WORKERS = int(os.environ.get("DIAGNOSIS_WORKERS", "2"))
+# Plus one thread per pool process: batches waiting on a pool worker must not starve decoding
+executor = ThreadPoolExecutor(max_workers=DIAGNOSIS_WORKERS + DIAGNOSIS_POOL_SIZE, thread_name_prefix="diagnosis")
+
+def _to_array(img):
+    img = img.convert("RGB").resize((224, 224))
+    return np.asarray(img, dtype=np.float32) / 255.0  # shape: (224,224,3)
+
 def preprocess_image(image_path):
-    img = Image.open(image_path).convert("RGB")
-    img = img.resize((224, 224))
-    img_array = np.array(img) / 255.0
-    img_array = np.expand_dims(img_array, axis=0)  # shape: (1,224,224,3)
-    return img_array
+    with timed(DIAGNOSIS_STAGE, "preprocess"), Image.open(image_path) as img:
+        img_array = _to_array(img)
+    return np.expand_dims(img_array, axis=0)  # shape: (1,224,224,3)
+
+def preprocess_bytes(data):
+    # Decode an upload straight from memory, no temp file
+    with timed(DIAGNOSIS_STAGE, "preprocess"), Image.open(io.BytesIO(data)) as img:
+        return _to_array(img)  # shape: (224,224,3)
+
+def preprocess_file(path):
+    # Decode a stored upload from disk; PIL reads it as it decodes
+    with timed(DIAGNOSIS_STAGE, "preprocess"), Image.open(path) as img:
+        return _to_array(img)  # shape: (224,224,3)
+
+def preprocess_batch(blobs, out=None):
+    # Decode many uploads into one preallocated float32 batch.
+    # Undecodable images are skipped; returns (batch, positions of the decoded blobs, {position: error})
+    if out is None or len(out) < len(blobs):
+        out = np.empty((len(blobs), 224, 224, 3), dtype=np.float32)
+    positions, errors = [], {}
+    started = time.perf_counter()
+    for i, data in enumerate(blobs):
+        try:
+            with Image.open(io.BytesIO(data)) as img:
+                out[len(positions)] = np.asarray(img.convert("RGB").resize((224, 224)), dtype=np.uint8)
+        except (UnidentifiedImageError, OSError):
+            errors[i] = "Not a valid image"
+            continue
+        positions.append(i)
+    batch = out[:len(positions)]
+    # In place, and the same division as _to_array: multiplying by 1/255 rounds differently,
+    # which would give /predict and /predict/batch different cache fingerprints for one photo
+    np.divide(batch, 255.0, out=batch)
+    DIAGNOSIS_STAGE.observe(time.perf_counter() - started, "preprocess")
+    return batch, positions, errors
+
+def predict_batch(batch):
+    # batch shape: (N,224,224,3) -> one forward pass, one result dict per row
+    DIAGNOSIS_BATCH.observe(len(batch))
+    with timed(DIAGNOSIS_STAGE, "predict"):
+        preds = get_model().predict(batch)
+    class_idx = np.argmax(preds, axis=1)
+    confidence = np.max(preds, axis=1)
+    return [
+        {"disease": CLASS_NAMES[int(i)], "confidence": float(c)}
+        for i, c in zip(class_idx, confidence)
+    ]
 
 def classify_disease(image_path):
     img_array = preprocess_image(image_path)
-    pred = model.predict(img_array)
-    class_idx = np.argmax(pred)
-    disease = CLASS_NAMES[class_idx]
-    confidence = float(np.max(pred))  # Optionally return confidence score
-    return {"disease": disease, "confidence": confidence}
+    return predict_batch(img_array)[0]
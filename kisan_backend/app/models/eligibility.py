@@ -0,0 +1,208 @@
+# app/models/eligibility.py
+# Scheme eligibility. Scheme.eligibility_criteria holds JSON rules, e.g.
+#
+#   {"state": ["Karnataka", "Tamil Nadu"], "district": "Mandya", "land_size": {"max": 2}, "crops": ["paddy", "ragi"]}
+#
+# Every key is optional; listed values match case-insensitively, land_size bounds are inclusive and
+# crops match if the farmer grows any of them. Anything that isn't a JSON object (legacy free text)
+# places no restriction. Deadlines are checked when reading, since they expire without any write.
+#
+# Matches are precomputed into scheme_eligibility: a scheme write re-evaluates it against all users
+# with SQL filters, a profile write re-evaluates that user against all schemes. Both compare
+# normalize_key'd values (the SQL side reads the users.*_key copies), so they always agree.
+# register_listeners() (called by app.main) hooks this into ORM flushes. Rebuild everything:
+#
+#   python -m app.models.eligibility --rebuild
+import argparse
+import json
+import time
+from functools import lru_cache
+
+from sqlalchemy import bindparam, delete, event, false, inspect, insert, literal, or_, select, update
+from sqlalchemy.orm import Session
+
+from app.models.data_versions import bump_data_version
+from app.models.models import Scheme, SchemeEligibility, User, crop_keys, joined_crop_keys, normalize_key
+
+# User columns the rules read; changing any of them refreshes that user's matches
+PROFILE_FIELDS = ("state", "district", "land_size", "crops")
+
+
+def _keys(value):
+    if value is None:
+        return frozenset()
+    if isinstance(value, str):
+        value = [value]
+    return frozenset(normalize_key(str(v)) for v in value if str(v).strip())
+
+
+def _like_escape(value):
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _as_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class EligibilityRule:
+    def __init__(self, states=frozenset(), districts=frozenset(), crops=frozenset(), min_land=None, max_land=None):
+        self.states = states
+        self.districts = districts
+        self.crops = crops
+        self.min_land = min_land
+        self.max_land = max_land
+
+    def sql_filters(self):
+        """Conditions on User for the bulk evaluation, exactly equivalent to matches()."""
+        filters = []
+        if self.states:
+            filters.append(User.state_key.in_(sorted(self.states)))
+        if self.districts:
+            filters.append(User.district_key.in_(sorted(self.districts)))
+        if self.min_land is not None:
+            filters.append(User.land_size >= self.min_land)
+        if self.max_land is not None:
+            filters.append(User.land_size <= self.max_land)
+        if self.crops:
+            # A key with a comma can never equal one of a user's comma-separated crops
+            patterns = [User.crops_key.like(f"%,{_like_escape(k)},%", escape="\\") for k in sorted(self.crops) if "," not in k]
+            filters.append(or_(*patterns) if patterns else false())
+        return filters
+
+    def matches_crops(self, crops):
+        return not self.crops or not self.crops.isdisjoint(crop_keys(crops))
+
+    def matches(self, user):
+        if self.states and normalize_key(user.state or "") not in self.states:
+            return False
+        if self.districts and normalize_key(user.district or "") not in self.districts:
+            return False
+        if self.min_land is not None or self.max_land is not None:
+            land = _as_float(user.land_size)
+            if land is None:
+                return False
+            if self.min_land is not None and land < self.min_land:
+                return False
+            if self.max_land is not None and land > self.max_land:
+                return False
+        return self.matches_crops(user.crops)
+
+
+@lru_cache(maxsize=1024)
+def compile_rule(criteria):
+    """EligibilityRule for an eligibility_criteria string (cached: schemes rarely change)."""
+    try:
+        rules = json.loads(criteria) if criteria else {}
+    except ValueError:
+        rules = {}
+    if not isinstance(rules, dict):
+        return EligibilityRule()
+    land = rules.get("land_size") or {}
+    return EligibilityRule(
+        states=_keys(rules.get("state")),
+        districts=_keys(rules.get("district")),
+        crops=_keys(rules.get("crops")),
+        min_land=_as_float(land.get("min")) if isinstance(land, dict) else None,
+        max_land=_as_float(land.get("max")) if isinstance(land, dict) else None,
+    )
+
+
+def refresh_scheme(conn, scheme_id, criteria):
+    """Recompute one scheme's matches over the whole users table."""
+    conn.execute(delete(SchemeEligibility).where(SchemeEligibility.scheme_id == scheme_id))
+    result = conn.execute(insert(SchemeEligibility).from_select(
+        ["user_id", "scheme_id"], select(User.id, literal(scheme_id)).where(*compile_rule(criteria).sql_filters())
+    ))
+    return result.rowcount
+
+
+def refresh_user(conn, user):
+    """Recompute one user's matches against every scheme."""
+    conn.execute(delete(SchemeEligibility).where(SchemeEligibility.user_id == user.id))
+    schemes = conn.execute(select(Scheme.id, Scheme.eligibility_criteria)).all()
+    matched = [{"user_id": user.id, "scheme_id": s.id} for s in schemes if compile_rule(s.eligibility_criteria).matches(user)]
+    if matched:
+        conn.execute(insert(SchemeEligibility), matched)
+    return len(matched)
+
+
+def fill_user_keys(conn):
+    """Set users.*_key where they're missing (rows written outside the ORM); returns rows updated."""
+    rows = conn.execute(
+        select(User.id, User.state, User.district, User.crops).where(or_(
+            User.state_key.is_(None) & User.state.is_not(None),
+            User.district_key.is_(None) & User.district.is_not(None),
+            User.crops_key.is_(None) & User.crops.is_not(None),
+        ))
+    ).all()
+    if rows:
+        conn.execute(
+            update(User.__table__).where(User.__table__.c.id == bindparam("user_id")).values(
+                state_key=bindparam("s"), district_key=bindparam("d"), crops_key=bindparam("c")
+            ),
+            [{"user_id": r.id, "s": normalize_key(r.state) or None, "d": normalize_key(r.district) or None,
+              "c": joined_crop_keys(r.crops)} for r in rows],
+        )
+    return len(rows)
+
+
+def rebuild_all(conn):
+    # Bulk user loads bypass the ORM listener that sets the keys the SQL filters read
+    fill_user_keys(conn)
+    schemes = conn.execute(select(Scheme.id, Scheme.eligibility_criteria)).all()
+    matches = sum(refresh_scheme(conn, s.id, s.eligibility_criteria) for s in schemes)
+    # Bulk scheme loads bypass the ORM's version bump; this is the step that follows them
+    bump_data_version(conn, "schemes")
+    return matches
+
+
+def _changed(obj, fields):
+    state = inspect(obj)
+    return any(state.attrs[f].history.has_changes() for f in fields)
+
+
+def _refresh_eligibility(session, flush_context):
+    # Same transaction as the write, so a committed profile or scheme is never served stale matches
+    conn = session.connection()
+    for obj in session.deleted:
+        if isinstance(obj, Scheme):
+            conn.execute(delete(SchemeEligibility).where(SchemeEligibility.scheme_id == obj.id))
+        elif isinstance(obj, User):
+            conn.execute(delete(SchemeEligibility).where(SchemeEligibility.user_id == obj.id))
+    for obj in (*session.new, *session.dirty):
+        if isinstance(obj, Scheme) and (obj in session.new or _changed(obj, ("eligibility_criteria",))):
+            refresh_scheme(conn, obj.id, obj.eligibility_criteria)
+        elif isinstance(obj, User) and (obj in session.new or _changed(obj, PROFILE_FIELDS)):
+            refresh_user(conn, obj)
+
+
+def register_listeners():
+    """Keep scheme_eligibility in step with ORM writes of users and schemes (idempotent)."""
+    if not event.contains(Session, "after_flush", _refresh_eligibility):
+        event.listen(Session, "after_flush", _refresh_eligibility)
+
+
+def main():
+    from app.models.database import engine
+    from app.models.migrations import upgrade_schema
+    from app.models.models import Base
+
+    parser = argparse.ArgumentParser(description="Maintain precomputed scheme eligibility")
+    parser.add_argument("--rebuild", action="store_true", help="recompute scheme_eligibility for every scheme")
+    args = parser.parse_args()
+    if not args.rebuild:
+        parser.error("nothing to do (use --rebuild)")
+
+    Base.metadata.create_all(bind=engine)
+    upgrade_schema(engine, Base.metadata)
+    started = time.perf_counter()
+    with engine.begin() as conn:
+        matches = rebuild_all(conn)
+    print(json.dumps({"matches": matches, "seconds": round(time.perf_counter() - started, 3)}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+# export_model.py (run from project root)
+# Converts the Keras .h5 into the lighter CPU formats served by DIAGNOSIS_BACKEND=tflite/onnx.
+#
+#   python -m app.models.export_model --format tflite --quantization float16
+#   python -m app.models.export_model --format tflite --quantization int8 --calibration-dir samples/leaves
+#   python -m app.models.export_model --format onnx
+#
+# int8 needs a few hundred representative leaf photos to calibrate activation ranges.
+# ONNX export needs tf2onnx (pip install tf2onnx); TFLite only needs TensorFlow.
+import argparse
+import os
+
+import numpy as np
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+
+
+def list_images(directory, limit=None):
+    paths = sorted(
+        os.path.join(root, name)
+        for root, _, files in os.walk(directory)
+        for name in files
+        if name.lower().endswith(IMAGE_EXTENSIONS)
+    )
+    return paths[:limit] if limit else paths
+
+
+def export_tflite(model, output_path, quantization, calibration_dir=None, calibration_size=200):
+    import tensorflow as tf
+    from app.models.diagnosis_ml import preprocess_image
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if quantization == "float16":
+        converter.target_spec.supported_types = [tf.float16]
+    elif quantization == "int8":
+        if not calibration_dir:
+            raise SystemExit("--calibration-dir is required for int8 quantization")
+        samples = list_images(calibration_dir, calibration_size)
+        if not samples:
+            raise SystemExit(f"No images found under {calibration_dir}")
+
+        def representative_dataset():
+            for path in samples:
+                yield [preprocess_image(path).astype(np.float32)]
+
+        converter.representative_dataset = representative_dataset
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        converter.inference_input_type = tf.int8
+        converter.inference_output_type = tf.int8
+    else:
+        raise SystemExit(f"Unknown quantization {quantization!r}")
+
+    with open(output_path, "wb") as f:
+        f.write(converter.convert())
+
+
+def export_onnx(model, output_path):
+    import tensorflow as tf
+    import tf2onnx
+
+    spec = (tf.TensorSpec((None, 224, 224, 3), tf.float32, name="input"),)
+    tf2onnx.convert.from_keras(model, input_signature=spec, opset=13, output_path=output_path)
+
+
+def main():
+    from app.models.diagnosis_ml import MODEL_PATH, exported_model_path
+
+    parser = argparse.ArgumentParser(description="Export the crop disease model for CPU inference")
+    parser.add_argument("--format", choices=["tflite", "onnx"], required=True)
+    parser.add_argument("--quantization", choices=["float16", "int8"], default="float16", help="TFLite only")
+    parser.add_argument("--model-path", default=MODEL_PATH, help="source .h5 model")
+    parser.add_argument("--output", help="defaults to the path DIAGNOSIS_BACKEND loads from")
+    parser.add_argument("--calibration-dir", help="sample images for int8 calibration")
+    parser.add_argument("--calibration-size", type=int, default=200)
+    args = parser.parse_args()
+
+    import tensorflow as tf
+
+    model = tf.keras.models.load_model(args.model_path)
+    output = args.output or exported_model_path(args.format, args.quantization, args.model_path)
+    if args.format == "tflite":
+        export_tflite(model, output, args.quantization, args.calibration_dir, args.calibration_size)
+    else:
+        export_onnx(model, output)
+
+    size_mb = os.path.getsize(output) / (1024 * 1024)
+    source_mb = os.path.getsize(args.model_path) / (1024 * 1024)
+    print(f"Exported {output} ({size_mb:.1f} MB, source {source_mb:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+# app/models/help_search.py
+# Full-text search over help_history (query and result), so farmers can find an earlier answer
+# instead of asking again.
+#
+# SQLite: an external-content FTS5 table (the text is stored once, in help_history) kept in sync by
+# triggers on every insert/update/delete, whoever writes the row. user_id is indexed as an FTS
+# column, so "this user's rows matching these words" is one doclist intersection inside FTS5.
+# PostgreSQL: a generated tsvector column with a GIN index, maintained by the database itself.
+# The index finds a user's matching rows; the newest HELP_SEARCH_CANDIDATES of them are ranked here.
+import logging
+import math
+import os
+import re
+
+from sqlalchemy import DateTime, text
+from sqlalchemy.exc import OperationalError
+
+logger = logging.getLogger(__name__)
+
+# Text search configuration for PostgreSQL. "simple" (no stemming) suits mixed-language questions
+HELP_SEARCH_PG_CONFIG = os.environ.get("HELP_SEARCH_PG_CONFIG", "simple")
+# Newest matching rows ranked per search; bounds the cost for users with very long histories
+HELP_SEARCH_CANDIDATES = int(os.environ.get("HELP_SEARCH_CANDIDATES", "500"))
+# Relative weight of a hit in the question vs. in the answer
+QUERY_WEIGHT, RESULT_WEIGHT = 10.0, 4.0
+
+_SPLIT = re.compile(r"[\s\"'()*:^.,;!?+\-/]+")
+
+FTS_TABLE = "help_history_fts"
+
+_SQLITE_DDL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    " query, result, user_id, content='help_history', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    f"CREATE TRIGGER IF NOT EXISTS help_history_fts_ai AFTER INSERT ON help_history BEGIN"
+    f" INSERT INTO {FTS_TABLE}(rowid, query, result, user_id) VALUES (new.id, new.query, new.result, new.user_id); END",
+    f"CREATE TRIGGER IF NOT EXISTS help_history_fts_ad AFTER DELETE ON help_history BEGIN"
+    f" INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, query, result, user_id) VALUES ('delete', old.id, old.query, old.result, old.user_id); END",
+    f"CREATE TRIGGER IF NOT EXISTS help_history_fts_au AFTER UPDATE ON help_history BEGIN"
+    f" INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, query, result, user_id) VALUES ('delete', old.id, old.query, old.result, old.user_id);"
+    f" INSERT INTO {FTS_TABLE}(rowid, query, result, user_id) VALUES (new.id, new.query, new.result, new.user_id); END",
+]
+
+
+def _pg_config():
+    if not re.fullmatch(r"[a-z_]+", HELP_SEARCH_PG_CONFIG):
+        raise ValueError(f"Invalid HELP_SEARCH_PG_CONFIG: {HELP_SEARCH_PG_CONFIG!r}")
+    return HELP_SEARCH_PG_CONFIG
+
+
+def ensure_search_index(conn):
+    """Create the search index if missing (idempotent); returns True if it was created now."""
+    dialect = conn.dialect.name
+    if dialect == "sqlite":
+        exists = conn.execute(text("SELECT 1 FROM sqlite_master WHERE name = :name"), {"name": FTS_TABLE}).first()
+        if exists:
+            return False
+        try:
+            conn.execute(text(_SQLITE_DDL[0]))
+        except OperationalError:
+            logger.warning("SQLite was built without FTS5; /help/search is disabled")
+            return False
+        for ddl in _SQLITE_DDL[1:]:
+            conn.execute(text(ddl))
+        # Index the rows written before the table existed
+        conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+        return True
+    if dialect == "postgresql":
+        exists = conn.execute(text(
+            "SELECT 1 FROM information_schema.columns WHERE table_name = 'help_history' AND column_name = 'search_vector'"
+        )).first()
+        if exists:
+            return False
+        config = _pg_config()
+        conn.execute(text(
+            "ALTER TABLE help_history ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ("
+            f" setweight(to_tsvector('{config}', coalesce(query, '')), 'A') ||"
+            f" setweight(to_tsvector('{config}', coalesce(result, '')), 'B')) STORED"
+        ))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_help_history_search_vector ON help_history USING GIN (search_vector)"))
+        return True
+    logger.warning("No full-text index for dialect %s; help search falls back to LIKE", dialect)
+    return False
+
+
+def search_terms(q):
+    # Words only: FTS5/tsquery operators typed (or transcribed) by the user are never interpreted
+    return [t for t in _SPLIT.split((q or "").lower()) if t][:32]
+
+
+def _candidates_statement(dialect, terms):
+    if dialect == "sqlite":
+        # Newest matches only: bm25() would count every term's matches across all users on each query
+        words = " OR ".join('"' + t.replace('"', '""') + '"' for t in terms)
+        sql = (
+            "SELECT id, query, result, timestamp FROM help_history WHERE id IN ("
+            f" SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :match ORDER BY rowid DESC LIMIT :candidates)"
+        )
+        return sql, lambda user_id: {"match": f'user_id : "{int(user_id)}" AND ({words})'}
+    if dialect == "postgresql":
+        sql = (
+            "SELECT id, query, result, timestamp FROM help_history"
+            f" WHERE user_id = :user_id AND search_vector @@ websearch_to_tsquery('{_pg_config()}', :q)"
+            " ORDER BY id DESC LIMIT :candidates"
+        )
+        return sql, lambda user_id: {"user_id": user_id, "q": " or ".join(terms)}
+    # No full-text index: scan this user's rows
+    likes = " OR ".join(f"lower(query) LIKE :t{i} OR lower(result) LIKE :t{i}" for i in range(len(terms)))
+    sql = (
+        "SELECT id, query, result, timestamp FROM help_history"
+        f" WHERE user_id = :user_id AND ({likes}) ORDER BY id DESC LIMIT :candidates"
+    )
+    like_params = {f"t{i}": f"%{t}%" for i, t in enumerate(terms)}
+    return sql, lambda user_id: {**like_params, "user_id": user_id}
+
+
+def rank(rows, terms, limit):
+    """
+    Order candidate rows by a BM25-style score: each matched word counts by its rarity among the
+    candidates, more in the question than in the answer; newer rows win ties.
+    """
+    terms = set(terms)
+    words = [(r, set(_SPLIT.split((r.query or "").lower())), set(_SPLIT.split((r.result or "").lower()))) for r in rows]
+    n = len(words)
+    idf = {}
+    for t in terms:
+        df = sum(1 for _, q, a in words if t in q or t in a)
+        idf[t] = math.log(1 + (n - df + 0.5) / (df + 0.5))
+    scored = []
+    for r, q, a in words:
+        score = sum(idf[t] * (QUERY_WEIGHT * (t in q) + RESULT_WEIGHT * (t in a)) for t in terms)
+        scored.append((score, r.id, r))
+    scored.sort(key=lambda s: (s[0], s[1]), reverse=True)
+    return [(r, score) for score, _, r in scored[:limit]]
+
+
+def search_history(conn, user_id, q, limit):
+    """One user's help history matching q, best first, as [(row, score)]."""
+    terms = search_terms(q)
+    if not terms:
+        return []
+    sql, params = _candidates_statement(conn.dialect.name, terms)
+    rows = conn.execute(
+        text(sql).columns(timestamp=DateTime), {**params(user_id), "candidates": HELP_SEARCH_CANDIDATES}
+    ).all()
+    return rank(rows, terms, limit)
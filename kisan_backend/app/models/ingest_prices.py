@@ -0,0 +1,316 @@
+# ingest_prices.py (run from project root)
+# Streams daily mandi price dumps into market_prices in fixed-size chunks (constant memory).
+#
+#   python -m app.models.ingest_prices prices_2025-11-18.csv [more files...] [--date 2025-11-18]
+#
+# Accepts .csv, .json (array), .jsonl/.ndjson, optionally .gz-compressed. Column names are matched
+# case-insensitively, including data.gov.in Agmarknet headers (Commodity, Market, Modal_x0020_Price,
+# Arrival_Date). Rows are upserted on (crop_key, mandi_key), and a price is only replaced by one
+# for the same or a later date, so re-running the same day's file is a no-op.
+#
+# Every row also lands in price_history, and the rolling aggregates in price_stats are refreshed
+# for the touched crop/mandi pairs. For multi-year historical loads pass --no-stats and rebuild
+# them once afterwards with `python -m app.models.price_history --backfill`.
+# Latest-price changes are queued as price_events for the alert engine (app/models/alerts.py);
+# --no-stats loads queue none. Optional latitude/longitude columns update the mandi's coordinates
+# in mandi_locations (used by /market/nearest, see app/models/mandi_geo.py).
+import argparse
+import csv
+import gzip
+import io
+import json
+import os
+import sys
+import time
+from datetime import date, datetime
+
+from sqlalchemy import case, func, text
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app.models.database import engine as default_engine
+from app.models.data_versions import bump_data_version
+from app.models.migrations import upgrade_schema
+from app.models.models import Base, MarketPrice, normalize_key
+from app.models.alerts import record_price_events
+from app.models.mandi_geo import parse_coordinates, upsert_mandi_locations
+from app.models.price_history import load_stats, record_history, refresh_stats
+
+CHUNK_SIZE = int(os.environ.get("INGEST_CHUNK_SIZE", "5000"))
+
+FIELD_ALIASES = {
+    "crop": ("crop", "commodity"),
+    "mandi": ("mandi", "market", "market_name"),
+    "price": ("price", "modal_price", "modal_x0020_price"),
+    "price_date": ("price_date", "date", "arrival_date"),
+    "trend": ("trend",),
+    "latitude": ("latitude", "lat"),
+    "longitude": ("longitude", "lon", "lng"),
+}
+DATE_FORMATS = ("%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y", "%Y/%m/%d")
+
+
+class RowError(ValueError):
+    pass
+
+
+def _open(path):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", newline="")
+    return open(path, "r", encoding="utf-8", newline="")
+
+
+def _iter_json_array(f, read_size=1 << 16):
+    # Incremental parser for a top-level JSON array: holds one read buffer, not the whole file
+    decoder = json.JSONDecoder()
+    buf = f.read(read_size).lstrip()
+    if not buf.startswith("["):
+        raise ValueError("Expected a JSON array of price objects")
+    buf = buf[1:]
+    while True:
+        buf = buf.lstrip().lstrip(",").lstrip()
+        if buf.startswith("]"):
+            return
+        try:
+            obj, end = decoder.raw_decode(buf)
+        except json.JSONDecodeError:
+            more = f.read(read_size)
+            if not more:
+                raise
+            buf += more
+            continue
+        yield obj
+        buf = buf[end:]
+        if len(buf) < read_size:
+            buf += f.read(read_size)
+
+
+def iter_records(path):
+    name = path[:-3] if path.endswith(".gz") else path
+    with _open(path) as f:
+        if name.endswith((".jsonl", ".ndjson")):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        elif name.endswith(".json"):
+            yield from _iter_json_array(f)
+        else:
+            yield from csv.DictReader(f)
+
+
+def _pick(record, field):
+    for alias in FIELD_ALIASES[field]:
+        value = record.get(alias)
+        if value not in (None, ""):
+            return value
+    return None
+
+
+def _parse_date(value):
+    if isinstance(value, date):
+        return value
+    value = str(value).strip()
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            pass
+    raise RowError("bad_date")
+
+
+def validate(record, default_date=None):
+    record = {str(k).strip().lower().replace(" ", "_"): v for k, v in record.items() if k is not None}
+    crop, mandi = _pick(record, "crop"), _pick(record, "mandi")
+    if not crop or not str(crop).strip():
+        raise RowError("missing_crop")
+    if not mandi or not str(mandi).strip():
+        raise RowError("missing_mandi")
+    try:
+        price = float(str(_pick(record, "price")).replace(",", ""))
+    except ValueError:
+        raise RowError("bad_price")
+    if not price > 0:
+        raise RowError("bad_price")
+    raw_date = _pick(record, "price_date")
+    if raw_date is None and default_date is None:
+        raise RowError("missing_date")
+    crop, mandi = " ".join(str(crop).split()), " ".join(str(mandi).split())
+    trend = _pick(record, "trend")
+    # Coordinates are optional extras: bad ones are dropped, the price is still loaded
+    coords = parse_coordinates(_pick(record, "latitude"), _pick(record, "longitude")) or (None, None)
+    return {
+        "crop": crop,
+        "mandi": mandi,
+        "crop_key": normalize_key(crop),
+        "mandi_key": normalize_key(mandi),
+        "price": price,
+        "trend": str(trend).strip().lower() if trend else None,
+        "price_date": _parse_date(raw_date) if raw_date is not None else default_date,
+        "latitude": coords[0],
+        "longitude": coords[1],
+    }
+
+
+def _upsert_statement(dialect_name):
+    dialect = postgresql if dialect_name == "postgresql" else sqlite
+    stmt = dialect.insert(MarketPrice.__table__)
+    excluded = stmt.excluded
+    table = MarketPrice.__table__
+    # Without an explicit trend, derive it from the previous day's price (a same-day re-run keeps it)
+    derived_trend = case(
+        (table.c.price_date == excluded.price_date, table.c.trend),
+        (excluded.price > table.c.price, "up"),
+        (excluded.price < table.c.price, "down"),
+        else_="stable",
+    )
+    return stmt.on_conflict_do_update(
+        index_elements=["crop_key", "mandi_key"],
+        set_={
+            "crop": excluded.crop,
+            "mandi": excluded.mandi,
+            "price": excluded.price,
+            "trend": func.coalesce(excluded.trend, derived_trend),
+            "price_date": excluded.price_date,
+        },
+        where=(table.c.price_date.is_(None)) | (table.c.price_date <= excluded.price_date),
+    )
+
+
+STAGE_COLUMNS = ("crop", "mandi", "crop_key", "mandi_key", "price", "trend", "price_date")
+
+
+def _copy_chunk_postgres(conn, history_rows):
+    # COPY every (key, date) row into a temp staging table, then two set-based upserts:
+    # all of them into price_history, the latest per key into market_prices
+    conn.execute(text(
+        "CREATE TEMP TABLE IF NOT EXISTS market_prices_stage "
+        "(crop text, mandi text, crop_key text, mandi_key text, price double precision, trend text, price_date date) "
+        "ON COMMIT DELETE ROWS"
+    ))
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for row in history_rows:
+        writer.writerow(["" if row[c] is None else row[c] for c in STAGE_COLUMNS])
+    buf.seek(0)
+    cursor = conn.connection.dbapi_connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY market_prices_stage ({', '.join(STAGE_COLUMNS)}) FROM STDIN WITH (FORMAT csv, NULL '')", buf
+        )
+    finally:
+        cursor.close()
+    conn.execute(text(
+        "INSERT INTO price_history (crop_key, mandi_key, price_date, price) "
+        "SELECT crop_key, mandi_key, price_date, price FROM market_prices_stage "
+        "ON CONFLICT (crop_key, mandi_key, price_date) DO UPDATE SET price = EXCLUDED.price"
+    ))
+    conn.execute(text(
+        "INSERT INTO market_prices (crop, mandi, crop_key, mandi_key, price, trend, price_date) "
+        "SELECT DISTINCT ON (crop_key, mandi_key) crop, mandi, crop_key, mandi_key, price, trend, price_date "
+        "FROM market_prices_stage ORDER BY crop_key, mandi_key, price_date DESC "
+        "ON CONFLICT (crop_key, mandi_key) DO UPDATE SET "
+        " crop = EXCLUDED.crop, mandi = EXCLUDED.mandi, price = EXCLUDED.price, price_date = EXCLUDED.price_date,"
+        " trend = COALESCE(EXCLUDED.trend, CASE WHEN market_prices.price_date = EXCLUDED.price_date THEN market_prices.trend"
+        "   WHEN EXCLUDED.price > market_prices.price THEN 'up'"
+        "   WHEN EXCLUDED.price < market_prices.price THEN 'down' ELSE 'stable' END) "
+        "WHERE market_prices.price_date IS NULL OR market_prices.price_date <= EXCLUDED.price_date"
+    ))
+
+
+def write_chunk(conn, current_rows, history_rows, use_copy, stats=True, locations=()):
+    # current_rows: latest row per (crop_key, mandi_key); history_rows: one row per (crop_key, mandi_key, date);
+    # locations: {mandi, latitude, longitude} for mandis whose rows carried coordinates
+    if use_copy:
+        _copy_chunk_postgres(conn, history_rows)
+    else:
+        conn.execute(_upsert_statement(conn.dialect.name), current_rows)  # executemany
+        record_history(conn, history_rows)
+    if stats:
+        keys = {(r["crop_key"], r["mandi_key"]) for r in current_rows}
+        before = load_stats(conn, keys)
+        after = refresh_stats(conn, keys, min(r["price_date"] for r in history_rows))
+        record_price_events(conn, current_rows, before, after)
+    if locations:
+        upsert_mandi_locations(conn, locations)
+    bump_data_version(conn, "market_prices")
+
+
+def ingest_file(path, engine=default_engine, chunk_size=CHUNK_SIZE, default_date=None, use_copy=None, rejects=None,
+                stats=True):
+    """Stream one dump into market_prices/price_history; returns a report dict (counts, rejects by reason, rows/sec)."""
+    if use_copy is None:
+        use_copy = engine.dialect.name == "postgresql"
+    report = {"file": path, "read": 0, "valid": 0, "duplicates": 0, "rejected": {}, "chunks": 0}
+    started = time.perf_counter()
+
+    def flush(current, history, locations):
+        if not history:
+            return
+        with engine.begin() as conn:
+            write_chunk(conn, list(current.values()), list(history.values()), use_copy, stats, list(locations.values()))
+        report["chunks"] += 1
+
+    # Deduplicated so each statement touches a row once (Postgres refuses to upsert the same row twice):
+    # current is keyed by (crop_key, mandi_key) and keeps the latest date, history by (crop_key, mandi_key, date)
+    current, history, locations = {}, {}, {}
+    for record in iter_records(path):
+        report["read"] += 1
+        try:
+            row = validate(record, default_date)
+        except RowError as e:
+            reason = str(e)
+            report["rejected"][reason] = report["rejected"].get(reason, 0) + 1
+            if rejects is not None:
+                rejects.write(json.dumps({"line": report["read"], "reason": reason, "record": record}, default=str) + "\n")
+            continue
+        report["valid"] += 1
+        lat, lon = row.pop("latitude"), row.pop("longitude")
+        if lat is not None:
+            locations[row["mandi_key"]] = {"mandi": row["mandi"], "latitude": lat, "longitude": lon}
+        key = (row["crop_key"], row["mandi_key"])
+        if (*key, row["price_date"]) in history:
+            report["duplicates"] += 1
+        history[(*key, row["price_date"])] = row
+        previous = current.get(key)
+        if previous is None or previous["price_date"] <= row["price_date"]:
+            current[key] = row
+        if len(history) >= chunk_size:
+            flush(current, history, locations)
+            current, history, locations = {}, {}, {}
+    flush(current, history, locations)
+
+    elapsed = time.perf_counter() - started
+    report["seconds"] = round(elapsed, 3)
+    report["rows_per_sec"] = round(report["read"] / elapsed, 1) if elapsed > 0 else 0.0
+    report["method"] = "copy" if use_copy else "executemany"
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-load mandi price dumps into market_prices")
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("--date", help="price date (YYYY-MM-DD) for rows without one")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--no-copy", action="store_true", help="use executemany even on PostgreSQL")
+    parser.add_argument("--rejects", help="write rejected rows (JSON lines) to this file")
+    parser.add_argument("--no-stats", action="store_true", help="skip price_stats refresh (run the backfill after)")
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=default_engine)
+    upgrade_schema(default_engine, Base.metadata)
+
+    default_date = _parse_date(args.date) if args.date else None
+    rejects = open(args.rejects, "w", encoding="utf-8") if args.rejects else None
+    try:
+        for path in args.files:
+            report = ingest_file(
+                path, chunk_size=args.chunk_size, default_date=default_date,
+                use_copy=False if args.no_copy else None, rejects=rejects, stats=not args.no_stats,
+            )
+            print(json.dumps(report))
+    finally:
+        if rejects is not None:
+            rejects.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,337 @@
+# app/models/mandi_geo.py
+# Nearest-mandi price lookup. Mandi coordinates live in mandi_locations (from a mandi directory, or
+# latitude/longitude columns in the price dumps); a farmer is placed from the request's coordinates
+# or their User.village/district via the places gazetteer. Load either (run from project root):
+#
+#   python -m app.models.mandi_geo --mandis mandis.csv --places villages.csv
+#
+# Accepts the same formats as ingest_prices (.csv/.json/.jsonl, optionally .gz).
+# Every crop's priced mandis are held in an in-memory grid, rebuilt in the background whenever
+# market_prices' data version changes (ingest and the loaders bump it), so a k-nearest query
+# touches only the few cells around the farmer instead of every mandi in the country.
+import argparse
+import heapq
+import json
+import logging
+import math
+import os
+import threading
+import time
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app.models.data_versions import bump_data_version, get_data_version
+from app.models.models import MandiLocation, MarketPrice, Place, normalize_key
+
+logger = logging.getLogger(__name__)
+
+# Grid cell size in degrees (~55 km at 0.5). Smaller cells cost more empty-cell probes per query
+MANDI_GRID_DEG = float(os.environ.get("MANDI_GRID_DEG", "0.5"))
+# How often to check market_prices' data version, as for the /market cache
+MANDI_INDEX_CHECK_S = float(os.environ.get("MARKET_VERSION_CHECK_S", "1"))
+
+EARTH_RADIUS_KM = 6371.0088
+
+FIELD_ALIASES = {
+    "mandi": ("mandi", "market", "market_name"),
+    "state": ("state", "state_name"),
+    "district": ("district", "district_name"),
+    "village": ("village", "village_name", "place", "name"),
+    "latitude": ("latitude", "lat"),
+    "longitude": ("longitude", "lon", "lng", "long"),
+}
+
+
+def parse_coordinates(lat, lon):
+    """(latitude, longitude) as floats, or None when missing or out of range."""
+    try:
+        lat, lon = float(lat), float(lon)
+    except (TypeError, ValueError):
+        return None
+    if not (-90.0 <= lat <= 90.0 and -180.0 <= lon <= 180.0) or (lat == 0.0 and lon == 0.0):
+        return None
+    return lat, lon
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp, dl = p2 - p1, math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+class GridIndex:
+    """
+    Points bucketed into cell_deg x cell_deg cells. nearest() scans rings of cells outward from the
+    query's cell and stops once the k-th best distance is within the closest any unscanned ring
+    can be. Longitudes don't wrap at +/-180 (all mandis are in India).
+    """
+
+    def __init__(self, points, cell_deg=MANDI_GRID_DEG):
+        # points: (latitude, longitude, item)
+        self.cell_deg = cell_deg
+        self._cells = {}
+        max_abs_lat = 0.0
+        for lat, lon, item in points:
+            self._cells.setdefault(self._cell(lat, lon), []).append((lat, lon, item))
+            max_abs_lat = max(max_abs_lat, abs(lat))
+        self.size = sum(len(c) for c in self._cells.values())
+        if self._cells:
+            rows, cols = zip(*self._cells)
+            self._bounds = (min(rows), max(rows), min(cols), max(cols))
+        # Shortest distance spanned by one cell anywhere in the index (east-west at the highest latitude)
+        self._km_per_cell = math.radians(cell_deg) * EARTH_RADIUS_KM * math.cos(math.radians(min(max_abs_lat, 89.0))) * 0.99
+
+    def _cell(self, lat, lon):
+        return (math.floor(lat / self.cell_deg), math.floor(lon / self.cell_deg))
+
+    def _ring(self, i0, j0, r):
+        if r == 0:
+            yield (i0, j0)
+            return
+        for j in range(j0 - r, j0 + r + 1):
+            yield (i0 - r, j)
+            yield (i0 + r, j)
+        for i in range(i0 - r + 1, i0 + r):
+            yield (i, j0 - r)
+            yield (i, j0 + r)
+
+    def nearest(self, lat, lon, k, max_km=None):
+        """Up to k (distance_km, item) pairs, closest first."""
+        if not self._cells or k <= 0:
+            return []
+        i0, j0 = self._cell(lat, lon)
+        min_i, max_i, min_j, max_j = self._bounds
+        last_ring = max(i0 - min_i, max_i - i0, j0 - min_j, max_j - j0, 0)
+        best = []  # max-heap of the k best as (-distance, tiebreak, item)
+        seq = 0
+        for r in range(last_ring + 1):
+            for cell in self._ring(i0, j0, r):
+                for plat, plon, item in self._cells.get(cell, ()):
+                    d = haversine_km(lat, lon, plat, plon)
+                    if max_km is not None and d > max_km:
+                        continue
+                    seq += 1
+                    if len(best) < k:
+                        heapq.heappush(best, (-d, seq, item))
+                    elif d < -best[0][0]:
+                        heapq.heapreplace(best, (-d, seq, item))
+            # Everything in rings beyond r is at least r whole cells away
+            reach = r * self._km_per_cell
+            if (len(best) == k and -best[0][0] <= reach) or (max_km is not None and reach >= max_km):
+                break
+        return [(-d, item) for d, _, item in sorted(best, reverse=True)]
+
+
+class MandiLocator:
+    def __init__(self):
+        self._by_crop = {}
+        self._version = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._rebuilding = False
+        self.builds = 0
+        self.last_build = None
+
+    def refresh(self, conn):
+        """Pick up market_prices changes; at most one version check per MANDI_INDEX_CHECK_S.
+
+        Only the first build runs in the caller. Later ones run on a background thread with their
+        own connection while queries keep using the current grids, which are swapped when done.
+        """
+        now = time.monotonic()
+        if self._version is not None and now - self._checked_at < MANDI_INDEX_CHECK_S:
+            return
+        # No lock across the queries: under AsyncSession.run_sync they yield to the event loop, and a
+        # second request blocking on a thread lock there would stall the loop for good
+        self._checked_at = now
+        version = get_data_version(conn, "market_prices")
+        if version == self._version:
+            return
+        if self._version is None:
+            self._rebuild(conn, version)
+            return
+        with self._lock:
+            if self._rebuilding:
+                return  # the next check after it finishes picks up anything newer
+            self._rebuilding = True
+        threading.Thread(target=self._rebuild_in_background, name="mandi-grid-rebuild", daemon=True).start()
+
+    def _rebuild_in_background(self):
+        from app.models.database import engine
+
+        try:
+            with engine.connect() as conn:
+                self._rebuild(conn, get_data_version(conn, "market_prices"))
+        except Exception:
+            logger.exception("Mandi grid rebuild failed")
+        finally:
+            with self._lock:
+                self._rebuilding = False
+
+    def _rebuild(self, conn, version):
+        started = time.perf_counter()
+        rows = conn.execute(
+            select(MarketPrice.crop_key, MarketPrice.mandi, MarketPrice.price, MarketPrice.trend,
+                   MarketPrice.price_date, MandiLocation.latitude, MandiLocation.longitude)
+            .join(MandiLocation, MandiLocation.mandi_key == MarketPrice.mandi_key)
+        ).all()
+        grouped = {}
+        for r in rows:
+            item = {"mandi": r.mandi, "price": r.price, "trend": r.trend, "price_date": r.price_date,
+                    "latitude": r.latitude, "longitude": r.longitude}
+            grouped.setdefault(r.crop_key, []).append((r.latitude, r.longitude, item))
+        by_crop = {crop_key: GridIndex(points) for crop_key, points in grouped.items()}
+        with self._lock:
+            # A first build racing a background one may finish out of order; keep the newest
+            if self._version is not None and version < self._version:
+                return
+            self._by_crop, self._version = by_crop, version
+            self.builds += 1
+            self.last_build = {"rows": len(rows), "crops": len(grouped), "seconds": round(time.perf_counter() - started, 3)}
+
+    def nearest(self, crop, lat, lon, k, max_km=None):
+        index = self._by_crop.get(normalize_key(crop))
+        if index is None:
+            return []
+        return [{**item, "distance_km": round(d, 1)} for d, item in index.nearest(lat, lon, k, max_km)]
+
+    def stats(self):
+        return {
+            "data_version": self._version,
+            "crops": len(self._by_crop),
+            "priced_mandis": sum(g.size for g in self._by_crop.values()),
+            "grid_deg": MANDI_GRID_DEG,
+            "builds": self.builds,
+            "rebuilding": self._rebuilding,
+            "last_build": self.last_build,
+        }
+
+
+mandi_locator = MandiLocator()
+
+
+def resolve_user_location(conn, user):
+    """(latitude, longitude, source) for a User from village/district, or None if unplaceable."""
+    village, district, state = normalize_key(user.village), normalize_key(user.district), normalize_key(user.state) or ""
+    if village and district:
+        row = conn.execute(
+            select(Place.latitude, Place.longitude)
+            .where(Place.district_key == district, Place.village_key == village)
+            .order_by((Place.state_key == state).desc()).limit(1)
+        ).first()
+        if row:
+            return row.latitude, row.longitude, "village"
+    if village:
+        row = conn.execute(select(MandiLocation.latitude, MandiLocation.longitude).where(MandiLocation.mandi_key == village)).first()
+        if row:
+            return row.latitude, row.longitude, "village_mandi"
+    if district:
+        # Centroid of the district's mandis, else of its gazetteer places
+        for model in (MandiLocation, Place):
+            row = conn.execute(
+                select(func.avg(model.latitude).label("lat"), func.avg(model.longitude).label("lon"))
+                .where(model.district_key == district)
+            ).first()
+            if row and row.lat is not None:
+                return row.lat, row.lon, "district"
+    return None
+
+
+def _upsert(conn, model, rows, index_elements, replace=(), keep=()):
+    # keep: columns whose existing value survives a NULL in the new row
+    dialect = postgresql if conn.dialect.name == "postgresql" else sqlite
+    stmt = dialect.insert(model.__table__)
+    table = model.__table__
+    set_ = {c: stmt.excluded[c] for c in replace}
+    set_.update({c: func.coalesce(stmt.excluded[c], table.c[c]) for c in keep})
+    conn.execute(stmt.on_conflict_do_update(index_elements=index_elements, set_=set_), rows)
+
+
+def upsert_mandi_locations(conn, rows):
+    """rows: dicts with mandi, latitude, longitude and optionally state/district; newest coordinates win."""
+    by_key = {}
+    for r in rows:
+        by_key[normalize_key(r["mandi"])] = {
+            "mandi_key": normalize_key(r["mandi"]), "mandi": r["mandi"],
+            "state": r.get("state"), "district": r.get("district"), "district_key": normalize_key(r.get("district")),
+            "latitude": r["latitude"], "longitude": r["longitude"],
+        }
+    if by_key:
+        _upsert(conn, MandiLocation, list(by_key.values()), ["mandi_key"],
+                replace=("mandi", "latitude", "longitude"), keep=("state", "district", "district_key"))
+    return len(by_key)
+
+
+def upsert_places(conn, rows):
+    by_key = {}
+    for r in rows:
+        key = (normalize_key(r["district"]), normalize_key(r["village"]), normalize_key(r.get("state")) or "")
+        by_key[key] = {"district_key": key[0], "village_key": key[1], "state_key": key[2],
+                       "latitude": r["latitude"], "longitude": r["longitude"]}
+    if by_key:
+        _upsert(conn, Place, list(by_key.values()), ["district_key", "village_key", "state_key"],
+                replace=("latitude", "longitude"))
+    return len(by_key)
+
+
+def _pick(record, field):
+    for alias in FIELD_ALIASES[field]:
+        value = record.get(alias)
+        if value not in (None, ""):
+            return " ".join(str(value).split()) if field not in ("latitude", "longitude") else value
+    return None
+
+
+def _load(engine, path, required, upsert, chunk_size=5000):
+    from app.models.ingest_prices import iter_records
+
+    report = {"file": path, "read": 0, "loaded": 0, "rejected": 0}
+    chunk = []
+
+    def flush():
+        with engine.begin() as conn:
+            report["loaded"] += upsert(conn, chunk)
+            bump_data_version(conn, "market_prices")
+        chunk.clear()
+
+    for record in iter_records(path):
+        report["read"] += 1
+        record = {str(k).strip().lower().replace(" ", "_"): v for k, v in record.items() if k is not None}
+        row = {f: _pick(record, f) for f in ("state", "district", *required)}
+        coords = parse_coordinates(_pick(record, "latitude"), _pick(record, "longitude"))
+        if coords is None or not all(row[f] for f in required):
+            report["rejected"] += 1
+            continue
+        row["latitude"], row["longitude"] = coords
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            flush()
+    if chunk:
+        flush()
+    return report
+
+
+def main():
+    from app.models.database import engine
+    from app.models.migrations import upgrade_schema
+    from app.models.models import Base
+
+    parser = argparse.ArgumentParser(description="Load mandi coordinates and the village gazetteer")
+    parser.add_argument("--mandis", nargs="*", default=[], help="files with mandi/market, latitude, longitude [, state, district]")
+    parser.add_argument("--places", nargs="*", default=[], help="files with state, district, village, latitude, longitude")
+    args = parser.parse_args()
+    if not args.mandis and not args.places:
+        parser.error("nothing to do (use --mandis and/or --places)")
+
+    Base.metadata.create_all(bind=engine)
+    upgrade_schema(engine, Base.metadata)
+    for path in args.mandis:
+        print(json.dumps(_load(engine, path, ("mandi",), upsert_mandi_locations)))
+    for path in args.places:
+        print(json.dumps(_load(engine, path, ("district", "village"), upsert_places)))
+
+
+if __name__ == "__main__":
+    main()
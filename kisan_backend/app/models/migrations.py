@@ -0,0 +1,151 @@
+# app/models/migrations.py
+# create_all() only creates missing tables. This brings an existing database (e.g. kisan.db)
+# up to date with models.py: adds missing columns, runs data backfills, then adds missing indexes.
+# Runs on every app start, so it never deletes data on its own; steps that would are explicit:
+#
+#   python -m app.models.migrations --dedupe-market-prices
+import argparse
+import logging
+
+from sqlalchemy import inspect, text
+
+from app.models.models import normalize_key
+
+logger = logging.getLogger(__name__)
+
+
+def _backfill_market_keys(conn, added):
+    if ("market_prices", "crop_key") not in added:
+        return
+    rows = conn.execute(text(
+        "SELECT id, crop, mandi FROM market_prices WHERE crop_key IS NULL AND crop IS NOT NULL"
+    )).fetchall()
+    if rows:
+        conn.execute(
+            text("UPDATE market_prices SET crop_key = :crop_key, mandi_key = :mandi_key WHERE id = :id"),
+            [{"id": r.id, "crop_key": normalize_key(r.crop), "mandi_key": normalize_key(r.mandi)} for r in rows],
+        )
+
+
+_MARKET_PRICE_DUPLICATES = (
+    "FROM market_prices WHERE crop_key IS NOT NULL AND id NOT IN ("
+    " SELECT MAX(id) FROM market_prices WHERE crop_key IS NOT NULL GROUP BY crop_key, mandi_key)"
+)
+
+
+class DuplicateMarketPrices(RuntimeError):
+    pass
+
+
+def _dedupe_market_prices(conn, dedupe):
+    # The crop/mandi index became unique for ingest upserts. Older databases may hold several rows per
+    # key: startup refuses to continue until they're removed on purpose (dedupe=True keeps the newest)
+    indexes = {ix["name"] for ix in inspect(conn).get_indexes("market_prices")}
+    if "uq_market_prices_crop_key_mandi_key" in indexes:
+        return 0
+    duplicates = conn.execute(text(f"SELECT COUNT(*) {_MARKET_PRICE_DUPLICATES}")).scalar()
+    if duplicates and not dedupe:
+        raise DuplicateMarketPrices(
+            f"market_prices has {duplicates} rows sharing a crop/mandi with a newer row, so its unique"
+            " index can't be created. Back up the database, then run"
+            " `python -m app.models.migrations --dedupe-market-prices` to keep the newest row per crop/mandi."
+        )
+    if duplicates:
+        conn.execute(text(f"DELETE {_MARKET_PRICE_DUPLICATES}"))
+        logger.warning("Removed %d duplicate market_prices rows (kept the newest per crop/mandi)", duplicates)
+    if "ix_market_prices_crop_key_mandi_key" in indexes:
+        conn.execute(text("DROP INDEX ix_market_prices_crop_key_mandi_key"))
+    return duplicates
+
+
+def _backfill_notification_read_flag(conn, added):
+    # Unread counts filter on read_flag = false; older rows may have NULL. Once, before the index exists
+    indexes = {ix["name"] for ix in inspect(conn).get_indexes("notifications")}
+    if "ix_notifications_user_id_read_flag_id" not in indexes:
+        conn.execute(text("UPDATE notifications SET read_flag = false WHERE read_flag IS NULL"))
+
+
+def _backfill_user_keys(conn, added):
+    # users.*_key feed the eligibility SQL filters: fill them and re-evaluate every scheme once with them
+    if ("users", "state_key") in added:
+        from app.models.eligibility import rebuild_all
+        rebuild_all(conn)
+
+
+def _backfill_scheme_eligibility(conn, added):
+    # scheme_eligibility is maintained on writes; schemes that predate it need one full evaluation
+    from app.models.eligibility import rebuild_all
+    has_matches = conn.execute(text("SELECT 1 FROM scheme_eligibility LIMIT 1")).first()
+    has_schemes = conn.execute(text("SELECT 1 FROM schemes LIMIT 1")).first()
+    if has_schemes and not has_matches:
+        rebuild_all(conn)
+
+
+def _create_help_search(conn, added):
+    # FTS5 table + triggers (SQLite) or tsvector column + GIN index (PostgreSQL), indexing existing rows
+    from app.models.help_search import ensure_search_index
+    if ensure_search_index(conn):
+        logger.info("Created the help_history full-text index")
+
+
+def _create_change_tracking(conn, added):
+    # change_seq stamps and tombstones for /sync, maintained by triggers
+    from app.models.sync import ensure_change_tracking
+    ensure_change_tracking(conn)
+
+
+# Run after columns are added and before indexes are created, in order: fn(connection, added) where added is {(table, column), ...}
+BACKFILLS = [
+    _backfill_market_keys,
+    _backfill_notification_read_flag,
+    _backfill_user_keys,
+    _backfill_scheme_eligibility,
+    _create_help_search,
+    _create_change_tracking,
+]
+
+
+def upgrade_schema(engine, metadata, dedupe_market_prices=False):
+    added = set()
+    with engine.begin() as conn:
+        inspector = inspect(conn)
+        existing_tables = set(inspector.get_table_names())
+        for table in metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                # SQLite can't ADD COLUMN with a non-constant default; the backfills fill those in
+                ddl = f'ALTER TABLE {table.name} ADD COLUMN "{column.name}" {column.type.compile(conn.dialect)}'
+                conn.execute(text(ddl))
+                added.add((table.name, column.name))
+                logger.info("Added column %s.%s", table.name, column.name)
+        for fn in BACKFILLS:
+            fn(conn, added)
+        if "market_prices" in existing_tables:
+            _dedupe_market_prices(conn, dedupe_market_prices)
+        for table in metadata.sorted_tables:
+            if table.name in existing_tables:
+                for index in table.indexes:
+                    index.create(conn, checkfirst=True)
+    return added
+
+
+def main():
+    from app.models.database import engine
+    from app.models.models import Base
+
+    parser = argparse.ArgumentParser(description="Bring the database schema up to date")
+    parser.add_argument("--dedupe-market-prices", action="store_true",
+                        help="delete all but the newest market_prices row per crop/mandi")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    Base.metadata.create_all(bind=engine)
+    upgrade_schema(engine, Base.metadata, dedupe_market_prices=args.dedupe_market_prices)
+
+
+if __name__ == "__main__":
+    main()
@@ -31,13 +31,27 @@ class CropDiagnosis(Base):
     timestamp: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
     user: Mapped["User"] = relationship(back_populates="diagnoses")
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Boolean, Text
+from sqlalchemy import BigInteger, Column, Integer, String, Float, ForeignKey, Date, DateTime, Boolean, Text, Index, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 import datetime
 
 Base = declarative_base()
+
+def normalize_key(value):
+    # Lookup key for free-text names: collapse whitespace and case-fold ("  Tomato " == "tomato")
+    return " ".join(value.split()).casefold() if value else value
+
+def crop_keys(crops):
+    # users.crops is free text like "Paddy, Ragi"
+    return frozenset(normalize_key(c) for c in (crops or "").split(",") if c.strip())
+
+def joined_crop_keys(crops):
+    # Stored as ",paddy,ragi," so SQL matches one crop exactly with LIKE '%,paddy,%'
+    keys = crop_keys(crops)
+    return f",{','.join(sorted(keys))}," if keys else None
+
 class User(Base):
     __tablename__ = 'users'
     id = Column(Integer, primary_key=True, index=True)
@@ -51,6 +65,18 @@ class User(Base):
     crops = Column(String)
     language = Column(String)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # normalize_key'd copies for the eligibility SQL filters, set on every ORM write (_set_user_keys)
+    state_key = Column(String)
+    district_key = Column(String)
+    crops_key = Column(String)
+
+
+@event.listens_for(User, 'before_insert')
+@event.listens_for(User, 'before_update')
+def _set_user_keys(mapper, connection, target):
+    target.state_key = normalize_key(target.state) or None
+    target.district_key = normalize_key(target.district) or None
+    target.crops_key = joined_crop_keys(target.crops)
 
 class CropDiagnosis(Base):
     __tablename__ = 'crop_diagnosis'
@@ -70,6 +96,123 @@ class MarketPrice(Base):
     mandi = Column(String)
     price = Column(Float)
     trend = Column(String)
+    # normalize_key(crop) / normalize_key(mandi), kept in sync below so lookups use the index
+    crop_key = Column(String)
+    mandi_key = Column(String)
+    # Date the price was reported for; ingest never overwrites a newer price with an older one
+    price_date = Column(Date)
+    # Set by database triggers on every insert/update that changes the row (app/models/sync.py)
+    change_seq = Column(BigInteger)
+
+    __table_args__ = (
+        # One current price per crop/mandi: lookup index and the ingest upsert's conflict target
+        Index('uq_market_prices_crop_key_mandi_key', 'crop_key', 'mandi_key', unique=True),
+        # Delta sync reads rows changed since a client's cursor in stamp order
+        Index('ix_market_prices_change_seq_id', 'change_seq', 'id'),
+    )
+
+
+@event.listens_for(MarketPrice, 'before_insert')
+@event.listens_for(MarketPrice, 'before_update')
+def _set_market_price_keys(mapper, connection, target):
+    target.crop_key = normalize_key(target.crop)
+    target.mandi_key = normalize_key(target.mandi)
+
+
+class MandiLocation(Base):
+    # Coordinates per mandi (shared by all its crops' MarketPrice rows via mandi_key), for nearest-mandi lookups
+    __tablename__ = 'mandi_locations'
+    mandi_key = Column(String, primary_key=True)
+    mandi = Column(String)
+    state = Column(String)
+    district = Column(String)
+    district_key = Column(String, index=True)
+    latitude = Column(Float, nullable=False)
+    longitude = Column(Float, nullable=False)
+
+
+class Place(Base):
+    # Village/town gazetteer used to place a farmer from User.village/district; see mandi_geo.py
+    __tablename__ = 'places'
+    id = Column(Integer, primary_key=True)
+    state_key = Column(String, nullable=False, default='')  # '' when unknown, so the unique index applies
+    district_key = Column(String, nullable=False)
+    village_key = Column(String, nullable=False)
+    latitude = Column(Float, nullable=False)
+    longitude = Column(Float, nullable=False)
+
+    __table_args__ = (
+        Index('uq_places_district_key_village_key_state_key', 'district_key', 'village_key', 'state_key', unique=True),
+    )
+
+
+class PriceHistory(Base):
+    # One price per crop/mandi/day, appended by ingest; source for the rolling aggregates in PriceStats
+    __tablename__ = 'price_history'
+    id = Column(Integer, primary_key=True)
+    crop_key = Column(String, nullable=False)
+    mandi_key = Column(String, nullable=False)
+    price_date = Column(Date, nullable=False)
+    price = Column(Float, nullable=False)
+
+    __table_args__ = (
+        Index('uq_price_history_key_date', 'crop_key', 'mandi_key', 'price_date', unique=True),
+    )
+
+
+class PriceStats(Base):
+    # Rolling aggregates per crop/mandi as of its latest price, refreshed on ingest (see price_history.py)
+    __tablename__ = 'price_stats'
+    crop_key = Column(String, primary_key=True)
+    mandi_key = Column(String, primary_key=True)
+    last_date = Column(Date)
+    last_price = Column(Float)
+    prev_price = Column(Float)
+    change_pct = Column(Float)      # vs. the previous reported price
+    change_7d_pct = Column(Float)   # vs. the oldest price in the last 7 days
+    mean_7d = Column(Float)
+    mean_30d = Column(Float)
+    min_30d = Column(Float)
+    max_30d = Column(Float)
+    samples_30d = Column(Integer)
+
+
+class PriceEvent(Base):
+    # Outbox of latest-price changes written by ingest; drained by the alert engine (see alerts.py)
+    __tablename__ = 'price_events'
+    id = Column(Integer, primary_key=True)
+    crop = Column(String)
+    mandi = Column(String)
+    crop_key = Column(String, nullable=False)
+    mandi_key = Column(String, nullable=False)
+    price_date = Column(Date)
+    old_price = Column(Float)
+    new_price = Column(Float, nullable=False)
+
+
+class PriceAlert(Base):
+    # Notify user_id when the price of crop (at mandi, or at any mandi if unset) crosses threshold
+    __tablename__ = 'price_alerts'
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey('users.id'), index=True)
+    crop = Column(String)
+    mandi = Column(String)
+    crop_key = Column(String, nullable=False)
+    mandi_key = Column(String)
+    direction = Column(String, nullable=False)  # "above" or "below"
+    threshold = Column(Float, nullable=False)
+    active = Column(Boolean, default=True)
+    # Price date that last fired the alert, so re-ingesting a day doesn't notify twice
+    last_triggered_date = Column(Date)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    user = relationship('User')
+
+
+@event.listens_for(PriceAlert, 'before_insert')
+@event.listens_for(PriceAlert, 'before_update')
+def _set_price_alert_keys(mapper, connection, target):
+    target.crop_key = normalize_key(target.crop)
+    target.mandi_key = normalize_key(target.mandi)
 
 
 class Scheme(Base):
@@ -80,6 +223,18 @@ class Scheme(Base):
     docs_needed = Column(Text)
     benefits = Column(String)
     deadline = Column(DateTime)
+    change_seq = Column(BigInteger)  # see MarketPrice.change_seq
+
+    __table_args__ = (
+        Index('ix_schemes_change_seq_id', 'change_seq', 'id'),
+    )
+
+
+class SchemeEligibility(Base):
+    # Precomputed (user, scheme) matches of Scheme.eligibility_criteria, kept current by app/models/eligibility.py
+    __tablename__ = 'scheme_eligibility'
+    user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    scheme_id = Column(Integer, ForeignKey('schemes.id', ondelete='CASCADE'), primary_key=True, index=True)
 
 
 class SchemeApplication(Base):
@@ -99,8 +254,18 @@ class Notification(Base):
     type = Column(String)
     content = Column(Text)
     read_flag = Column(Boolean, default=False)
+    change_seq = Column(BigInteger)  # see MarketPrice.change_seq; marking read counts as a change
     user = relationship('User')
 
+    __table_args__ = (
+        # Newest-first keyset pages (WHERE user_id = ? AND id < ? ORDER BY id DESC)
+        Index('ix_notifications_user_id_id', 'user_id', 'id'),
+        # Unread counts and unread-only pages without touching read rows
+        Index('ix_notifications_user_id_read_flag_id', 'user_id', 'read_flag', 'id'),
+        # One user's changes since a sync cursor
+        Index('ix_notifications_user_id_change_seq_id', 'user_id', 'change_seq', 'id'),
+    )
+
 
 class HelpHistory(Base):
     __tablename__ = 'help_history'
@@ -111,6 +276,11 @@ class HelpHistory(Base):
     timestamp = Column(DateTime, default=datetime.datetime.utcnow)
     user = relationship('User')
 
+    __table_args__ = (
+        # Newest-first keyset pages of one user's history; full-text search lives in help_search.py
+        Index('ix_help_history_user_id_id', 'user_id', 'id'),
+    )
+
 
 class RefreshToken(Base):
     __tablename__ = "refresh_tokens"
@@ -121,3 +291,26 @@ class RefreshToken(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     expires_at = Column(DateTime(timezone=True))
     user = relationship("User")
+
+
+class SyncDeletion(Base):
+    # Tombstones for rows deleted from the synced tables, written by triggers (app/models/sync.py)
+    __tablename__ = "sync_deletions"
+    id = Column(Integer, primary_key=True)
+    table_name = Column(String, nullable=False)
+    row_id = Column(Integer, nullable=False)
+    user_id = Column(Integer)  # notifications only
+    change_seq = Column(BigInteger, nullable=False)
+    deleted_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        Index('ix_sync_deletions_change_seq_id', 'change_seq', 'id'),
+    )
+
+
+class DataVersion(Base):
+    # Monotonic per-dataset version, bumped on every write so caches (in any process) can tell they're stale
+    __tablename__ = "data_versions"
+    name = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
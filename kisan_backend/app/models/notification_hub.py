@@ -0,0 +1,194 @@
+# app/models/notification_hub.py
+import asyncio
+import os
+from collections import deque
+
+from sqlalchemy import func, select
+
+from app.models.database import engine as default_engine
+from app.models.models import Notification
+
+# How often the hub looks for notifications written by other processes (in-process writers call wake())
+NOTIFY_POLL_S = float(os.environ.get("NOTIFY_POLL_S", "2"))
+# Comment line sent to idle streams so proxies and mobile networks keep them open
+NOTIFY_HEARTBEAT_S = float(os.environ.get("NOTIFY_HEARTBEAT_S", "15"))
+# Reconnect delay suggested to EventSource clients
+NOTIFY_RETRY_MS = int(os.environ.get("NOTIFY_RETRY_MS", "3000"))
+# Undelivered notifications held per connection before it is dropped (the client resumes from the DB)
+NOTIFY_QUEUE_SIZE = int(os.environ.get("NOTIFY_QUEUE_SIZE", "100"))
+# A resuming stream replays missed notifications a page at a time, up to NOTIFY_REPLAY_MAX; past
+# that it gets a "resync" event and catches up through the paged GET /notifications instead
+NOTIFY_REPLAY_PAGE = int(os.environ.get("NOTIFY_REPLAY_PAGE", "100"))
+NOTIFY_REPLAY_MAX = int(os.environ.get("NOTIFY_REPLAY_MAX", "1000"))
+
+FETCH_LIMIT = 1000
+
+
+def notification_dict(n):
+    return {"id": n.id, "type": n.type, "content": n.content, "read": n.read_flag}
+
+
+class Subscription:
+    def __init__(self, user_id, max_pending):
+        self.user_id = user_id
+        self.max_pending = max_pending
+        self.pending = deque()
+        self.ready = asyncio.Event()
+        self.overflowed = False
+
+    def push(self, note):
+        if len(self.pending) >= self.max_pending:
+            self.overflowed = True
+        else:
+            self.pending.append(note)
+        self.ready.set()
+
+    async def get(self, timeout):
+        # Everything pending, or [] after timeout seconds of silence
+        try:
+            await asyncio.wait_for(self.ready.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return []
+        self.ready.clear()
+        notes = list(self.pending)
+        self.pending.clear()
+        return notes
+
+
+class NotificationHub:
+    """
+    In-process pub/sub from new Notification rows to connected streams.
+
+    A single tail query (id > watermark) per poll feeds every connection in this process, so
+    open app sessions add no per-client database load. Writers in this process call wake()
+    (thread-safe) to deliver immediately; rows written elsewhere arrive on the next poll.
+
+    Ids are assumed to become visible in order, which holds on SQLite (one writer at a time).
+    On PostgreSQL a transaction can commit a lower id after a higher one was already delivered;
+    the stream skips that row, and the client sees it on its next POST /notifications or /sync.
+    """
+
+    def __init__(self, engine=default_engine, poll_s=NOTIFY_POLL_S, queue_size=NOTIFY_QUEUE_SIZE):
+        self.engine = engine
+        self.poll_s = poll_s
+        self.queue_size = queue_size
+        self._subscribers = {}  # user_id -> set of Subscription
+        self._watermark = None
+        self._subscribe_count = 0
+        self._loop = None
+        self._task = None
+        self._wake = None
+
+        self.connections = 0
+        self.polls = 0
+        self.delivered = 0
+        self.overflows = 0
+
+    async def _ensure_task(self):
+        loop = asyncio.get_running_loop()
+        if self._watermark is None:
+            # Anchored before the first subscribe returns: rows written after that are delivered
+            watermark = await asyncio.to_thread(self._max_id)
+            if self._watermark is None:
+                self._watermark = watermark
+        if self._task is None or self._task.done() or self._loop is not loop:
+            self._loop = loop
+            self._wake = asyncio.Event()
+            self._task = loop.create_task(self._run())
+
+    async def subscribe(self, user_id):
+        await self._ensure_task()
+        subscription = Subscription(user_id, self.queue_size)
+        self._subscribers.setdefault(user_id, set()).add(subscription)
+        self._subscribe_count += 1
+        self.connections += 1
+        return subscription
+
+    def unsubscribe(self, subscription):
+        subs = self._subscribers.get(subscription.user_id)
+        if subs is not None and subscription in subs:
+            subs.discard(subscription)
+            self.connections -= 1
+            if not subs:
+                del self._subscribers[subscription.user_id]
+
+    def wake(self):
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._wake.set)
+
+    def _max_id(self):
+        with self.engine.connect() as conn:
+            return conn.execute(select(func.max(Notification.id))).scalar() or 0
+
+    def _fetch_new(self, watermark, listening):
+        # (rows after watermark, new watermark); runs in a thread, so it doesn't touch hub state
+        if not listening:
+            # Nobody listening: just find how far to skip
+            return [], max(self._max_id(), watermark)
+        with self.engine.connect() as conn:
+            rows = conn.execute(
+                select(Notification.id, Notification.user_id, Notification.type, Notification.content,
+                       Notification.read_flag)
+                .where(Notification.id > watermark)
+                .order_by(Notification.id)
+                .limit(FETCH_LIMIT)
+            ).all()
+        return rows, rows[-1].id if rows else watermark
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.poll_s)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                while True:
+                    subscribe_count, listening = self._subscribe_count, bool(self._subscribers)
+                    rows, watermark = await asyncio.to_thread(self._fetch_new, self._watermark, listening)
+                    self.polls += 1
+                    if not listening and subscribe_count != self._subscribe_count:
+                        # Someone subscribed while this poll skipped ahead: scan from the old watermark instead
+                        continue
+                    self._watermark = watermark
+                    self._dispatch(rows)
+                    if len(rows) < FETCH_LIMIT:
+                        break
+            except Exception:
+                # Database hiccup: keep the streams open and try again next poll
+                await asyncio.sleep(self.poll_s)
+
+    def _dispatch(self, rows):
+        for row in rows:
+            for subscription in self._subscribers.get(row.user_id, ()):
+                overflowed = subscription.overflowed
+                subscription.push(notification_dict(row))
+                self.delivered += 1
+                if subscription.overflowed and not overflowed:
+                    self.overflows += 1
+
+    def replay(self, user_id, after_id, limit=NOTIFY_REPLAY_PAGE):
+        """One keyset page of user_id's notifications with id > after_id, oldest first (Last-Event-ID resume)."""
+        with self.engine.connect() as conn:
+            rows = conn.execute(
+                select(Notification.id, Notification.type, Notification.content, Notification.read_flag)
+                .where(Notification.user_id == user_id, Notification.id > after_id)
+                .order_by(Notification.id)
+                .limit(limit)
+            ).all()
+        return [notification_dict(r) for r in rows]
+
+    def stats(self):
+        return {
+            "connections": self.connections,
+            "users": len(self._subscribers),
+            "poll_s": self.poll_s,
+            "polls": self.polls,
+            "delivered": self.delivered,
+            "overflows": self.overflows,
+            "watermark": self._watermark,
+        }
+
+
+notification_hub = NotificationHub()
@@ -0,0 +1,219 @@
+# app/models/prediction_cache.py
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image
+
+CACHE_SIZE = int(os.environ.get("DIAGNOSIS_CACHE_SIZE", "10000"))
+# Set to a file path (e.g. ./prediction_cache.db) to keep cached predictions across restarts
+CACHE_DB = os.environ.get("DIAGNOSIS_CACHE_DB", "")
+# Max Hamming distance between perceptual hashes to count as the same photo (0 = exact matches only, max 3)
+PHASH_DISTANCE = int(os.environ.get("DIAGNOSIS_CACHE_PHASH_DISTANCE", "0"))
+
+# SQLite copy: hits refresh last_used in batches of this many, and rows are pruned back to
+# max_size only once they exceed it by PRUNE_SLACK of it, not on every insert
+TOUCH_BATCH = 64
+PRUNE_SLACK = 0.1
+
+# The 64-bit dHash is split into 4 bands of 16 bits: two hashes within distance 3
+# must agree on at least one band, so candidates come from band lookups, not a scan.
+PHASH_BANDS = 4
+MAX_PHASH_DISTANCE = PHASH_BANDS - 1
+
+
+def dhash(img_array):
+    # Difference hash of a (224,224,3) array in [0,1]: robust to re-compression and rescaling
+    gray = (img_array @ np.array([0.299, 0.587, 0.114], dtype=np.float32)) * 255.0
+    small = np.asarray(Image.fromarray(gray.astype(np.uint8)).resize((9, 8), Image.BILINEAR), dtype=np.int16)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int(np.packbits(bits).view(">u8")[0])
+
+
+def _bands(phash):
+    return [(b, (phash >> (16 * b)) & 0xFFFF) for b in range(PHASH_BANDS)]
+
+
+class PredictionCache:
+    """
+    LRU cache of diagnosis results keyed by sha256(decoded image + model version).
+
+    Optionally persisted to SQLite (db_path) and optionally matching near-duplicate
+    photos by perceptual hash (phash_distance > 0). Safe to use from executor threads.
+    """
+
+    def __init__(self, model_version, max_size=CACHE_SIZE, db_path=CACHE_DB, phash_distance=PHASH_DISTANCE):
+        self.model_version = str(model_version)
+        self.max_size = max(1, int(max_size))
+        self.phash_distance = min(max(0, int(phash_distance)), MAX_PHASH_DISTANCE)
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (phash, result)
+        self._band_index = {}  # (band, value) -> set of keys
+
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._db = None
+        self._touched = {}  # key -> last hit time, not yet written to disk
+        self._db_rows = 0
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS prediction_cache ("
+                " key TEXT PRIMARY KEY, phash INTEGER, model_version TEXT,"
+                " disease TEXT, confidence REAL, last_used REAL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS ix_prediction_cache_last_used ON prediction_cache (last_used)")
+            self._db.commit()
+            self._load()
+
+    def fingerprint(self, img_array):
+        digest = hashlib.sha256(self.model_version.encode())
+        digest.update(np.ascontiguousarray(img_array, dtype=np.float32).tobytes())
+        phash = dhash(img_array) if self.phash_distance else None
+        return digest.hexdigest(), phash
+
+    def get(self, fingerprint):
+        key, phash = fingerprint
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._touch(key)
+                self.hits += 1
+                return entry[1]
+            if phash is not None:
+                near = self._nearest(phash)
+                if near is not None:
+                    self._entries.move_to_end(near)
+                    self._touch(near)
+                    self.near_hits += 1
+                    return self._entries[near][1]
+            self.misses += 1
+            return None
+
+    def put(self, fingerprint, result):
+        key, phash = fingerprint
+        with self._lock:
+            known = key in self._entries
+            self._insert(key, phash, result)
+            if self._db is not None:
+                self._touched.pop(key, None)
+                self._db.execute(
+                    "INSERT OR REPLACE INTO prediction_cache VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, _to_signed(phash), self.model_version, result["disease"], result["confidence"], time.time()),
+                )
+                if not known:
+                    self._db_rows += 1
+                if self._db_rows > self.max_size * (1 + PRUNE_SLACK):
+                    self._prune()
+                self._db.commit()
+
+    def _touch(self, key):
+        if self._db is None:
+            return
+        self._touched[key] = time.time()
+        if len(self._touched) >= TOUCH_BATCH:
+            self._flush_touches()
+            self._db.commit()
+
+    def _flush_touches(self):
+        self._db.executemany(
+            "UPDATE prediction_cache SET last_used = ? WHERE key = ?",
+            [(used, key) for key, used in self._touched.items()],
+        )
+        self._touched.clear()
+
+    def _prune(self):
+        # Pending hits first, so eviction goes by last use rather than by insertion
+        self._flush_touches()
+        self._db.execute(
+            "DELETE FROM prediction_cache WHERE key IN ("
+            " SELECT key FROM prediction_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (self.max_size,),
+        )
+        self._db_rows = self._db.execute("SELECT COUNT(*) FROM prediction_cache").fetchone()[0]
+
+    def stats(self):
+        lookups = self.hits + self.near_hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "model_version": self.model_version,
+            "persistent": self._db is not None,
+            "phash_distance": self.phash_distance,
+            "hits": self.hits,
+            "near_hits": self.near_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round((self.hits + self.near_hits) / lookups, 4) if lookups else 0.0,
+        }
+
+    def _insert(self, key, phash, result):
+        if key in self._entries:
+            self._unindex(key)
+        self._entries[key] = (phash, result)
+        self._entries.move_to_end(key)
+        if phash is not None:
+            for band in _bands(phash):
+                self._band_index.setdefault(band, set()).add(key)
+        while len(self._entries) > self.max_size:
+            oldest = next(iter(self._entries))
+            self._unindex(oldest)
+            del self._entries[oldest]
+            self.evictions += 1
+
+    def _unindex(self, key):
+        phash = self._entries[key][0]
+        if phash is None:
+            return
+        for band in _bands(phash):
+            keys = self._band_index.get(band)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._band_index[band]
+
+    def _nearest(self, phash):
+        best, best_distance = None, self.phash_distance + 1
+        for band in _bands(phash):
+            for key in self._band_index.get(band, ()):
+                distance = (self._entries[key][0] ^ phash).bit_count()
+                if distance < best_distance:
+                    best, best_distance = key, distance
+        return best
+
+    def _load(self):
+        # Warm the in-memory LRU from disk, oldest first so the most recent end up hottest
+        rows = self._db.execute(
+            "SELECT key, phash, disease, confidence FROM prediction_cache"
+            " WHERE model_version = ? ORDER BY last_used DESC LIMIT ?",
+            (self.model_version, self.max_size),
+        ).fetchall()
+        for key, phash, disease, confidence in reversed(rows):
+            phash = _to_unsigned(phash) if self.phash_distance else None
+            self._insert(key, phash, {"disease": disease, "confidence": confidence})
+        # Entries from other model versions can never hit again
+        self._db.execute("DELETE FROM prediction_cache WHERE model_version != ?", (self.model_version,))
+        self._db_rows = self._db.execute("SELECT COUNT(*) FROM prediction_cache").fetchone()[0]
+        self._db.commit()
+
+
+def _to_signed(phash):
+    # SQLite integers are signed 64-bit
+    if phash is None:
+        return None
+    return phash - (1 << 64) if phash >= (1 << 63) else phash
+
+
+def _to_unsigned(phash):
+    if phash is None:
+        return None
+    return phash + (1 << 64) if phash < 0 else phash
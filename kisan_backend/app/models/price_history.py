@@ -0,0 +1,230 @@
+# price_history.py (run from project root)
+# Rolling price aggregates (7/30-day mean, 30-day min/max, % change) per crop/mandi.
+#
+# Ingest calls record_history() + refresh_stats() for the keys it touched, so PriceStats is always
+# current and /market reads it with a primary-key join. After a large historical load (ingest with
+# --no-stats) rebuild everything in one vectorized pass:
+#
+#   python -m app.models.price_history --backfill
+import argparse
+import json
+import math
+import time
+from datetime import date, timedelta
+
+import numpy as np
+from sqlalchemy import func, or_, select, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app.models.data_versions import bump_data_version
+from app.models.models import PriceHistory, PriceStats
+
+WINDOW_DAYS = 30
+SHORT_WINDOW_DAYS = 7
+
+
+def _insert(conn, model):
+    dialect = postgresql if conn.dialect.name == "postgresql" else sqlite
+    return dialect.insert(model.__table__)
+
+
+def record_history(conn, rows):
+    # rows: dicts with crop_key, mandi_key, price_date, price; re-ingesting a day overwrites it
+    if not rows:
+        return
+    stmt = _insert(conn, PriceHistory)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["crop_key", "mandi_key", "price_date"],
+        set_={"price": stmt.excluded.price},
+    )
+    conn.execute(stmt, [
+        {"crop_key": r["crop_key"], "mandi_key": r["mandi_key"], "price_date": r["price_date"], "price": r["price"]}
+        for r in rows
+    ])
+
+
+def compute_stats(crop_keys, mandi_keys, ordinals, prices):
+    """
+    Aggregates for each crop/mandi group as of its latest date.
+
+    Inputs are parallel arrays sorted by (crop_key, mandi_key, date), dates as date.toordinal().
+    Everything is computed with grouped NumPy reductions, no per-row Python.
+    """
+    n = len(prices)
+    if n == 0:
+        return []
+    crop_keys = np.asarray(crop_keys, dtype=object)
+    mandi_keys = np.asarray(mandi_keys, dtype=object)
+    ordinals = np.asarray(ordinals, dtype=np.int64)
+    prices = np.asarray(prices, dtype=np.float64)
+
+    new_group = np.ones(n, dtype=bool)
+    new_group[1:] = (crop_keys[1:] != crop_keys[:-1]) | (mandi_keys[1:] != mandi_keys[:-1])
+    starts = np.flatnonzero(new_group)
+    ends = np.append(starts[1:], n)
+    counts = ends - starts
+    last = ends - 1
+
+    age = np.repeat(ordinals[last], counts) - ordinals  # days before the group's latest price
+    in_short = age < SHORT_WINDOW_DAYS
+    in_window = age < WINDOW_DAYS
+
+    count_short = np.add.reduceat(in_short.astype(np.int64), starts)
+    count_window = np.add.reduceat(in_window.astype(np.int64), starts)
+    mean_short = np.add.reduceat(np.where(in_short, prices, 0.0), starts) / count_short
+    mean_window = np.add.reduceat(np.where(in_window, prices, 0.0), starts) / count_window
+    min_window = np.minimum.reduceat(np.where(in_window, prices, np.inf), starts)
+    max_window = np.maximum.reduceat(np.where(in_window, prices, -np.inf), starts)
+
+    last_price = prices[last]
+    prev_price = np.where(counts > 1, prices[np.maximum(last - 1, 0)], np.nan)
+    first_short = prices[ends - count_short]  # rows are date-ordered, so the window is the group's tail
+    with np.errstate(divide="ignore", invalid="ignore"):
+        change = (last_price - prev_price) / prev_price * 100.0
+        change_short = np.where(count_short > 1, (last_price - first_short) / first_short * 100.0, np.nan)
+
+    def clean(x):
+        x = float(x)
+        return None if math.isnan(x) or math.isinf(x) else round(x, 4)
+
+    return [
+        {
+            "crop_key": crop_keys[s],
+            "mandi_key": mandi_keys[s],
+            "last_date": date.fromordinal(int(ordinals[e])),
+            "last_price": clean(last_price[i]),
+            "prev_price": clean(prev_price[i]),
+            "change_pct": clean(change[i]),
+            "change_7d_pct": clean(change_short[i]),
+            "mean_7d": clean(mean_short[i]),
+            "mean_30d": clean(mean_window[i]),
+            "min_30d": clean(min_window[i]),
+            "max_30d": clean(max_window[i]),
+            "samples_30d": int(count_window[i]),
+        }
+        for i, (s, e) in enumerate(zip(starts, last))
+    ]
+
+
+def upsert_stats(conn, stats):
+    if not stats:
+        return
+    stmt = _insert(conn, PriceStats)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["crop_key", "mandi_key"],
+        set_={c: stmt.excluded[c] for c in stats[0] if c not in ("crop_key", "mandi_key")},
+    )
+    conn.execute(stmt, stats)
+
+
+def _fetch_ordered(conn, query):
+    rows = conn.execute(query.order_by(PriceHistory.crop_key, PriceHistory.mandi_key, PriceHistory.price_date)).all()
+    return (
+        [r.crop_key for r in rows],
+        [r.mandi_key for r in rows],
+        [r.price_date.toordinal() for r in rows],
+        [r.price for r in rows],
+    )
+
+
+def load_stats(conn, keys):
+    # {(crop_key, mandi_key): (last_date, last_price)} as currently stored
+    keys = list(keys)
+    if not keys:
+        return {}
+    rows = conn.execute(
+        select(PriceStats.crop_key, PriceStats.mandi_key, PriceStats.last_date, PriceStats.last_price)
+        .where(tuple_(PriceStats.crop_key, PriceStats.mandi_key).in_(keys))
+    ).all()
+    return {(r.crop_key, r.mandi_key): (r.last_date, r.last_price) for r in rows}
+
+
+def refresh_stats(conn, keys, earliest_date):
+    """
+    Recompute PriceStats for the touched (crop_key, mandi_key) pairs only.
+
+    Each key's window ends at its latest date, which is at least any date just ingested for it,
+    so the aggregates never need history before earliest_date - WINDOW_DAYS. prev_price does:
+    a key's previous quote can be older than that, so each key's latest row before the cutoff
+    is read too. It falls outside every window and only ever serves as prev_price.
+    """
+    keys = list(keys)
+    if not keys:
+        return []
+    cutoff = earliest_date - timedelta(days=WINDOW_DAYS)
+    key = tuple_(PriceHistory.crop_key, PriceHistory.mandi_key)
+    latest_before = (
+        select(PriceHistory.crop_key, PriceHistory.mandi_key, func.max(PriceHistory.price_date))
+        .where(key.in_(keys), PriceHistory.price_date <= cutoff)
+        .group_by(PriceHistory.crop_key, PriceHistory.mandi_key)
+    )
+    query = select(PriceHistory.crop_key, PriceHistory.mandi_key, PriceHistory.price_date, PriceHistory.price).where(
+        key.in_(keys),
+        or_(
+            PriceHistory.price_date > cutoff,
+            tuple_(PriceHistory.crop_key, PriceHistory.mandi_key, PriceHistory.price_date).in_(latest_before),
+        ),
+    )
+    stats = compute_stats(*_fetch_ordered(conn, query))
+    upsert_stats(conn, stats)
+    return stats
+
+
+def backfill_stats(engine, block_rows=200_000):
+    """Rebuild PriceStats for every key from the full history, streaming it in bounded blocks."""
+    started = time.perf_counter()
+    total_rows = total_keys = 0
+    query = select(PriceHistory.crop_key, PriceHistory.mandi_key, PriceHistory.price_date, PriceHistory.price).order_by(
+        PriceHistory.crop_key, PriceHistory.mandi_key, PriceHistory.price_date
+    )
+    columns = ([], [], [], [])
+
+    def flush(conn, upto):
+        nonlocal total_keys
+        stats = compute_stats(*(c[:upto] for c in columns))
+        upsert_stats(conn, stats)
+        total_keys += len(stats)
+        for c in columns:
+            del c[:upto]
+
+    # One connection for the streaming read and the writes (SQLite won't commit past an open reader)
+    with engine.begin() as conn:
+        for row in conn.execution_options(stream_results=True, yield_per=10_000).execute(query):
+            total_rows += 1
+            for c, v in zip(columns, (row.crop_key, row.mandi_key, row.price_date.toordinal(), row.price)):
+                c.append(v)
+            if len(columns[3]) % block_rows == 0:
+                # Cut at the start of the last (possibly incomplete) group; carry it into the next block
+                ck, mk = columns[0], columns[1]
+                cut = len(ck) - 1
+                while cut > 0 and ck[cut - 1] == ck[-1] and mk[cut - 1] == mk[-1]:
+                    cut -= 1
+                if cut > 0:
+                    flush(conn, cut)
+        if columns[3]:
+            flush(conn, len(columns[3]))
+        bump_data_version(conn, "market_prices")
+
+    elapsed = time.perf_counter() - started
+    return {"history_rows": total_rows, "keys": total_keys, "seconds": round(elapsed, 3)}
+
+
+def main():
+    from app.models.database import engine
+    from app.models.migrations import upgrade_schema
+    from app.models.models import Base
+
+    parser = argparse.ArgumentParser(description="Maintain rolling price aggregates")
+    parser.add_argument("--backfill", action="store_true", help="recompute price_stats from all of price_history")
+    parser.add_argument("--block-rows", type=int, default=200_000)
+    args = parser.parse_args()
+    if not args.backfill:
+        parser.error("nothing to do (use --backfill)")
+
+    Base.metadata.create_all(bind=engine)
+    upgrade_schema(engine, Base.metadata)
+    print(json.dumps(backfill_stats(engine, args.block_rows)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+# app/models/sync.py
+# Delta sync for offline-first clients: rows of market_prices, schemes and notifications changed
+# since a client's cursor, plus tombstones for deleted rows, so a phone that was offline for days
+# downloads what changed instead of every list again.
+#
+# Every insert, and every update that changes a column, stamps the row's change_seq in the
+# database itself (triggers), so ingest, the alert job, ORM writes and raw SQL are all covered:
+#   SQLite: a one-row counter bumped per change. Writers are serialized, so every stamp below the
+#   counter's current value is committed. That is two extra row writes per changed row, which ingest
+#   pays: a 200k-row first ingest (ingest_prices) went from 12.0-13.3 s to 16.6 s with the triggers.
+#   PostgreSQL: the writing transaction's id (pg_current_xact_id, PostgreSQL 13+). Transactions
+#   commit out of id order, so a sync only reads stamps below the snapshot's xmin (the oldest
+#   transaction still running); later ones are picked up by the next sync.
+# A sync reads [since, until) in (change_seq, id) order per stream, a page at a time; the cursor
+# carries the window, each stream's position and the crops filter, and becomes {since: until} once
+# all are drained. A sync with a different crops filter than its cursor's is told to reset.
+#
+# Tombstones older than --prune-days can be dropped (run from cron); clients whose cursor predates
+# the pruned range are told to reset and resync from scratch:
+#
+#   python -m app.models.sync --prune-days 30
+import argparse
+import base64
+import datetime
+import json
+import logging
+
+from sqlalchemy import delete, func, insert, or_, select, text, tuple_
+
+from app.models.models import MarketPrice, Notification, Scheme, SyncDeletion, normalize_key
+
+logger = logging.getLogger(__name__)
+
+# Stream name -> (model, columns sent to clients)
+STREAMS = {
+    "market_prices": (MarketPrice, ("id", "crop", "mandi", "price", "trend", "price_date")),
+    "schemes": (Scheme, ("id", "name", "benefits", "docs_needed", "deadline")),
+    "notifications": (Notification, ("id", "type", "content", "read_flag")),
+}
+DELETED = "deleted"
+DELETED_COLUMNS = ("table_name", "row_id")
+
+# Marker tombstone recording how far tombstones were pruned
+PRUNED_MARKER = "*"
+
+_COUNTER = "sync_counter"
+
+
+def _sqlite_ddl(table, user_column):
+    data_columns = [c.name for c in table.columns if c.name not in ("id", "change_seq")]
+    changed = " OR ".join(f"new.{c} IS NOT old.{c}" for c in data_columns)
+    bump = f"UPDATE {_COUNTER} SET value = value + 1 WHERE id = 1;"
+    stamp = f"(SELECT value FROM {_COUNTER} WHERE id = 1)"
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS {table.name}_sync_ai AFTER INSERT ON {table.name} BEGIN {bump}"
+        f" UPDATE {table.name} SET change_seq = {stamp} WHERE id = new.id; END",
+        # The stamp update above doesn't re-fire this: change_seq differs in it
+        f"CREATE TRIGGER IF NOT EXISTS {table.name}_sync_au AFTER UPDATE ON {table.name}"
+        f" WHEN new.change_seq IS old.change_seq AND ({changed}) BEGIN {bump}"
+        f" UPDATE {table.name} SET change_seq = {stamp} WHERE id = new.id; END",
+        f"CREATE TRIGGER IF NOT EXISTS {table.name}_sync_ad AFTER DELETE ON {table.name} BEGIN {bump}"
+        f" INSERT INTO sync_deletions (table_name, row_id, user_id, change_seq, deleted_at)"
+        f" VALUES ('{table.name}', old.id, {'old.' + user_column if user_column else 'NULL'}, {stamp}, CURRENT_TIMESTAMP); END",
+    ]
+
+
+_PG_FUNCTIONS = [
+    """CREATE OR REPLACE FUNCTION sync_stamp() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'UPDATE' AND NEW IS NOT DISTINCT FROM OLD THEN
+        RETURN NEW;
+    END IF;
+    NEW.change_seq := pg_current_xact_id()::text::bigint;
+    RETURN NEW;
+END $$ LANGUAGE plpgsql""",
+    """CREATE OR REPLACE FUNCTION sync_tombstone() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO sync_deletions (table_name, row_id, user_id, change_seq, deleted_at)
+    VALUES (TG_TABLE_NAME, OLD.id, (to_jsonb(OLD) ->> 'user_id')::integer, pg_current_xact_id()::text::bigint, now());
+    RETURN OLD;
+END $$ LANGUAGE plpgsql""",
+]
+
+
+def ensure_change_tracking(conn):
+    """Stamp pre-existing rows and create the triggers if missing (idempotent)."""
+    dialect = conn.dialect.name
+    for model, _ in STREAMS.values():
+        # Rows from before tracking count as changed at stamp 0: a first sync (since 0) includes them
+        conn.execute(text(f"UPDATE {model.__tablename__} SET change_seq = 0 WHERE change_seq IS NULL"))
+    if dialect == "sqlite":
+        conn.execute(text(f"CREATE TABLE IF NOT EXISTS {_COUNTER} (id INTEGER PRIMARY KEY CHECK (id = 1), value INTEGER NOT NULL)"))
+        conn.execute(text(f"INSERT OR IGNORE INTO {_COUNTER} (id, value) VALUES (1, 0)"))
+        for model, _ in STREAMS.values():
+            user_column = "user_id" if "user_id" in model.__table__.columns else None
+            for ddl in _sqlite_ddl(model.__table__, user_column):
+                conn.execute(text(ddl))
+    elif dialect == "postgresql":
+        for ddl in _PG_FUNCTIONS:
+            conn.execute(text(ddl))
+        for name in STREAMS:
+            for trigger, ddl in (
+                (f"{name}_sync_stamp", f"BEFORE INSERT OR UPDATE ON {name} FOR EACH ROW EXECUTE FUNCTION sync_stamp()"),
+                (f"{name}_sync_tombstone", f"AFTER DELETE ON {name} FOR EACH ROW EXECUTE FUNCTION sync_tombstone()"),
+            ):
+                exists = conn.execute(text("SELECT 1 FROM pg_trigger WHERE tgname = :name"), {"name": trigger}).first()
+                if not exists:
+                    conn.execute(text(f"CREATE TRIGGER {trigger} {ddl}"))
+    else:
+        logger.warning("Delta sync has no change tracking for %s; /sync only returns stamp-0 rows", dialect)
+
+
+def upper_bound(conn):
+    """Exclusive stamp bound below which every change is committed and visible."""
+    if conn.dialect.name == "postgresql":
+        return conn.execute(text("SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint")).scalar()
+    value = conn.execute(text(f"SELECT value FROM {_COUNTER} WHERE id = 1")).scalar()
+    return (value or 0) + 1
+
+
+def pruned_through(conn):
+    return conn.execute(
+        select(func.max(SyncDeletion.change_seq)).where(SyncDeletion.table_name == PRUNED_MARKER)
+    ).scalar() or 0
+
+
+def encode_cursor(since, until=None, positions=None, crop_keys=()):
+    state = {"s": since}
+    if until is not None:
+        state.update(u=until, p=positions or {})
+    if crop_keys:
+        state["c"] = sorted(crop_keys)
+    return base64.urlsafe_b64encode(json.dumps(state, separators=(",", ":")).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """(since, until, positions, crop_keys); raises ValueError on anything that isn't one of ours."""
+    if not cursor:
+        return 0, None, {}, []
+    try:
+        state = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        since, until, positions = int(state["s"]), state.get("u"), state.get("p", {})
+        positions = {k: (int(v[0]), int(v[1])) for k, v in positions.items() if k in STREAMS or k == DELETED}
+        crop_keys = sorted(str(k) for k in state.get("c", []))
+        return since, int(until) if until is not None else None, positions, crop_keys
+    except (ValueError, KeyError, TypeError, IndexError) as e:
+        raise ValueError("Invalid sync cursor") from e
+
+
+def _plain(value):
+    # msgpack has no date type; both encodings send ISO strings
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return value
+
+
+def _page(conn, stmt, model, since, until, position, limit):
+    stamp = model.change_seq
+    stmt = stmt.where(stamp < until)
+    if position is None:
+        stmt = stmt.where(stamp >= since)
+    else:
+        stmt = stmt.where(tuple_(stamp, model.id) > tuple_(*position))
+    rows = conn.execute(stmt.order_by(stamp, model.id).limit(limit + 1)).all()
+    more = len(rows) > limit
+    rows = rows[:limit]
+    # Last two selected columns are always (change_seq, id)
+    end = (rows[-1][-2], rows[-1][-1]) if rows else position
+    return [[_plain(v) for v in r[:-2]] for r in rows], end, more
+
+
+def changes(conn, user_id, cursor=None, limit=500, crops=()):
+    """One page of changes for a user; returns the response dict (minus encoding)."""
+    since, until, positions, cursor_crops = decode_cursor(cursor)
+    crop_keys = sorted({normalize_key(c) for c in crops if c and c.strip()})
+    reset = False
+    if crop_keys != cursor_crops and (since > 0 or until is not None):
+        # The client holds market_prices for another crop filter: rows of newly added crops
+        # changed before its cursor would never be sent, so start over with the new filter
+        since, until, reset = 0, None, True
+    if until is None:
+        until = upper_bound(conn)
+        positions = {}
+        if since > 0 and since <= pruned_through(conn):
+            # Deletions this client never saw may have been pruned: start over
+            since, reset = 0, True
+    result = {"changes": {}, "reset": reset}
+    more = {}
+    for name, (model, columns) in STREAMS.items():
+        stmt = select(*(model.__table__.c[c] for c in columns), model.change_seq, model.id)
+        if model is Notification:
+            stmt = stmt.where(Notification.user_id == user_id)
+        elif model is MarketPrice and crop_keys:
+            stmt = stmt.where(MarketPrice.crop_key.in_(crop_keys))
+        rows, positions[name], more[name] = _page(conn, stmt, model, since, until, positions.get(name), limit)
+        result["changes"][name] = {"columns": list(columns), "rows": rows}
+    stmt = select(SyncDeletion.table_name, SyncDeletion.row_id, SyncDeletion.change_seq, SyncDeletion.id).where(
+        or_(SyncDeletion.table_name.in_(["market_prices", "schemes"]),
+            (SyncDeletion.table_name == "notifications") & (SyncDeletion.user_id == user_id))
+    )
+    rows, positions[DELETED], more[DELETED] = _page(conn, stmt, SyncDeletion, since, until, positions.get(DELETED), limit)
+    result["deleted"] = {"columns": list(DELETED_COLUMNS), "rows": rows}
+    result["has_more"] = any(more.values())
+    if result["has_more"]:
+        result["cursor"] = encode_cursor(since, until, {k: v for k, v in positions.items() if v is not None}, crop_keys)
+    else:
+        result["cursor"] = encode_cursor(until, crop_keys=crop_keys)
+    return result
+
+
+def prune_deletions(conn, older_than_days):
+    """Drop tombstones older than the cutoff; returns how many were removed."""
+    cutoff = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=older_than_days)
+    old = (SyncDeletion.deleted_at < cutoff) & (SyncDeletion.table_name != PRUNED_MARKER)
+    through = conn.execute(select(func.max(SyncDeletion.change_seq)).where(old)).scalar()
+    if through is None:
+        return 0
+    # Everything up to that stamp goes, so "pruned through" is exact even if stamps and times disagree
+    removed = conn.execute(delete(SyncDeletion).where(SyncDeletion.change_seq <= through)).rowcount
+    conn.execute(delete(SyncDeletion).where(SyncDeletion.table_name == PRUNED_MARKER))
+    conn.execute(insert(SyncDeletion).values(table_name=PRUNED_MARKER, row_id=0, change_seq=through))
+    return removed
+
+
+def main():
+    from app.models.database import engine
+    from app.models.migrations import upgrade_schema
+    from app.models.models import Base
+
+    parser = argparse.ArgumentParser(description="Maintain delta-sync tombstones")
+    parser.add_argument("--prune-days", type=float, help="drop tombstones older than this many days")
+    args = parser.parse_args()
+    if args.prune_days is None:
+        parser.error("nothing to do (use --prune-days)")
+
+    Base.metadata.create_all(bind=engine)
+    upgrade_schema(engine, Base.metadata)
+    with engine.begin() as conn:
+        removed = prune_deletions(conn, args.prune_days)
+        through = pruned_through(conn)
+    print(json.dumps({"removed": removed, "pruned_through": through}))
+
+
+if __name__ == "__main__":
+    main()
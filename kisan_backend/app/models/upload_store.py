@@ -0,0 +1,241 @@
+# app/models/upload_store.py
+# Content-addressed storage for diagnosis photos. An upload is copied to a temp file in
+# UPLOAD_CHUNK_BYTES chunks, hashed as it goes and abandoned once it passes the size limit, then
+# renamed to <UPLOAD_DIR>/<2 hex>/<sha256><ext>: identical photos share one file, concurrent
+# uploads can't overwrite each other and no client-supplied name reaches the filesystem.
+# Storing a photo that's already there refreshes its mtime, which is what retention goes by.
+#
+# cleanup() removes photos not uploaded for UPLOAD_RETENTION_DAYS, then the least recently
+# uploaded until the store fits in UPLOAD_MAX_TOTAL_BYTES, and clears CropDiagnosis.photo for the
+# removed keys. The app runs it every UPLOAD_CLEANUP_INTERVAL_S (0 to disable), or from cron:
+#
+#   python -m app.models.upload_store --cleanup
+import argparse
+import datetime
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import namedtuple
+
+from apscheduler.schedulers.background import BackgroundScheduler
+from sqlalchemy import update
+
+from app.models.models import CropDiagnosis
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_DIR = os.environ.get("UPLOAD_DIR", "static/uploads")
+UPLOAD_CHUNK_BYTES = int(os.environ.get("UPLOAD_CHUNK_BYTES", str(64 * 1024)))
+UPLOAD_RETENTION_DAYS = float(os.environ.get("UPLOAD_RETENTION_DAYS", "30"))
+UPLOAD_MAX_TOTAL_BYTES = int(os.environ.get("UPLOAD_MAX_TOTAL_BYTES", str(2 * 1024 ** 3)))
+UPLOAD_CLEANUP_INTERVAL_S = float(os.environ.get("UPLOAD_CLEANUP_INTERVAL_S", "3600"))
+
+# Temp files this old are left over from a crash mid-copy
+STALE_TEMP_S = 3600
+
+# Extension by magic bytes, so the same content always lands on the same key
+_SIGNATURES = ((b"\xff\xd8\xff", ".jpg"), (b"\x89PNG\r\n\x1a\n", ".png"), (b"GIF8", ".gif"), (b"BM", ".bmp"))
+
+StoredUpload = namedtuple("StoredUpload", "key path size sha256 deduplicated mtime_ns")
+
+
+class UploadTooLarge(ValueError):
+    pass
+
+
+def _extension(head):
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return ".webp"
+    for signature, ext in _SIGNATURES:
+        if head.startswith(signature):
+            return ext
+    return ".bin"
+
+
+class UploadStore:
+    """Photos on disk keyed by content hash. Safe to use from executor threads."""
+
+    def __init__(self, root=UPLOAD_DIR, retention_days=UPLOAD_RETENTION_DAYS, max_total_bytes=UPLOAD_MAX_TOTAL_BYTES):
+        self.root = root
+        self.retention_days = retention_days
+        self.max_total_bytes = max_total_bytes
+        self._tmp = os.path.join(root, ".tmp")
+        # Held for file operations only (never across DB I/O): a photo stored again while
+        # cleanup is deciding on it either survives with a fresh mtime or is written back
+        self._lock = threading.Lock()
+        self._stored = self._deduplicated = self._rejected = 0
+
+    def path(self, key):
+        return os.path.join(self.root, key)
+
+    def save(self, fileobj, max_bytes):
+        """Copy a binary file object into the store; raises UploadTooLarge past max_bytes."""
+        os.makedirs(self._tmp, exist_ok=True)
+        digest = hashlib.sha256()
+        size, head = 0, b""
+        fd, tmp_path = tempfile.mkstemp(dir=self._tmp, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                while chunk := fileobj.read(UPLOAD_CHUNK_BYTES):
+                    size += len(chunk)
+                    if size > max_bytes:
+                        with self._lock:
+                            self._rejected += 1
+                        raise UploadTooLarge(f"Upload is larger than {max_bytes} bytes")
+                    if len(head) < 16:
+                        head += chunk[:16 - len(head)]
+                    digest.update(chunk)
+                    out.write(chunk)
+            sha256 = digest.hexdigest()
+            key = f"{sha256[:2]}/{sha256}{_extension(head)}"
+            final = self.path(key)
+            os.makedirs(os.path.dirname(final), exist_ok=True)
+            with self._lock:
+                deduplicated = os.path.exists(final)
+                if deduplicated:
+                    os.utime(final)
+                    self._deduplicated += 1
+                else:
+                    os.replace(tmp_path, final)
+                    self._stored += 1
+                mtime_ns = os.stat(final).st_mtime_ns
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return StoredUpload(key, final, size, sha256, deduplicated, mtime_ns)
+
+    def discard(self, stored):
+        """Drop a photo that turned out unusable, unless it was already in the store or stored again since."""
+        if stored.deduplicated:
+            return
+        with self._lock:
+            try:
+                # A concurrent upload of the same photo refreshed the mtime and may be keeping it
+                if os.stat(stored.path).st_mtime_ns == stored.mtime_ns:
+                    os.remove(stored.path)
+            except FileNotFoundError:
+                pass
+
+    def _scan(self):
+        # (mtime, size, key) of every stored photo, oldest first
+        entries = []
+        if not os.path.isdir(self.root):
+            return entries
+        for shard in os.scandir(self.root):
+            if not shard.is_dir() or shard.name == ".tmp":
+                continue
+            for entry in os.scandir(shard.path):
+                try:
+                    st = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, f"{shard.name}/{entry.name}"))
+        entries.sort()
+        return entries
+
+    def _remove_if_older(self, key, cutoff):
+        with self._lock:
+            try:
+                if os.stat(self.path(key)).st_mtime >= cutoff:
+                    return False  # stored again since the scan
+                os.remove(self.path(key))
+                return True
+            except FileNotFoundError:
+                return False
+
+    def cleanup(self, engine=None):
+        """Apply retention and the size cap; returns a summary dict."""
+        started = time.time()
+        started_utc = datetime.datetime.utcnow()
+        entries = self._scan()
+        retention_cutoff = started - self.retention_days * 86400
+        total = sum(size for _, size, _ in entries)
+        removed, freed = [], 0
+        for mtime, size, key in entries:
+            expired = mtime < retention_cutoff
+            if not expired and total - freed <= self.max_total_bytes:
+                break  # oldest first: everything after this is newer and the store fits
+            # Evictions for size only take files as old as the scan saw them
+            if self._remove_if_older(key, retention_cutoff if expired else mtime + 1e-6):
+                removed.append(key)
+                freed += size
+
+        if os.path.isdir(self._tmp):
+            for entry in os.scandir(self._tmp):
+                try:
+                    if entry.stat().st_mtime < started - STALE_TEMP_S:
+                        os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+
+        cleared = 0
+        if removed and engine is not None:
+            # Rows written after this run started point at a re-uploaded copy, not the removed one
+            with engine.begin() as conn:
+                for i in range(0, len(removed), 500):
+                    cleared += conn.execute(
+                        update(CropDiagnosis)
+                        .where(CropDiagnosis.photo.in_(removed[i:i + 500]), CropDiagnosis.timestamp < started_utc)
+                        .values(photo=None)
+                    ).rowcount
+        summary = {"removed": len(removed), "freed_bytes": freed, "remaining_bytes": total - freed,
+                   "diagnoses_cleared": cleared, "seconds": round(time.time() - started, 3)}
+        if removed:
+            logger.info("Upload cleanup: %s", summary)
+        return summary
+
+    def stats(self):
+        with self._lock:
+            return {"stored": self._stored, "deduplicated": self._deduplicated, "rejected": self._rejected}
+
+
+upload_store = UploadStore()
+
+_scheduler = None
+
+
+def _scheduled_cleanup():
+    from app.models.database import engine
+
+    try:
+        upload_store.cleanup(engine)
+    except Exception:
+        logger.exception("Upload cleanup failed")
+
+
+def start_cleanup():
+    global _scheduler
+    if UPLOAD_CLEANUP_INTERVAL_S <= 0 or _scheduler is not None:
+        return
+    _scheduler = BackgroundScheduler(daemon=True)
+    _scheduler.add_job(
+        _scheduled_cleanup, "interval", seconds=UPLOAD_CLEANUP_INTERVAL_S,
+        id="upload_cleanup", max_instances=1, coalesce=True,
+    )
+    _scheduler.start()
+
+
+def stop_cleanup():
+    global _scheduler
+    if _scheduler is not None:
+        _scheduler.shutdown(wait=False)
+        _scheduler = None
+
+
+def main():
+    from app.models.database import engine
+
+    parser = argparse.ArgumentParser(description="Maintain the diagnosis photo store")
+    parser.add_argument("--cleanup", action="store_true", help="apply retention and the size cap now")
+    args = parser.parse_args()
+    if not args.cleanup:
+        parser.error("nothing to do (use --cleanup)")
+    print(json.dumps(upload_store.cleanup(engine)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+# app/models/worker_pool.py
+import itertools
+import logging
+import multiprocessing
+import queue
+import time
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+IMAGE_SHAPE = (224, 224, 3)
+
+# A worker that fails to restart is left stopped and not tried again for this long, doubling per
+# consecutive failure, so a pool that can't come back fails requests fast instead of tying up
+# executor threads in restarts
+RESTART_BACKOFF_S = 5.0
+RESTART_BACKOFF_MAX_S = 300.0
+
+
+def _worker_main(backend, path, shm_name, capacity, task_q, result_q):
+    # Runs in a child process: owns one model copy and reads batches from its shared-memory slot
+    from app.models.diagnosis_ml import load_backend
+
+    shm = shared_memory.SharedMemory(name=shm_name)
+    inputs = np.ndarray((capacity, *IMAGE_SHAPE), dtype=np.float32, buffer=shm.buf)
+    try:
+        model = load_backend(backend, path)
+        model.predict(np.zeros((1, *IMAGE_SHAPE), dtype=np.float32))  # warm up before taking work
+        result_q.put(("ready", None))
+        while True:
+            task = task_q.get()
+            if task is None:
+                break
+            task_id, n = task
+            try:
+                # Outputs are (n, classes) floats, small enough to send back through the queue
+                result_q.put((task_id, np.asarray(model.predict(inputs[:n]), dtype=np.float32)))
+            except Exception as e:
+                result_q.put((task_id, f"{type(e).__name__}: {e}"))
+    except Exception as e:
+        result_q.put(("failed", f"{type(e).__name__}: {e}"))
+    finally:
+        del inputs
+        shm.close()
+
+
+class WorkerCrashed(RuntimeError):
+    pass
+
+
+class PoolUnavailable(RuntimeError):
+    """No worker can take the batch until a restart backoff expires (retry_after seconds)."""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class _Worker:
+    def __init__(self, index, capacity, ctx):
+        self.index = index
+        self.ctx = ctx
+        # One input slot per worker, reused across tasks and restarts
+        self.shm = shared_memory.SharedMemory(create=True, size=capacity * int(np.prod(IMAGE_SHAPE)) * 4)
+        self.inputs = np.ndarray((capacity, *IMAGE_SHAPE), dtype=np.float32, buffer=self.shm.buf)
+        self.process = None
+        self.task_q = None
+        self.result_q = None
+        self.restart_failures = 0
+        self.restart_after = 0.0  # monotonic; no restart attempts before this
+
+    def start(self, backend, path, capacity, timeout):
+        # Fresh queues on every (re)start so nothing from a dead process is read by mistake
+        self.task_q = self.ctx.Queue()
+        self.result_q = self.ctx.Queue()
+        self.process = self.ctx.Process(
+            target=_worker_main,
+            args=(backend, path, self.shm.name, capacity, self.task_q, self.result_q),
+            name=f"diagnosis-worker-{self.index}",
+            daemon=True,
+        )
+        self.process.start()
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                status, error = self.result_q.get(timeout=0.5)
+                break
+            except queue.Empty:
+                if not self.process.is_alive():
+                    status, error = "failed", f"exited with code {self.process.exitcode}"
+                    break
+                if time.monotonic() > deadline:
+                    status, error = "failed", f"not ready after {timeout}s"
+                    break
+        if status != "ready":
+            self.stop()
+            raise RuntimeError(f"Inference worker {self.index} failed to start: {error}")
+
+    def stop(self):
+        if self.process is None:
+            return
+        if self.process.is_alive():
+            try:
+                self.task_q.put(None)
+            except (OSError, ValueError):
+                pass
+            self.process.join(timeout=5)
+            if self.process.is_alive():
+                self.process.kill()
+                self.process.join()
+        self.process = None
+
+
+class InferencePool:
+    """
+    Pool of inference processes, each holding its own model copy.
+
+    predict(batch) has the same contract as the in-process backends, so diagnosis_ml can
+    swap it in. Batches travel through per-worker shared-memory slots (only a task id and
+    row count are queued); a worker that dies or hangs is restarted and the batch retried once.
+    Restarts get restart_timeout, far less than the first load's start_timeout, and a worker
+    whose restart failed is skipped until its backoff expires.
+    """
+
+    def __init__(self, size, backend, path, capacity=32, start_timeout=300.0, task_timeout=60.0, restart_timeout=30.0):
+        self.size = max(1, int(size))
+        self.backend = backend
+        self.path = path
+        self.capacity = max(1, int(capacity))
+        self.start_timeout = start_timeout
+        self.task_timeout = task_timeout
+        self.restart_timeout = restart_timeout
+
+        self.ctx = multiprocessing.get_context("spawn")  # fork + TF/ONNX threads is unsafe
+        self._task_ids = itertools.count()
+        self._idle = queue.Queue()
+        self.restarts = 0
+        self.tasks = 0
+        self.failures = 0
+        self._closed = False
+
+        self.workers = [_Worker(i, self.capacity, self.ctx) for i in range(self.size)]
+        try:
+            # Model loads dominate startup, so bring the workers up in parallel
+            with ThreadPoolExecutor(max_workers=self.size) as starter:
+                futures = [starter.submit(w.start, backend, path, self.capacity, start_timeout) for w in self.workers]
+                for future in futures:
+                    future.result()
+        except Exception:
+            self.close()
+            raise
+        for w in self.workers:
+            self._idle.put(w)
+
+    def predict(self, batch):
+        batch = np.asarray(batch, dtype=np.float32)
+        if len(batch) <= self.capacity:
+            return self._predict_chunk(batch)
+        return np.concatenate([
+            self._predict_chunk(batch[start:start + self.capacity])
+            for start in range(0, len(batch), self.capacity)
+        ])
+
+    def unavailable_for(self):
+        """Seconds until some worker could take a batch; 0 if one is running or due a restart."""
+        now = time.monotonic()
+        waits = [0.0 if w.process is not None else max(0.0, w.restart_after - now) for w in self.workers]
+        return min(waits) if waits else 0.0
+
+    def _acquire(self):
+        # Prefer a worker that is running or due a restart over one still backing off
+        worker = self._idle.get()
+        for _ in range(self.size - 1):
+            if worker.process is not None or time.monotonic() >= worker.restart_after:
+                break
+            try:
+                other = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._idle.put(worker)
+            worker = other
+        return worker
+
+    def _predict_chunk(self, batch):
+        worker = self._acquire()
+        try:
+            if worker.process is None:
+                self._restart(worker)
+            try:
+                return self._run_on(worker, batch)
+            except WorkerCrashed:
+                self._restart(worker)
+            try:
+                return self._run_on(worker, batch)
+            except WorkerCrashed:
+                self.failures += 1
+                try:
+                    self._restart(worker)
+                except PoolUnavailable:
+                    pass
+                raise
+        finally:
+            self._idle.put(worker)
+
+    def _run_on(self, worker, batch):
+        n = len(batch)
+        task_id = next(self._task_ids)
+        worker.inputs[:n] = batch
+        worker.task_q.put((task_id, n))
+        self.tasks += 1
+        deadline = time.monotonic() + self.task_timeout
+        while True:
+            try:
+                result_id, result = worker.result_q.get(timeout=0.5)
+            except queue.Empty:
+                if not worker.process.is_alive():
+                    raise WorkerCrashed(f"Inference worker {worker.index} exited with code {worker.process.exitcode}")
+                if time.monotonic() > deadline:
+                    raise WorkerCrashed(f"Inference worker {worker.index} timed out after {self.task_timeout}s")
+                continue
+            if result_id != task_id:
+                continue
+            if isinstance(result, str):
+                raise RuntimeError(result)  # model error, worker itself is fine
+            return result
+
+    def _restart(self, worker):
+        # Raises PoolUnavailable if the worker is still backing off or fails to come back
+        wait = worker.restart_after - time.monotonic()
+        if wait > 0:
+            raise PoolUnavailable(f"Inference worker {worker.index} is down, next restart in {wait:.0f}s", wait)
+        logger.warning("Restarting inference worker %d", worker.index)
+        self.restarts += 1
+        worker.stop()
+        try:
+            worker.start(self.backend, self.path, self.capacity, self.restart_timeout)
+        except Exception as e:
+            # Left stopped; batches routed here fail fast until the backoff expires
+            worker.restart_failures += 1
+            backoff = min(RESTART_BACKOFF_S * 2 ** (worker.restart_failures - 1), RESTART_BACKOFF_MAX_S)
+            worker.restart_after = time.monotonic() + backoff
+            logger.exception("Inference worker %d failed to restart; next attempt in %.0fs", worker.index, backoff)
+            raise PoolUnavailable(f"Inference worker {worker.index} failed to restart: {e}", backoff) from e
+        worker.restart_failures = 0
+
+    def stats(self):
+        return {
+            "size": self.size,
+            "idle": self._idle.qsize(),
+            "alive": sum(1 for w in self.workers if w.process is not None and w.process.is_alive()),
+            "tasks": self.tasks,
+            "restarts": self.restarts,
+            "failures": self.failures,
+            "unavailable_for_s": round(self.unavailable_for(), 1),
+        }
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        for w in self.workers:
+            w.stop()
+            del w.inputs
+            w.shm.close()
+            w.shm.unlink()
@@ -0,0 +1,163 @@
+# app/routes/admission.py
+import asyncio
+import math
+import os
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+
+from fastapi import HTTPException
+
+# Requests allowed to run at once, and how many more may wait for a slot
+DIAGNOSIS_MAX_IN_FLIGHT = int(os.environ.get("DIAGNOSIS_MAX_IN_FLIGHT", "32"))
+DIAGNOSIS_MAX_QUEUE = int(os.environ.get("DIAGNOSIS_MAX_QUEUE", "64"))
+# Longest a queued request waits before giving up with 503
+DIAGNOSIS_MAX_QUEUE_WAIT_S = float(os.environ.get("DIAGNOSIS_MAX_QUEUE_WAIT_S", "10"))
+# Running + queued requests allowed per user (0 = no per-user cap)
+DIAGNOSIS_MAX_PER_USER = int(os.environ.get("DIAGNOSIS_MAX_PER_USER", "0"))
+
+
+class AdmissionController:
+    """
+    Bounded in-flight limit with a bounded, per-user round-robin wait queue.
+
+    When every slot is busy, requests queue up to max_queue; beyond that (or past
+    max_per_user for one caller, or after max_queue_wait) they are rejected at once
+    with 503/429 and a Retry-After hint, so some callers succeed instead of all timing out.
+    Freed slots go to waiting users in turn, so one client's burst can't starve the rest.
+    """
+
+    def __init__(self, max_in_flight=DIAGNOSIS_MAX_IN_FLIGHT, max_queue=DIAGNOSIS_MAX_QUEUE,
+                 max_queue_wait=DIAGNOSIS_MAX_QUEUE_WAIT_S, max_per_user=DIAGNOSIS_MAX_PER_USER):
+        self.max_in_flight = max(1, int(max_in_flight))
+        self.max_queue = max(0, int(max_queue))
+        self.max_queue_wait = float(max_queue_wait)
+        self.max_per_user = max(0, int(max_per_user))
+
+        self.in_flight = 0
+        self.queued = 0
+        self._per_user = {}  # key -> running + queued
+        self._waiters = OrderedDict()  # key -> deque of futures, in round-robin order
+
+        self.admitted = 0
+        self.peak_in_flight = 0
+        self.peak_queued = 0
+        self.rejected = {"queue_full": 0, "per_user": 0, "queue_timeout": 0}
+        self._service_s = deque(maxlen=200)
+
+    def _retry_after(self):
+        # Rough time until a queued request would get a slot: queue length / slots * mean service time
+        mean = sum(self._service_s) / len(self._service_s) if self._service_s else 1.0
+        return max(1, math.ceil(mean * (self.queued + 1) / self.max_in_flight))
+
+    def _reject(self, reason, status_code, detail):
+        self.rejected[reason] += 1
+        raise HTTPException(status_code=status_code, detail=detail, headers={"Retry-After": str(self._retry_after())})
+
+    async def acquire(self, key):
+        if self.max_per_user and self._per_user.get(key, 0) >= self.max_per_user:
+            self._reject("per_user", 429, "Too many diagnosis requests in progress for this user")
+
+        if self.in_flight < self.max_in_flight and not self.queued:
+            self._grant(key)
+            return
+
+        if self.queued >= self.max_queue:
+            self._reject("queue_full", 503, "Diagnosis service is busy, please retry")
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(key, deque()).append(future)
+        self.queued += 1
+        self.peak_queued = max(self.peak_queued, self.queued)
+        self._per_user[key] = self._per_user.get(key, 0) + 1
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout=self.max_queue_wait)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.done() and not future.cancelled():
+                # Slot was handed over just as we gave up: pass it on
+                self._release(key)
+            else:
+                future.cancel()
+                self._drop_waiter(key, future)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            self._reject("queue_timeout", 503, "Diagnosis service is busy, please retry")
+
+    def _grant(self, key, counted=False):
+        self.in_flight += 1
+        self.admitted += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        if not counted:
+            self._per_user[key] = self._per_user.get(key, 0) + 1
+
+    def _drop_waiter(self, key, future):
+        waiters = self._waiters.get(key)
+        if waiters is not None and future in waiters:
+            waiters.remove(future)
+            self.queued -= 1
+            self._decrement(key)
+            if not waiters:
+                del self._waiters[key]
+
+    def _decrement(self, key):
+        remaining = self._per_user.get(key, 0) - 1
+        if remaining > 0:
+            self._per_user[key] = remaining
+        else:
+            self._per_user.pop(key, None)
+
+    def _release(self, key):
+        self.in_flight -= 1
+        self._decrement(key)
+        # Hand the slot to the next user in rotation (oldest request of that user)
+        while self._waiters and self.in_flight < self.max_in_flight:
+            next_key, waiters = next(iter(self._waiters.items()))
+            future = waiters.popleft()
+            self.queued -= 1
+            if waiters:
+                self._waiters.move_to_end(next_key)
+            else:
+                del self._waiters[next_key]
+            if future.cancelled():
+                self._decrement(next_key)
+                continue
+            self._grant(next_key, counted=True)
+            future.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self, key):
+        await self.acquire(key)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._service_s.append(time.perf_counter() - started)
+            self._release(key)
+
+    async def reserve(self, key):
+        # For streaming responses: returns an idempotent release callable to run when the stream ends
+        await self.acquire(key)
+        started = time.perf_counter()
+        released = False
+
+        def release():
+            nonlocal released
+            if not released:
+                released = True
+                self._service_s.append(time.perf_counter() - started)
+                self._release(key)
+        return release
+
+    def stats(self):
+        return {
+            "max_in_flight": self.max_in_flight,
+            "max_queue": self.max_queue,
+            "max_per_user": self.max_per_user,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "peak_in_flight": self.peak_in_flight,
+            "peak_queued": self.peak_queued,
+            "admitted": self.admitted,
+            "rejected": dict(self.rejected),
+            "users_waiting": len(self._waiters),
+        }
@@ -2,15 +2,36 @@ from fastapi import Depends, HTTPException
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import jwt
 import os
-from app.models.database import SessionLocal
+import threading
+import time
+from cachetools import TTLCache
+from app.models.database import AsyncSessionLocal, SessionLocal
 from app.models.models import User
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
 
 SECRET_KEY = os.getenv("SECRET_KEY", "change_this_now")
 ALGORITHM = "HS256"
 
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
 
+# Per-process caches for get_current_user: decoded tokens (never past their exp) and user rows.
+# Profile edits invalidate locally; other workers see them within AUTH_USER_CACHE_TTL_S.
+AUTH_USER_CACHE_TTL_S = float(os.environ.get("AUTH_USER_CACHE_TTL_S", "30"))
+AUTH_USER_CACHE_SIZE = int(os.environ.get("AUTH_USER_CACHE_SIZE", "10000"))
+AUTH_TOKEN_CACHE_TTL_S = float(os.environ.get("AUTH_TOKEN_CACHE_TTL_S", "300"))
+AUTH_TOKEN_CACHE_SIZE = int(os.environ.get("AUTH_TOKEN_CACHE_SIZE", "10000"))
+
+_token_cache = TTLCache(maxsize=AUTH_TOKEN_CACHE_SIZE, ttl=AUTH_TOKEN_CACHE_TTL_S)
+_user_cache = TTLCache(maxsize=AUTH_USER_CACHE_SIZE, ttl=AUTH_USER_CACHE_TTL_S)
+_cache_lock = threading.Lock()
+_cache_stats = {"token_hits": 0, "token_misses": 0, "user_hits": 0, "user_misses": 0, "invalidations": 0}
+_USER_COLUMNS = [c.key for c in User.__table__.columns]
+
+# The one place routes get a database session from. get_async_db is the default, and the auth
+# dependencies below use it too, so a request opens one session. get_db is kept for login only:
+# Firebase token verification blocks, so that route runs in the threadpool with a sync session.
 def get_db():
     db = SessionLocal()
     try:
@@ -18,19 +39,86 @@ def get_db():
     finally:
         db.close()
 
-def get_current_user(
-    creds: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
-):
-    token = creds.credentials
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+def _decode_user_id(token):
+    # Counters change under the lock too: threadpool callers would otherwise lose increments
+    with _cache_lock:
+        cached = _token_cache.get(token)
+        hit = cached is not None and cached[1] > time.time()
+        _cache_stats["token_hits" if hit else "token_misses"] += 1
+    if hit:
+        return cached[0]
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id = payload.get("sub")
+        user_id = int(payload.get("sub"))
     except:
         raise HTTPException(status_code=401, detail="Invalid access token")
+    with _cache_lock:
+        _token_cache[token] = (user_id, payload.get("exp") or time.time() + AUTH_TOKEN_CACHE_TTL_S)
+    return user_id
+
+def invalidate_user(user_id):
+    # Call after writing a users row so this worker stops serving the old copy
+    with _cache_lock:
+        _user_cache.pop(user_id, None)
+        _cache_stats["invalidations"] += 1
+
+def auth_cache_stats():
+    with _cache_lock:
+        stats = dict(_cache_stats)
+    for name in ("token", "user"):
+        lookups = stats[f"{name}_hits"] + stats[f"{name}_misses"]
+        stats[f"{name}_hit_rate"] = round(stats[f"{name}_hits"] / lookups, 4) if lookups else 0.0
+    stats.update({
+        "tokens_cached": len(_token_cache),
+        "users_cached": len(_user_cache),
+        "user_ttl_s": AUTH_USER_CACHE_TTL_S,
+    })
+    return stats
+
+async def get_current_user(
+    creds: HTTPAuthorizationCredentials = Depends(security),
+    db: AsyncSession = Depends(get_async_db)
+):
+    user_id = _decode_user_id(creds.credentials)
+
+    with _cache_lock:
+        values = _user_cache.get(user_id)
+        _cache_stats["user_hits" if values is not None else "user_misses"] += 1
+    if values is not None:
+        # Read-only snapshot, detached: no SELECT, and it can't be flushed back over newer data
+        user = User(**values)
+        make_transient_to_detached(user)
+        return user
+    return await _load_user(db, user_id)
 
-    user = db.query(User).filter(User.id == int(user_id)).first()
+async def get_current_user_for_update(
+    creds: HTTPAuthorizationCredentials = Depends(security),
+    db: AsyncSession = Depends(get_async_db)
+):
+    # For routes that write the user: the row as stored, in this session, never the cached snapshot,
+    # so flush listeners (eligibility) and anything derived from the saved columns see real data
+    return await _load_user(db, _decode_user_id(creds.credentials))
+
+async def _load_user(db, user_id):
+    user = await db.get(User, user_id)
+    # End the read so the request doesn't pin a pooled connection while it works (e.g. through
+    # /predict's inference); expire_on_commit is off, so the user stays loaded and attached
+    await db.commit()
     if not user:
         raise HTTPException(status_code=401, detail="User not found")
-
+    with _cache_lock:
+        _user_cache[user_id] = {c: getattr(user, c) for c in _USER_COLUMNS}
     return user
+
+async def get_optional_user(
+    creds: HTTPAuthorizationCredentials = Depends(optional_security),
+    db: AsyncSession = Depends(get_async_db)
+):
+    # Same as get_current_user, but anonymous callers get None instead of a 403
+    if creds is None:
+        return None
+    return await get_current_user(creds, db)
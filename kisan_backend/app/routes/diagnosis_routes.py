@@ -1,25 +1,262 @@
-from fastapi import APIRouter, UploadFile, File
-from app.models.diagnosis_ml import classify_disease
+import asyncio
+import json
+import math
 import os
+import zipfile
+import zlib
+from typing import List
+
+import numpy as np
+from fastapi import APIRouter, Depends, Form, Request, UploadFile, File, HTTPException
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from PIL import UnidentifiedImageError
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.diagnosis_ml import (
+    preprocess_bytes, preprocess_file, preprocess_batch, predict_batch, executor, MODEL_VERSION, model_status, start_loading,
+    DIAGNOSIS_POOL_SIZE, pool_unavailable_for,
+)
+from app.models.batcher import MicroBatcher
+from app.models.models import CropDiagnosis
+from app.models.prediction_cache import PredictionCache
+from app.models.upload_store import UploadTooLarge, upload_store
+from app.models.worker_pool import PoolUnavailable
+from app.routes.admission import AdmissionController
+from app.routes.deps import get_async_db, get_optional_user
 
 router = APIRouter()
 
-@router.post("/predict")
-async def predict_disease(image: UploadFile = File(...)):
-    # Save image temporarily to a known path
-    save_dir = "static/uploads"  # Ensure this exists or create with os.makedirs
-    os.makedirs(save_dir, exist_ok=True)
-    image_path = os.path.join(save_dir, image.filename)
-    with open(image_path, "wb") as f:
-        f.write(await image.read())
+# Shared across requests so concurrent /predict calls land in the same forward pass;
+# with an inference pool, one batch in flight per pool process keeps all of them busy
+batcher = MicroBatcher(predict_batch, executor=executor, max_in_flight=max(1, DIAGNOSIS_POOL_SIZE))
+
+# Re-submitted photos (retries, app re-sends) are answered without running the CNN again
+prediction_cache = PredictionCache(MODEL_VERSION)
+
+# Bounded in-flight + queue for the diagnosis path; excess load is rejected fast with Retry-After
+admission = AdmissionController()
+
+# /predict/batch: images per forward pass (bounds memory), and hard limits per request
+BATCH_CHUNK_SIZE = int(os.environ.get("DIAGNOSIS_BATCH_CHUNK_SIZE", "32"))
+BATCH_MAX_IMAGES = int(os.environ.get("DIAGNOSIS_BATCH_MAX_IMAGES", "500"))
+MAX_IMAGE_BYTES = int(os.environ.get("DIAGNOSIS_MAX_IMAGE_BYTES", str(10 * 1024 * 1024)))
+# Multipart framing and the crop field on top of the photo, for the Content-Length check
+FORM_OVERHEAD_BYTES = 64 * 1024
+
+ZIP_CONTENT_TYPES = {"application/zip", "application/x-zip-compressed"}
+
+# What reading one zip member can raise: bad CRC / corrupt deflate data, encrypted, unsupported
+# compression, truncated. Reported for that member only; the rest of the archive still streams.
+ZIP_MEMBER_ERRORS = (zipfile.BadZipFile, zlib.error, RuntimeError, NotImplementedError, EOFError, OSError)
+
+def _require_model():
+    # The model loads in the background after startup; answer fast instead of blocking until it's ready
+    if model_status()["status"] == "ready":
+        down = pool_unavailable_for()
+        if down > 0:
+            _pool_unavailable(down)
+        return
+    start_loading()  # also retries a failed load once its backoff has passed
+    status = model_status()
+    if status["status"] == "failed":
+        retry = str(max(1, int(status["retry_in_s"])))
+        raise HTTPException(status_code=503, detail=f"Diagnosis model unavailable: {status['error']}", headers={"Retry-After": retry})
+    raise HTTPException(status_code=503, detail="Diagnosis model is warming up", headers={"Retry-After": "5"})
+
+def _pool_unavailable(retry_after):
+    # Every pool worker crashed and is backing off its restart: fail fast like a full admission queue
+    raise HTTPException(status_code=503, detail="Diagnosis workers are restarting",
+                        headers={"Retry-After": str(max(1, math.ceil(retry_after)))})
+
+def _caller_key(request, user):
+    # Fairness is per authenticated user; anonymous callers are grouped by client address
+    if user is not None:
+        return f"user:{user.id}"
+    return f"ip:{request.client.host if request.client else 'unknown'}"
+
+def _decode_and_lookup(source):
+    img_array = preprocess_bytes(source) if isinstance(source, bytes) else preprocess_file(source)
+    fingerprint = prediction_cache.fingerprint(img_array)
+    return img_array, fingerprint, prediction_cache.get(fingerprint)
+
+async def diagnose_image(source, caller_key):
+    """
+    Diagnose one image through admission control, the prediction cache and the batcher.
+
+    source: the encoded image bytes, or the path of a stored upload.
+    """
+    _require_model()
+    async with admission.slot(caller_key):
+        # Decode/resize off the event loop, then predict (batched with other in-flight requests)
+        loop = asyncio.get_running_loop()
+        try:
+            img_array, fingerprint, result = await loop.run_in_executor(executor, _decode_and_lookup, source)
+        except (UnidentifiedImageError, OSError):
+            raise HTTPException(status_code=400, detail="Uploaded file is not a valid image")
+        if result is None:
+            try:
+                result = await batcher.submit(img_array)
+            except PoolUnavailable as e:
+                _pool_unavailable(e.retry_after)
+            await loop.run_in_executor(executor, prediction_cache.put, fingerprint, result)
+    return result
+
+class PredictSizeLimitMiddleware:
+    """413 for a /predict whose Content-Length is already past the photo limit, before the form is parsed.
+
+    FastAPI spools the whole multipart body to disk before the route (or any dependency) runs, so
+    this has to sit in front of it. Chunked uploads without a length still stop at upload_store.save.
+    """
 
-    # Predict using loaded model
-    result = classify_disease(image_path)
+    def __init__(self, app, max_bytes=MAX_IMAGE_BYTES + FORM_OVERHEAD_BYTES):
+        self.app = app
+        self.max_bytes = max_bytes
 
-    # Optionally: Clean up by removing image file after prediction
-    # os.remove(image_path)
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["method"] == "POST" and scope["path"] == "/predict":
+            length = next((v for k, v in scope["headers"] if k == b"content-length"), b"")
+            if length.isdigit() and int(length) > self.max_bytes:
+                response = ORJSONResponse({"detail": f"Upload is larger than {MAX_IMAGE_BYTES} bytes"}, status_code=413)
+                await response(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
 
+@router.post("/predict")
+async def predict_disease(
+    request: Request,
+    image: UploadFile = File(...),
+    crop: str = Form(None),
+    user=Depends(get_optional_user),
+    db: AsyncSession = Depends(get_async_db),
+):
+    _require_model()
+    # Copied into the content-addressed store in chunks, off the event loop; never read whole
+    try:
+        stored = await asyncio.to_thread(upload_store.save, image.file, MAX_IMAGE_BYTES)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    try:
+        result = await diagnose_image(stored.path, _caller_key(request, user))
+        if user is not None:
+            # The session get_optional_user used; it checks out a connection only when used, so
+            # anonymous calls, which never write, don't touch the pool
+            db.add(CropDiagnosis(
+                user_id=user.id, crop=crop, photo=stored.key,
+                result=json.dumps({"disease": result["disease"], "confidence": result["confidence"]}),
+            ))
+            await db.commit()
+    except BaseException:
+        # Unreadable, shed by admission (429/503), failed in the model or not recorded: nothing
+        # points at the photo. One unlink, done inline so a cancelled request cleans up too
+        upload_store.discard(stored)
+        raise
     return {
         "predicted_disease": result["disease"],
         "confidence": result["confidence"]
     }
+
+def _is_zip(upload):
+    return upload.content_type in ZIP_CONTENT_TYPES or (upload.filename or "").lower().endswith(".zip")
+
+def _read_upload(upload):
+    return lambda: upload.file.read(MAX_IMAGE_BYTES + 1)
+
+def _read_zip_entry(archive, info):
+    return lambda: archive.read(info) if info.file_size <= MAX_IMAGE_BYTES else b""
+
+def _collect_sources(images):
+    # Flatten multipart files and zip members into (filename, reader) in input order.
+    # Readers are called lazily, one chunk at a time, so only a chunk of raw bytes is ever in memory.
+    sources = []
+    for upload in images:
+        if _is_zip(upload):
+            try:
+                archive = zipfile.ZipFile(upload.file)
+            except zipfile.BadZipFile:
+                raise HTTPException(status_code=400, detail=f"{upload.filename} is not a valid zip archive")
+            for info in archive.infolist():
+                if info.is_dir() or info.filename.startswith("__MACOSX/"):
+                    continue
+                sources.append((info.filename, _read_zip_entry(archive, info)))
+        else:
+            sources.append((upload.filename, _read_upload(upload)))
+    return sources
+
+def _diagnose_chunk(chunk, buffer):
+    blobs, read_errors = [], {}
+    for i, (filename, read) in enumerate(chunk):
+        try:
+            data = read()
+        except ZIP_MEMBER_ERRORS as e:
+            read_errors[i] = f"Could not read {filename} from the archive: {e}"
+            data = b""
+        blobs.append(data if len(data) <= MAX_IMAGE_BYTES else b"")
+    batch, positions, errors = preprocess_batch(blobs, buffer)
+
+    results, misses = {}, []
+    for row, position in enumerate(positions):
+        fingerprint = prediction_cache.fingerprint(batch[row])
+        cached = prediction_cache.get(fingerprint)
+        if cached is None:
+            misses.append((row, position, fingerprint))
+        else:
+            results[position] = cached
+    if misses:
+        rows = [row for row, _, _ in misses]
+        to_predict = batch if len(rows) == len(batch) else batch[rows]
+        for (_, position, fingerprint), result in zip(misses, predict_batch(to_predict)):
+            prediction_cache.put(fingerprint, result)
+            results[position] = result
+
+    for i in errors:
+        if i in read_errors:
+            errors[i] = read_errors[i]
+        elif not blobs[i]:
+            errors[i] = f"Image is empty or larger than {MAX_IMAGE_BYTES} bytes"
+    return results, errors
+
+@router.post("/predict/batch")
+async def predict_disease_batch(request: Request, images: List[UploadFile] = File(...), user=Depends(get_optional_user)):
+    _require_model()
+    sources = _collect_sources(images)
+    if not sources:
+        raise HTTPException(status_code=400, detail="No images uploaded")
+    if len(sources) > BATCH_MAX_IMAGES:
+        raise HTTPException(status_code=413, detail=f"At most {BATCH_MAX_IMAGES} images per batch")
+
+    # Holds one admission slot for the whole stream (released when it ends or the client goes away)
+    release = await admission.reserve(_caller_key(request, user))
+
+    async def stream():
+        try:
+            loop = asyncio.get_running_loop()
+            # One preallocated float32 buffer, reused for every chunk of this request
+            buffer = np.empty((min(BATCH_CHUNK_SIZE, len(sources)), 224, 224, 3), dtype=np.float32)
+            for start in range(0, len(sources), BATCH_CHUNK_SIZE):
+                chunk = sources[start:start + BATCH_CHUNK_SIZE]
+                results, errors = await loop.run_in_executor(executor, _diagnose_chunk, chunk, buffer)
+                for offset, (filename, _) in enumerate(chunk):
+                    line = {"index": start + offset, "filename": filename}
+                    if offset in results:
+                        line["predicted_disease"] = results[offset]["disease"]
+                        line["confidence"] = results[offset]["confidence"]
+                    else:
+                        line["error"] = errors.get(offset, "Invalid image")
+                    yield json.dumps(line) + "\n"
+        finally:
+            release()
+
+    # Newline-delimited JSON, one line per image in input order, flushed chunk by chunk
+    return StreamingResponse(stream(), media_type="application/x-ndjson", background=BackgroundTask(release))
+
+@router.get("/predict/stats")
+def predict_stats():
+    # Queue depth, batch sizes and wait times for tuning DIAGNOSIS_MAX_BATCH_SIZE / DIAGNOSIS_MAX_WAIT_MS,
+    # admission rejections for sizing DIAGNOSIS_MAX_IN_FLIGHT / DIAGNOSIS_MAX_QUEUE
+    return {
+        **batcher.stats(),
+        "cache": prediction_cache.stats(),
+        "uploads": upload_store.stats(),
+        "admission": admission.stats(),
+        "model": model_status(),
+    }
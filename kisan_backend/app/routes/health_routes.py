@@ -0,0 +1,34 @@
+from fastapi import APIRouter, Depends
+from fastapi.responses import JSONResponse
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.diagnosis_ml import model_status, start_loading
+from app.routes.deps import get_async_db
+
+router = APIRouter(tags=["Health"])
+
+@router.get("/healthz")
+def healthz():
+    # Liveness: the process is up and serving requests
+    return {"status": "ok"}
+
+@router.get("/readyz")
+async def readyz(strict: bool = False, db: AsyncSession = Depends(get_async_db)):
+    # Readiness: the API is ready once the DB answers; diagnosis reports its own state ("loading", "warming_up", ...).
+    # Pass ?strict=true to also require the diagnosis model (e.g. for nodes that only serve /predict).
+    checks = {}
+    try:
+        await db.execute(text("SELECT 1"))
+        checks["database"] = "ok"
+    except Exception as e:
+        checks["database"] = f"error: {e}"
+    # Probes keep retrying a failed model load (after its backoff) even with no /predict traffic
+    start_loading()
+    diagnosis = model_status()
+    checks["diagnosis"] = diagnosis["status"]
+
+    ready = checks["database"] == "ok" and (not strict or diagnosis["status"] == "ready")
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"ready": ready, "checks": checks, "diagnosis": diagnosis},
+    )
@@ -1,21 +1,32 @@
- 
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from app.models.database import SessionLocal
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import select
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.help_search import search_history
 from app.models.models import HelpHistory
-from app.schemas.help_schema import HelpHistoryRequest
+from app.routes.deps import get_async_db
+from app.schemas.help_schema import HelpHistoryRequest, HelpSearchRequest
 
 router = APIRouter()
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+def _history_dict(r):
+    return {"id": r.id, "query": r.query, "result": r.result, "timestamp": r.timestamp}
 
 @router.post("/help/history")
-def get_help_history(req: HelpHistoryRequest, db: Session = Depends(get_db)):
-    records = db.query(HelpHistory).filter(HelpHistory.user_id == req.user_id).all()
-    result = [{"id": r.id, "query": r.query, "result": r.result, "timestamp": r.timestamp} for r in records]
-    return {"history": result}
+async def get_help_history(req: HelpHistoryRequest, db: AsyncSession = Depends(get_async_db)):
+    # Keyset pages, newest first (index on user_id, id)
+    stmt = select(HelpHistory).where(HelpHistory.user_id == req.user_id)
+    if req.cursor is not None:
+        stmt = stmt.where(HelpHistory.id < req.cursor)
+    records = (await db.execute(stmt.order_by(HelpHistory.id.desc()).limit(req.limit + 1))).scalars().all()
+    next_cursor = records[req.limit - 1].id if len(records) > req.limit else None
+    return {"history": [_history_dict(r) for r in records[:req.limit]], "next_cursor": next_cursor}
+
+@router.post("/help/search")
+async def search_help(req: HelpSearchRequest, db: AsyncSession = Depends(get_async_db)):
+    try:
+        ranked = await db.run_sync(lambda session: search_history(session.connection(), req.user_id, req.q, req.limit))
+    except OperationalError:
+        # SQLite without FTS5 compiled in (the index could not be created at startup)
+        raise HTTPException(status_code=503, detail="Help search is unavailable")
+    return {"results": [{**_history_dict(r), "score": round(score, 4)} for r, score in ranked]}
@@ -0,0 +1,74 @@
+# app/routes/http_cache.py
+# Conditional GETs for the read endpoints. Each response carries a weak ETag built from whatever
+# stamps the payload depends on (data versions, profile fields, a user's notification counts), so
+# a client revalidating an unchanged resource gets a bodyless 304 after a version check instead of
+# the query, serialization and transfer. Weak, because compression changes the bytes, not the data.
+import datetime
+import hashlib
+import os
+from email.utils import format_datetime, parsedate_to_datetime
+
+from fastapi import Request, Response
+from fastapi.responses import ORJSONResponse
+
+# Freshness for shared, non-personal data (market prices); clients revalidate once it lapses
+HTTP_PUBLIC_MAX_AGE_S = int(os.environ.get("HTTP_PUBLIC_MAX_AGE_S", "60"))
+
+PUBLIC = f"public, max-age={HTTP_PUBLIC_MAX_AGE_S}"
+# Per-user data: cacheable by the client only, revalidated on every use
+PRIVATE = "private, no-cache"
+
+
+def make_etag(*parts):
+    digest = hashlib.blake2b("|".join(map(str, parts)).encode(), digest_size=12).hexdigest()
+    return f'W/"{digest}"'
+
+
+def _as_utc(value):
+    # SQLite hands back naive UTC timestamps
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=datetime.timezone.utc)
+    return value.astimezone(datetime.timezone.utc).replace(microsecond=0)
+
+
+def _etag_matches(header, etag):
+    if header.strip() == "*":
+        return True
+    # Weak comparison: W/"x" matches "x"
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in header.split(","))
+
+
+def is_not_modified(request: Request, etag, last_modified=None):
+    """True when the request's validators still match (If-None-Match wins over If-Modified-Since)."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return _etag_matches(if_none_match, etag)
+    since = request.headers.get("if-modified-since")
+    last_modified = _as_utc(last_modified)
+    if since and last_modified is not None:
+        try:
+            return last_modified <= parsedate_to_datetime(since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def _validator_headers(etag, last_modified, cache_control):
+    # Vary on every representation, 304s and uncompressed bodies included: the compression
+    # middleware picks gzip/identity per request, and a cache must not mix them under one ETag
+    headers = {"ETag": etag, "Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+    if last_modified is not None:
+        headers["Last-Modified"] = format_datetime(_as_utc(last_modified), usegmt=True)
+    return headers
+
+
+def not_modified(etag, last_modified=None, cache_control=PRIVATE):
+    return Response(status_code=304, headers=_validator_headers(etag, last_modified, cache_control))
+
+
+def cached_json(content, etag, last_modified=None, cache_control=PRIVATE):
+    # Rendered straight by orjson: no jsonable_encoder pass over the payload
+    return ORJSONResponse(content, headers=_validator_headers(etag, last_modified, cache_control))
@@ -3,7 +3,6 @@ from fastapi import APIRouter, Depends, HTTPException, Header
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
 
-from app.models.database import SessionLocal
 from app.models.models import User, RefreshToken
 from app.routes.auth_utils import (
     verify_firebase_token,
@@ -11,16 +10,10 @@ from app.routes.auth_utils import (
     create_refresh_token,
     hash_token,
 )
+from app.routes.deps import get_db
 
 router = APIRouter(prefix="/auth", tags=["Authentication"])
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 @router.post("/login")
 def login_with_firebase(authorization: str = Header(None), db: Session = Depends(get_db)):
     # Validate header
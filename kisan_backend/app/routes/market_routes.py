@@ -1,27 +1,159 @@
  
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from app.models.database import SessionLocal
-from app.models.models import MarketPrice
-from app.schemas.market_schema import MarketPriceRequest
+import os
+import threading
+import time
+
+from cachetools import TTLCache
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import ORJSONResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.mandi_geo import mandi_locator, resolve_user_location
+from app.models.models import MarketPrice, PriceStats, User, normalize_key
+from app.models.data_versions import get_data_stamp
+from app.routes.deps import get_async_db
+from app.routes.http_cache import PUBLIC, cached_json, is_not_modified, make_etag, not_modified
+from app.schemas.market_schema import MarketPriceRequest, NearestMarketRequest
 
 router = APIRouter()
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+# Read-through cache of /market answers, keyed by normalized (crop, mandi)
+MARKET_CACHE_TTL_S = float(os.environ.get("MARKET_CACHE_TTL_S", "300"))
+MARKET_CACHE_SIZE = int(os.environ.get("MARKET_CACHE_SIZE", "10000"))
+# How often to check the market_prices data version (ingest may run in another process)
+MARKET_VERSION_CHECK_S = float(os.environ.get("MARKET_VERSION_CHECK_S", "1"))
 
-@router.post("/market")
-def get_market_price(req: MarketPriceRequest, db: Session = Depends(get_db)):
-    query = db.query(MarketPrice).filter(MarketPrice.crop.ilike(req.crop))
-    if req.mandi:
-        query = query.filter(MarketPrice.mandi.ilike(req.mandi))
-    prices = query.all()
+_price_cache = TTLCache(maxsize=MARKET_CACHE_SIZE, ttl=MARKET_CACHE_TTL_S)
+_cache_lock = threading.Lock()
+_cache_state = {"version": None, "updated_at": None, "checked_at": 0.0, "hits": 0, "misses": 0, "invalidations": 0}
+
+def invalidate_market_cache():
+    with _cache_lock:
+        _price_cache.clear()
+        _cache_state["invalidations"] += 1
+
+def _sync_cache_version(db):
+    # One PK lookup per MARKET_VERSION_CHECK_S instead of trusting the TTL alone
+    now = time.monotonic()
+    if now - _cache_state["checked_at"] < MARKET_VERSION_CHECK_S:
+        return
+    version, updated_at = get_data_stamp(db, "market_prices")
+    _cache_state["checked_at"] = now
+    if version != _cache_state["version"]:
+        if _cache_state["version"] is not None:
+            invalidate_market_cache()
+        _cache_state["version"] = version
+    _cache_state["updated_at"] = updated_at
+
+def current_data_version(db):
+    # market_prices' data version, checked against the database at most every MARKET_VERSION_CHECK_S
+    _sync_cache_version(db)
+    return _cache_state["version"]
+
+def _stats_dict(stats):
+    if stats is None:
+        return None
+    return {
+        "change_pct": stats.change_pct,
+        "change_7d_pct": stats.change_7d_pct,
+        "mean_7d": stats.mean_7d,
+        "mean_30d": stats.mean_30d,
+        "min_30d": stats.min_30d,
+        "max_30d": stats.max_30d,
+        "samples_30d": stats.samples_30d,
+    }
+
+def lookup_market_prices(db, crop, mandi=None):
+    crop_key, mandi_key = normalize_key(crop), normalize_key(mandi)
+    version = current_data_version(db)
+    cache_key = (crop_key, mandi_key)
+    with _cache_lock:
+        cached = _price_cache.get(cache_key)
+    # Entries remember the data version they were read at, so a racing ingest can't pin stale prices
+    if cached is not None and cached[0] == version:
+        _cache_state["hits"] += 1
+        return cached[1]
+    _cache_state["misses"] += 1
+
+    # Equality on the normalized keys hits the crop/mandi index; trend figures are precomputed
+    # on ingest (price_history.refresh_stats), so each mandi costs one primary-key join
+    query = (
+        db.query(MarketPrice, PriceStats)
+        .outerjoin(PriceStats, (PriceStats.crop_key == MarketPrice.crop_key) & (PriceStats.mandi_key == MarketPrice.mandi_key))
+        .filter(MarketPrice.crop_key == crop_key)
+    )
+    if mandi_key:
+        query = query.filter(MarketPrice.mandi_key == mandi_key)
     result = [
-        {"mandi": p.mandi, "price": p.price, "trend": p.trend}
-        for p in prices
+        {
+            "mandi": p.mandi,
+            "price": p.price,
+            "trend": p.trend,
+            "price_date": p.price_date,
+            "stats": _stats_dict(stats),
+        }
+        for p, stats in query.all()
     ]
-    return {"prices": result}
+    with _cache_lock:
+        _price_cache[cache_key] = (version, result)
+    return result
+
+@router.post("/market")
+async def get_market_price(req: MarketPriceRequest, db: AsyncSession = Depends(get_async_db)):
+    # lookup_market_prices is shared with sync callers; run_sync gives it a Session over the async connection
+    prices = await db.run_sync(lookup_market_prices, req.crop, req.mandi)
+    # Returned as a response so FastAPI skips jsonable_encoder, which dominates for big crops
+    return ORJSONResponse({"prices": prices})
+
+@router.get("/market")
+async def get_market_price_cacheable(request: Request, crop: str, mandi: str = None, db: AsyncSession = Depends(get_async_db)):
+    # Cacheable variant: validators come from market_prices' data version, so a client
+    # revalidating between ingests gets a 304 without the lookup
+    await db.run_sync(_sync_cache_version)
+    etag = make_etag("market", _cache_state["version"], normalize_key(crop), normalize_key(mandi))
+    last_modified = _cache_state["updated_at"]
+    if is_not_modified(request, etag, last_modified):
+        return not_modified(etag, last_modified, PUBLIC)
+    prices = await db.run_sync(lookup_market_prices, crop, mandi)
+    return cached_json({"prices": prices}, etag, last_modified, PUBLIC)
+
+def nearest_market_prices(db, req):
+    """k nearest mandis pricing req.crop, from the request's coordinates or the user's village/district."""
+    if req.latitude is not None and req.longitude is not None:
+        origin = (req.latitude, req.longitude, "request")
+    elif req.user_id is not None:
+        user = db.get(User, req.user_id)
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+        origin = resolve_user_location(db, user)
+        if origin is None:
+            raise HTTPException(status_code=422, detail="Can't place this user's village/district; send latitude and longitude")
+    else:
+        raise HTTPException(status_code=422, detail="Send latitude and longitude, or a user_id")
+    mandi_locator.refresh(db)
+    lat, lon, source = origin
+    return {
+        "origin": {"latitude": lat, "longitude": lon, "source": source},
+        "prices": mandi_locator.nearest(req.crop, lat, lon, req.k, req.max_km),
+    }
+
+@router.post("/market/nearest")
+async def get_nearest_market_prices(req: NearestMarketRequest, db: AsyncSession = Depends(get_async_db)):
+    return await db.run_sync(nearest_market_prices, req)
+
+@router.get("/market/nearest/stats")
+def nearest_index_stats():
+    return mandi_locator.stats()
+
+@router.get("/market/cache/stats")
+def market_cache_stats():
+    lookups = _cache_state["hits"] + _cache_state["misses"]
+    return {
+        "size": len(_price_cache),
+        "max_size": MARKET_CACHE_SIZE,
+        "ttl_s": MARKET_CACHE_TTL_S,
+        "data_version": _cache_state["version"],
+        "hits": _cache_state["hits"],
+        "misses": _cache_state["misses"],
+        "invalidations": _cache_state["invalidations"],
+        "hit_rate": round(_cache_state["hits"] / lookups, 4) if lookups else 0.0,
+    }
@@ -0,0 +1,139 @@
+import collections
+import logging
+import os
+import sys
+import threading
+import time
+
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from app.models.metrics import (
+    DB_QUERIES_PER_REQUEST, DB_TIME_PER_REQUEST, HTTP_IN_PROGRESS, HTTP_LATENCY, HTTP_REQUESTS,
+    RequestDbStats, registry, request_db_stats,
+)
+
+logger = logging.getLogger("app.slow_requests")
+
+router = APIRouter(tags=["Health"])
+
+# Opt-in: log requests slower than this (0 = off), with a sampled-stack profile of the process
+METRICS_SLOW_REQUEST_MS = float(os.environ.get("METRICS_SLOW_REQUEST_MS", "0"))
+METRICS_PROFILE_INTERVAL_MS = float(os.environ.get("METRICS_PROFILE_INTERVAL_MS", "5"))
+# Warn when one request runs more SQL statements than this (typically a lazy load per row)
+METRICS_QUERY_WARN = int(os.environ.get("METRICS_QUERY_WARN", "50"))
+
+# Open-ended responses; their duration is the connection's lifetime, not a latency
+STREAMING_ROUTES = {"/notifications/stream"}
+
+# Leaf functions of threads that are just waiting (event loop select, idle pool workers, locks, aiosqlite's queue)
+_IDLE_LEAVES = {
+    "select", "poll", "wait", "_wait_for_tstate_lock", "get", "_worker", "accept", "readinto",
+    "_connection_worker_thread",
+}
+
+
+class StackSampler:
+    """
+    Samples every thread's Python stack each interval into a ring buffer, so a slow request can be
+    logged with what the process was doing while it ran. cProfile can't be used per request: it
+    profiles a whole thread, and one event-loop thread serves all concurrent requests.
+    """
+
+    def __init__(self, interval_s, max_samples=50_000):
+        self.interval_s = interval_s
+        self._samples = collections.deque(maxlen=max_samples)  # (perf_counter, thread name, stack tuple)
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        me = threading.get_ident()
+        while True:
+            now = time.perf_counter()
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me or frame.f_code.co_name in _IDLE_LEAVES:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < 40:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+                    frame = frame.f_back
+                self._samples.append((now, names.get(ident, str(ident)), tuple(reversed(stack))))
+            time.sleep(self.interval_s)
+
+    def snapshot(self, started, ended, top=5):
+        """Most frequent stacks sampled in [started, ended], as (count, thread, 'outer;...;leaf')."""
+        counts = collections.Counter(
+            (thread, stack) for t, thread, stack in list(self._samples) if started <= t <= ended
+        )
+        return [(n, thread, ";".join(stack[-12:])) for (thread, stack), n in counts.most_common(top)]
+
+
+sampler = StackSampler(METRICS_PROFILE_INTERVAL_MS / 1000.0) if METRICS_SLOW_REQUEST_MS > 0 else None
+
+
+class MetricsMiddleware:
+    """Per-route latency/status metrics and per-request SQL counts (pure ASGI: streams pass straight through)."""
+
+    def __init__(self, app):
+        self.app = app
+        if sampler is not None:
+            sampler.start()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        db_stats = RequestDbStats()
+        token = request_db_stats.set(db_stats)
+        HTTP_IN_PROGRESS.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            HTTP_IN_PROGRESS.dec()
+            request_db_stats.reset(token)
+            # Route template, not the raw path, so ids don't explode the label set
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            method = scope["method"]
+            HTTP_REQUESTS.inc(method, route, str(status["code"]))
+            if route not in STREAMING_ROUTES:
+                HTTP_LATENCY.observe(elapsed, method, route)
+                DB_QUERIES_PER_REQUEST.observe(db_stats.queries, route)
+                DB_TIME_PER_REQUEST.observe(db_stats.seconds, route)
+                self._log_outliers(method, route, status["code"], started, elapsed, db_stats)
+
+    def _log_outliers(self, method, route, status, started, elapsed, db_stats):
+        if db_stats.queries > METRICS_QUERY_WARN:
+            statement, count = db_stats.top_statement()
+            logger.warning(
+                "%s %s ran %d SQL statements (%d x %r): likely a query per row",
+                method, route, db_stats.queries, count, " ".join(statement.split())[:200],
+            )
+        if METRICS_SLOW_REQUEST_MS > 0 and elapsed * 1000.0 >= METRICS_SLOW_REQUEST_MS:
+            lines = [
+                f"Slow request: {method} {route} -> {status} in {elapsed * 1000.0:.0f} ms "
+                f"({db_stats.queries} SQL statements, {db_stats.seconds * 1000.0:.0f} ms in the database)"
+            ]
+            if sampler is not None:
+                for n, thread, stack in sampler.snapshot(started, started + elapsed):
+                    lines.append(f"  {n} samples [{thread}] {stack}")
+            logger.warning("\n".join(lines))
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    # Prometheus text exposition format 0.0.4
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -1,30 +1,186 @@
  
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from app.models.database import SessionLocal
-from app.models.models import Notification
-from app.schemas.notification_schema import NotificationRequest, MarkReadRequest
+import asyncio
+import json
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, Header, Query, Request
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from sqlalchemy import case, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.alerts import alert_engine
+from app.models.models import Notification, PriceAlert
+from app.models.notification_hub import (
+    NOTIFY_HEARTBEAT_S, NOTIFY_REPLAY_MAX, NOTIFY_REPLAY_PAGE, NOTIFY_RETRY_MS, notification_dict, notification_hub,
+)
+from app.routes.deps import get_async_db
+from app.routes.http_cache import cached_json, is_not_modified, make_etag, not_modified
+from app.schemas.notification_schema import (
+    NotificationRequest, UnreadCountRequest, MarkReadRequest, MarkAllReadRequest,
+    PriceAlertRequest, PriceAlertListRequest, PriceAlertDeleteRequest,
+)
 
 router = APIRouter()
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+def _unread(stmt):
+    return stmt.where(Notification.read_flag.is_(False))
+
+async def _notification_page(db, req):
+    # Keyset pagination, newest first: each page is an index range scan from the cursor, however
+    # many notifications the user has
+    stmt = select(Notification).where(Notification.user_id == req.user_id)
+    if req.unread_only:
+        stmt = _unread(stmt)
+    if req.cursor is not None:
+        stmt = stmt.where(Notification.id < req.cursor)
+    notes = (await db.execute(stmt.order_by(Notification.id.desc()).limit(req.limit + 1))).scalars().all()
+    next_cursor = notes[req.limit - 1].id if len(notes) > req.limit else None
+    result = [notification_dict(n) for n in notes[:req.limit]]
+    return {"notifications": result, "next_cursor": next_cursor}
 
 @router.post("/notifications")
-def get_notifications(req: NotificationRequest, db: Session = Depends(get_db)):
-    notes = db.query(Notification).filter(Notification.user_id == req.user_id).all()
-    result = [{"id": n.id, "type": n.type, "content": n.content, "read": n.read_flag} for n in notes]
-    return {"notifications": result}
+async def get_notifications(req: NotificationRequest, db: AsyncSession = Depends(get_async_db)):
+    return ORJSONResponse(await _notification_page(db, req))
+
+@router.get("/notifications")
+async def get_notifications_cacheable(request: Request, req: Annotated[NotificationRequest, Query()], db: AsyncSession = Depends(get_async_db)):
+    # Notifications only get inserted, marked read or deleted, each of which moves the user's
+    # (count, newest id, unread) stamp: one covering scan of ix_notifications_user_id_read_flag_id
+    stamp = (await db.execute(
+        select(func.count(Notification.id), func.max(Notification.id),
+               func.sum(case((Notification.read_flag.is_(False), 1), else_=0)))
+        .where(Notification.user_id == req.user_id)
+    )).one()
+    etag = make_etag("notifications", req.user_id, req.limit, req.cursor, req.unread_only, *stamp)
+    if is_not_modified(request, etag):
+        return not_modified(etag)
+    return cached_json(await _notification_page(db, req), etag)
+
+def _sse(note):
+    return f"id: {note['id']}\nevent: notification\ndata: {json.dumps(note)}\n\n"
+
+@router.get("/notifications/stream")
+async def stream_notifications(user_id: int, last_id: int = None, last_event_id: str = Header(None)):
+    """
+    Server-Sent Events feed of new notifications, instead of polling POST /notifications.
+
+    EventSource reconnects send Last-Event-ID (or pass ?last_id=) and what is newer is replayed
+    first, a page at a time. Past NOTIFY_REPLAY_MAX the replay stops with a "resync" event whose
+    data carries replayed_through: the client reads the rest from GET /notifications (newest
+    first, down to that id) while the stream carries on with new notifications. Idle streams get
+    a heartbeat comment every NOTIFY_HEARTBEAT_S.
+    """
+    if last_event_id and last_event_id.isdigit():
+        last_id = int(last_event_id)
+
+    async def events():
+        # Subscribe before replaying so nothing written in between is missed; ids dedupe the overlap
+        subscription = await notification_hub.subscribe(user_id)
+        try:
+            yield f"retry: {NOTIFY_RETRY_MS}\n\n"
+            sent = last_id
+            if last_id is not None:
+                replayed = 0
+                while True:
+                    page = await asyncio.to_thread(notification_hub.replay, user_id, sent, NOTIFY_REPLAY_PAGE)
+                    for note in page:
+                        yield _sse(note)
+                        sent = note["id"]
+                    replayed += len(page)
+                    if len(page) < NOTIFY_REPLAY_PAGE:
+                        break
+                    if replayed >= NOTIFY_REPLAY_MAX:
+                        yield f"event: resync\ndata: {json.dumps({'replayed_through': sent, 'list': '/notifications'})}\n\n"
+                        break
+            while True:
+                notes = await subscription.get(NOTIFY_HEARTBEAT_S)
+                if not notes and not subscription.overflowed:
+                    yield ": ping\n\n"
+                    continue
+                for note in notes:
+                    if sent is None or note["id"] > sent:
+                        yield _sse(note)
+                        sent = note["id"]
+                if subscription.overflowed:
+                    # Client fell behind: close, it reconnects with Last-Event-ID and replays from the DB
+                    break
+        finally:
+            notification_hub.unsubscribe(subscription)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.get("/notifications/stream/stats")
+def notification_stream_stats():
+    return notification_hub.stats()
+
+@router.post("/notifications/unread_count")
+async def get_unread_count(req: UnreadCountRequest, db: AsyncSession = Depends(get_async_db)):
+    count = await db.scalar(_unread(select(func.count(Notification.id)).where(Notification.user_id == req.user_id)))
+    return {"unread": count}
 
 @router.post("/notifications/mark_read")
-def mark_notification_read(req: MarkReadRequest, db: Session = Depends(get_db)):
-    note = db.query(Notification).filter(Notification.id == req.notification_id, Notification.user_id == req.user_id).first()
-    if note:
-        note.read_flag = True
-        db.commit()
-        return {"success": True}
+async def mark_notification_read(req: MarkReadRequest, db: AsyncSession = Depends(get_async_db)):
+    ids = set(req.notification_ids)
+    if req.notification_id is not None:
+        ids.add(req.notification_id)
+    if not ids:
+        return {"success": False, "message": "Notification not found"}
+    # One UPDATE for the whole set, scoped to the caller's own notifications
+    result = await db.execute(
+        update(Notification)
+        .where(Notification.user_id == req.user_id, Notification.id.in_(ids))
+        .values(read_flag=True)
+    )
+    await db.commit()
+    updated = result.rowcount
+    if updated:
+        return {"success": True, "updated": updated}
     return {"success": False, "message": "Notification not found"}
+
+@router.post("/notifications/mark_all_read")
+async def mark_all_notifications_read(req: MarkAllReadRequest, db: AsyncSession = Depends(get_async_db)):
+    stmt = _unread(update(Notification).where(Notification.user_id == req.user_id))
+    if req.up_to_id is not None:
+        stmt = stmt.where(Notification.id <= req.up_to_id)
+    result = await db.execute(stmt.values(read_flag=True))
+    await db.commit()
+    return {"success": True, "updated": result.rowcount}
+
+def _alert_dict(alert):
+    return {
+        "id": alert.id,
+        "crop": alert.crop,
+        "mandi": alert.mandi,
+        "direction": alert.direction,
+        "threshold": alert.threshold,
+    }
+
+@router.post("/alerts")
+async def create_price_alert(req: PriceAlertRequest, db: AsyncSession = Depends(get_async_db)):
+    alert = PriceAlert(user_id=req.user_id, crop=req.crop, mandi=req.mandi, direction=req.direction, threshold=req.threshold)
+    db.add(alert)
+    await db.commit()
+    return {"success": True, "alert": _alert_dict(alert)}
+
+@router.post("/alerts/list")
+async def list_price_alerts(req: PriceAlertListRequest, db: AsyncSession = Depends(get_async_db)):
+    alerts = (await db.execute(
+        select(PriceAlert).where(PriceAlert.user_id == req.user_id, PriceAlert.active.is_(True))
+    )).scalars().all()
+    return {"alerts": [_alert_dict(a) for a in alerts]}
+
+@router.post("/alerts/delete")
+async def delete_price_alert(req: PriceAlertDeleteRequest, db: AsyncSession = Depends(get_async_db)):
+    alert = await db.scalar(select(PriceAlert).where(PriceAlert.id == req.alert_id, PriceAlert.user_id == req.user_id))
+    if alert and alert.active:
+        alert.active = False
+        await db.commit()
+        return {"success": True}
+    return {"success": False, "message": "Alert not found"}
+
+@router.get("/alerts/stats")
+def price_alert_stats():
+    return alert_engine.stats()
@@ -1,36 +1,81 @@
  
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from app.models.database import SessionLocal
-from app.models.models import Scheme, SchemeApplication, User
+import bisect
+import datetime
+import os
+import time
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.data_versions import get_data_version
+from app.models.models import Scheme, SchemeApplication, SchemeEligibility, User
+from app.models.eligibility import PROFILE_FIELDS
+from app.routes.deps import get_async_db
+from app.routes.http_cache import cached_json, is_not_modified, make_etag, not_modified
 from app.schemas.scheme_schema import SchemeEligibilityRequest, SchemeApplicationRequest
 
 router = APIRouter()
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+# How often to check the schemes data version, as for the /market cache
+SCHEME_VERSION_CHECK_S = float(os.environ.get("SCHEME_VERSION_CHECK_S", "1"))
+
+# Sorted scheme deadlines at the current version: how many have passed is part of the ETag, since
+# a deadline changes the eligible list without any write
+_scheme_state = {"version": None, "checked_at": 0.0, "deadlines": []}
+
+def _schemes_stamp(db):
+    now = time.monotonic()
+    if now - _scheme_state["checked_at"] >= SCHEME_VERSION_CHECK_S:
+        version = get_data_version(db, "schemes")
+        _scheme_state["checked_at"] = now
+        if version != _scheme_state["version"]:
+            deadlines = db.execute(select(Scheme.deadline).where(Scheme.deadline.is_not(None))).scalars().all()
+            _scheme_state.update(version=version, deadlines=sorted(deadlines))
+    expired = bisect.bisect_left(_scheme_state["deadlines"], datetime.datetime.utcnow())
+    return _scheme_state["version"], expired
+
+async def eligibility_stamp(db, user):
+    # What a user's eligible list depends on: the schemes (data version, passed deadlines) and
+    # the profile fields the rules read
+    version, expired = await db.run_sync(_schemes_stamp)
+    return (version, expired, user.id, *(getattr(user, f) for f in PROFILE_FIELDS))
+
+async def find_eligible_schemes(db, user_id):
+    # Matches are precomputed on profile/scheme writes (app/models/eligibility.py): one indexed read here
+    user = await db.get(User, user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    eligible = (await db.execute(
+        select(Scheme)
+        .join(SchemeEligibility, SchemeEligibility.scheme_id == Scheme.id)
+        .where(SchemeEligibility.user_id == user.id)
+        .where(or_(Scheme.deadline.is_(None), Scheme.deadline >= datetime.datetime.utcnow()))
+    )).scalars().all()
+    return [{"id": s.id, "name": s.name, "benefits": s.benefits, "deadline": s.deadline} for s in eligible]
 
 @router.post("/schemes/eligible")
-def get_eligible_schemes(req: SchemeEligibilityRequest, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.id == req.user_id).first()
+async def get_eligible_schemes(req: SchemeEligibilityRequest, db: AsyncSession = Depends(get_async_db)):
+    return ORJSONResponse({"eligible_schemes": await find_eligible_schemes(db, req.user_id)})
+
+@router.get("/schemes/eligible")
+async def get_eligible_schemes_cacheable(request: Request, user_id: int, db: AsyncSession = Depends(get_async_db)):
+    # The eligibility stamp makes the ETag; a 304 costs a primary-key read
+    user = await db.get(User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    eligible = db.query(Scheme).all()  # TODO: Implement real eligibility check based on user data & scheme criteria
-    result = [{"id": s.id, "name": s.name, "benefits": s.benefits, "deadline": s.deadline} for s in eligible]
-    return {"eligible_schemes": result}
+    etag = make_etag("schemes", *await eligibility_stamp(db, user))
+    if is_not_modified(request, etag):
+        return not_modified(etag)
+    return cached_json({"eligible_schemes": await find_eligible_schemes(db, user_id)}, etag)
 
 @router.post("/schemes/apply")
-def apply_scheme(req: SchemeApplicationRequest, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.id == req.user_id).first()
-    scheme = db.query(Scheme).filter(Scheme.id == req.scheme_id).first()
+async def apply_scheme(req: SchemeApplicationRequest, db: AsyncSession = Depends(get_async_db)):
+    user = await db.get(User, req.user_id)
+    scheme = await db.get(Scheme, req.scheme_id)
     if not user or not scheme:
         raise HTTPException(status_code=404, detail="User or Scheme not found")
     app = SchemeApplication(user_id=user.id, scheme_id=scheme.id, status="Applied")
     db.add(app)
-    db.commit()
-    db.refresh(app)
+    await db.commit()
     return {"message": "Applied successfully", "application_id": app.id}
@@ -0,0 +1,27 @@
+import msgpack
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.responses import ORJSONResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.sync import changes
+from app.routes.deps import get_async_db
+from app.schemas.sync_schema import SyncRequest
+
+router = APIRouter()
+
+MSGPACK_TYPES = ("application/msgpack", "application/x-msgpack")
+
+
+@router.post("/sync")
+async def sync(req: SyncRequest, request: Request, db: AsyncSession = Depends(get_async_db)):
+    # Rows changed since the cursor, tabular (column names once per table); call again while has_more
+    try:
+        result = await db.run_sync(
+            lambda session: changes(session.connection(), req.user_id, req.cursor, req.limit, req.crops)
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    accept = request.headers.get("accept", "")
+    if any(t in accept for t in MSGPACK_TYPES):
+        return Response(msgpack.packb(result), media_type="application/msgpack")
+    return ORJSONResponse(result)
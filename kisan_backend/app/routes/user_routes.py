@@ -1,22 +1,15 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.models.database import SessionLocal
 from app.models.models import User
-from app.routes.deps import get_current_user
+# Same get_async_db as get_current_user_for_update, so the request shares one session and the profile edit is committed
+from app.routes.deps import auth_cache_stats, get_async_db, get_current_user, get_current_user_for_update, invalidate_user
 
 router = APIRouter(prefix="/user", tags=["User"])
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 
 @router.get("/profile")
-def get_profile(current_user=Depends(get_current_user)):
+async def get_profile(current_user=Depends(get_current_user)):
     return {
         "id": current_user.id,
         "phone": current_user.phone,
@@ -31,13 +24,19 @@ def get_profile(current_user=Depends(get_current_user)):
 
 
 @router.put("/profile/update")
-def update_profile(data: dict, current_user=Depends(get_current_user), db: Session = Depends(get_db)):
+async def update_profile(data: dict, current_user=Depends(get_current_user_for_update), db: AsyncSession = Depends(get_async_db)):
 
     for key, value in data.items():
         if hasattr(current_user, key) and value is not None:
             setattr(current_user, key, value)
 
-    db.commit()
-    db.refresh(current_user)
+    await db.commit()
+    invalidate_user(current_user.id)
+    await db.refresh(current_user)
 
     return {"message": "Profile updated", "profile": data}
+
+
+@router.get("/cache/stats")
+def user_cache_stats():
+    return auth_cache_stats()
@@ -1,33 +1,142 @@
- 
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from app.models.database import SessionLocal
+import asyncio
+import base64
+import binascii
+import json
+import logging
+import math
+import os
+
+from cachetools import TTLCache
+from fastapi import APIRouter, HTTPException
+from app.models.database import AsyncSessionLocal
+from app.models.models import User, normalize_key
+from app.routes.diagnosis_routes import MAX_IMAGE_BYTES, diagnose_image
+from app.routes.market_routes import current_data_version, lookup_market_prices
+from app.routes.scheme_routes import eligibility_stamp, find_eligible_schemes
 from app.schemas.voice_agent_schema import VoiceAgentRequest
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 
-def get_db():
-    db = SessionLocal()
+# Longest base64 text that can decode to at most MAX_IMAGE_BYTES, checked before decoding
+MAX_IMAGE_BASE64_CHARS = 4 * math.ceil(MAX_IMAGE_BYTES / 3)
+
+# Each intent gets this long; a slow one is reported in its own result instead of failing the turn
+VOICE_INTENT_TIMEOUT_S = float(os.environ.get("VOICE_INTENT_TIMEOUT_S", "10"))
+# Farmers often repeat a spoken question; answers are reused per user for this short window, and
+# only while the data they came from is unchanged (see the stamps below)
+VOICE_CACHE_TTL_S = float(os.environ.get("VOICE_CACHE_TTL_S", "60"))
+VOICE_CACHE_SIZE = int(os.environ.get("VOICE_CACHE_SIZE", "10000"))
+
+# Only touched from the event loop, so no lock is needed
+_answer_cache = TTLCache(maxsize=VOICE_CACHE_SIZE, ttl=VOICE_CACHE_TTL_S)
+_cache_stats = {"hits": 0, "misses": 0}
+
+async def _diagnose(db, user_id, params):
+    crop = params.get("crop", "")
+    image = params.get("image")
+    if not image:
+        raise HTTPException(status_code=400, detail="A base64-encoded leaf photo is required in parameters.image")
+    if not isinstance(image, str) or len(image) > MAX_IMAGE_BASE64_CHARS:
+        raise HTTPException(status_code=413, detail=f"parameters.image must be base64 of at most {MAX_IMAGE_BYTES} bytes")
     try:
-        yield db
-    finally:
-        db.close()
+        data = base64.b64decode(image, validate=True)
+    except (binascii.Error, ValueError):
+        raise HTTPException(status_code=400, detail="parameters.image is not valid base64")
+    result = await diagnose_image(data, f"user:{user_id}")
+    return {
+        "action": "diagnose",
+        "crop": crop,
+        "result": {"predicted_disease": result["disease"], "confidence": result["confidence"]},
+    }
 
-@router.post("/voice-agent")
-def handle_voice_agent(req: VoiceAgentRequest, db: Session = Depends(get_db)):
-    intent = req.intent.lower()
-    response = {}
-    if intent == "diagnose":
-        crop = req.parameters.get("crop", "")
-        # Call your /diagnose endpoint logic here
-        response = {"action": "diagnose", "crop": crop, "result": "Diagnosis logic to call"}
-    elif intent == "market":
-        crop = req.parameters.get("crop", "")
-        # Call your /market endpoint logic here
-        response = {"action": "market price", "crop": crop, "result": "Market logic to call"}
-    elif intent == "schemes":
-        # Call your /schemes/eligible endpoint logic here
-        response = {"action": "eligible schemes", "result": "Scheme logic to call"}
-    else:
-        response = {"message": "Intent not recognized"}
+async def _market(db, user_id, params):
+    crop = params.get("crop", "")
+    if not crop:
+        raise HTTPException(status_code=400, detail="Which crop? parameters.crop is required")
+    prices = await db.run_sync(lookup_market_prices, crop, params.get("mandi"))
+    return {"action": "market price", "crop": crop, "result": prices}
+
+async def _schemes(db, user_id, params):
+    schemes = await find_eligible_schemes(db, user_id)
+    return {"action": "eligible schemes", "result": schemes}
+
+# Stamps: what a cached answer depends on, as the /market and /schemes ETags use them. A cached
+# answer is only reused under the same stamp, so an ingest or a profile edit takes effect at once
+async def _market_stamp(db, user_id, params):
+    return await db.run_sync(current_data_version)
+
+async def _schemes_stamp(db, user_id, params):
+    user = await db.get(User, user_id)
+    if user is None:
+        return None  # not cached; the handler answers 404
+    return await eligibility_stamp(db, user)
+
+# intent -> (handler, stamp or None if not cached). Diagnoses aren't cached here: the prediction
+# cache already dedupes identical photos, and keying on the whole base64 payload would only waste memory.
+INTENTS = {
+    "diagnose": (_diagnose, None),
+    "market": (_market, _market_stamp),
+    "schemes": (_schemes, _schemes_stamp),
+}
+
+def _cache_key(user_id, intent, params, stamp):
+    # "Tomato " and "tomato" are the same spoken question
+    normalized = {k: normalize_key(v) if isinstance(v, str) else v for k, v in params.items()}
+    return (user_id, intent, json.dumps(normalized, sort_keys=True, default=str), json.dumps(stamp, default=str))
+
+async def _answer(user_id, intent, params):
+    intent = (intent or "").strip().lower()
+    if intent not in INTENTS:
+        return {"intent": intent, "message": "Intent not recognized"}
+    handler, stamp = INTENTS[intent]
+    try:
+        # One session per intent (they run concurrently); it only connects if the intent reads
+        async with AsyncSessionLocal() as db:
+            key = None
+            if stamp is not None:
+                version = await stamp(db, user_id, params)
+                if version is not None:
+                    key = _cache_key(user_id, intent, params, version)
+                    cached = _answer_cache.get(key)
+                    if cached is not None:
+                        _cache_stats["hits"] += 1
+                        return cached
+                    _cache_stats["misses"] += 1
+            response = await asyncio.wait_for(handler(db, user_id, params), VOICE_INTENT_TIMEOUT_S)
+    except HTTPException as e:
+        return {"intent": intent, "error": e.detail, "status_code": e.status_code}
+    except asyncio.TimeoutError:
+        return {"intent": intent, "error": "Timed out, please ask again", "status_code": 504}
+    except Exception:
+        # One failing intent mustn't cost the others in the same utterance their answers
+        logger.exception("Voice intent %s failed", intent)
+        return {"intent": intent, "error": "Could not answer this, please ask again", "status_code": 500}
+    if key is not None:
+        _answer_cache[key] = response
     return response
+
+@router.post("/voice-agent")
+async def handle_voice_agent(req: VoiceAgentRequest):
+    # Handlers call the market/scheme/diagnosis logic in-process, each with its own session,
+    # so a compound utterance costs the slowest intent rather than the sum of them. _answer turns
+    # every failure into that intent's error entry, so gather never drops the other answers
+    if not req.intents:
+        if not req.intent:
+            raise HTTPException(status_code=422, detail="Either intent or intents is required")
+        return await _answer(req.user_id, req.intent, req.parameters)
+    results = await asyncio.gather(*(_answer(req.user_id, i.intent, i.parameters) for i in req.intents))
+    return {"results": list(results)}
+
+@router.get("/voice-agent/cache/stats")
+def voice_cache_stats():
+    lookups = _cache_stats["hits"] + _cache_stats["misses"]
+    return {
+        "size": len(_answer_cache),
+        "max_size": VOICE_CACHE_SIZE,
+        "ttl_s": VOICE_CACHE_TTL_S,
+        "hits": _cache_stats["hits"],
+        "misses": _cache_stats["misses"],
+        "hit_rate": round(_cache_stats["hits"] / lookups, 4) if lookups else 0.0,
+    }
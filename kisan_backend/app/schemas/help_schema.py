@@ -1,5 +1,11 @@
- 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 class HelpHistoryRequest(BaseModel):
     user_id: int
+    limit: int = Field(20, ge=1, le=100)
+    cursor: int = None  # next_cursor from the previous page
+
+class HelpSearchRequest(BaseModel):
+    user_id: int
+    q: str = Field(min_length=1, max_length=500)
+    limit: int = Field(10, ge=1, le=50)
@@ -1,6 +1,14 @@
  
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 class MarketPriceRequest(BaseModel):
     crop: str
     mandi: str = None  # optional: if specific mandi (market) is needed
+
+class NearestMarketRequest(BaseModel):
+    crop: str
+    user_id: int = None      # placed from the profile's village/district when no coordinates are sent
+    latitude: float = Field(None, ge=-90, le=90)
+    longitude: float = Field(None, ge=-180, le=180)
+    k: int = Field(5, ge=1, le=50)
+    max_km: float = Field(None, gt=0)
@@ -1,9 +1,36 @@
  
-from pydantic import BaseModel
+from typing import Literal
+
+from pydantic import BaseModel, Field
 
 class NotificationRequest(BaseModel):
     user_id: int
+    limit: int = Field(20, ge=1, le=100)
+    cursor: int = None  # next_cursor from the previous page
+    unread_only: bool = False
+
+class UnreadCountRequest(BaseModel):
+    user_id: int
 
 class MarkReadRequest(BaseModel):
     user_id: int
-    notification_id: int
+    notification_id: int = None
+    notification_ids: list[int] = Field(default_factory=list, max_length=1000)
+
+class MarkAllReadRequest(BaseModel):
+    user_id: int
+    up_to_id: int = None  # newest id the client has seen; later arrivals stay unread
+
+class PriceAlertRequest(BaseModel):
+    user_id: int
+    crop: str
+    mandi: str = None  # optional: alert on any mandi for the crop
+    direction: Literal["above", "below"]
+    threshold: float = Field(gt=0)
+
+class PriceAlertListRequest(BaseModel):
+    user_id: int
+
+class PriceAlertDeleteRequest(BaseModel):
+    user_id: int
+    alert_id: int
@@ -0,0 +1,7 @@
+from pydantic import BaseModel, Field
+
+class SyncRequest(BaseModel):
+    user_id: int
+    cursor: str = None  # from the previous sync; omit for a full sync
+    limit: int = Field(500, ge=1, le=5000)  # rows per table per page
+    crops: list[str] = Field(default_factory=list, max_length=100)  # only these crops' prices (default: all)
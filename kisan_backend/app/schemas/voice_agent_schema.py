@@ -1,7 +1,11 @@
- 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+
+class VoiceIntent(BaseModel):
+    intent: str        # e.g., "diagnose", "market", "schemes"
+    parameters: dict = Field(default_factory=dict)
 
 class VoiceAgentRequest(BaseModel):
     user_id: int
-    intent: str        # e.g., "diagnose", "market", "schemes"
-    parameters: dict   # pass relevant command/details
+    intent: str = None       # single intent, as before
+    parameters: dict = Field(default_factory=dict)   # pass relevant command/details
+    intents: list[VoiceIntent] = Field(default_factory=list, max_length=5)  # compound utterance, answered together
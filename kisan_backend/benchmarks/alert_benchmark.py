@@ -0,0 +1,121 @@
+# benchmarks/alert_benchmark.py
+# Price-alert matching throughput: the sorted ThresholdIndex vs. a per-subscription scan, plus the
+# end-to-end drain (claim price_events -> match -> bulk insert notifications) on a throwaway database.
+#
+#   python benchmarks/alert_benchmark.py --alerts 500000 --updates 100000
+#
+# Prints JSON with matches/sec and updates/sec per strategy.
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+from sqlalchemy import create_engine, insert
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.alerts import AlertEngine, ThresholdIndex  # noqa: E402
+from app.models.models import Base, PriceAlert, PriceEvent  # noqa: E402
+
+
+def make_alerts(n, crops, mandis, rng):
+    rows = []
+    for alert_id in range(1, n + 1):
+        mandi = None if rng.random() < 0.1 else rng.randrange(mandis)
+        rows.append((
+            alert_id, rng.randrange(1, n // 3 + 2), f"crop {rng.randrange(crops)}",
+            None if mandi is None else f"mandi {mandi}", rng.choice(("above", "below")),
+            round(rng.uniform(1000, 3000), 0),
+        ))
+    return rows
+
+
+def make_updates(n, crops, mandis, rng):
+    updates = []
+    for _ in range(n):
+        old = rng.uniform(1000, 3000)
+        updates.append((f"crop {rng.randrange(crops)}", f"mandi {rng.randrange(mandis)}", old, old * rng.uniform(0.9, 1.1)))
+    return updates
+
+
+def naive_match(alerts, crop_key, mandi_key, old, new):
+    matched = []
+    for alert_id, user_id, a_crop, a_mandi, direction, threshold in alerts:
+        if a_crop != crop_key or (a_mandi is not None and a_mandi != mandi_key):
+            continue
+        if (direction == "above" and old < threshold <= new) or (direction == "below" and new <= threshold < old):
+            matched.append(alert_id)
+    return matched
+
+
+def rate(count, seconds):
+    return round(count / seconds, 1) if seconds > 0 else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Price-threshold alert matching throughput")
+    parser.add_argument("--alerts", type=int, default=500_000)
+    parser.add_argument("--updates", type=int, default=100_000)
+    parser.add_argument("--crops", type=int, default=100)
+    parser.add_argument("--mandis", type=int, default=500)
+    parser.add_argument("--scan-updates", type=int, default=50, help="the per-subscription scan is slow; sample fewer")
+    parser.add_argument("--db-updates", type=int, default=20_000, help="price events for the end-to-end drain")
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    alerts = make_alerts(args.alerts, args.crops, args.mandis, rng)
+    updates = make_updates(args.updates, args.crops, args.mandis, rng)
+    results = {"alerts": args.alerts}
+
+    started = time.perf_counter()
+    index = ThresholdIndex(alerts)
+    results["index_build_s"] = round(time.perf_counter() - started, 3)
+
+    started = time.perf_counter()
+    matches = sum(len(index.match(*u)) for u in updates)
+    elapsed = time.perf_counter() - started
+    results["indexed"] = {
+        "updates": len(updates), "matches": matches, "seconds": round(elapsed, 3),
+        "updates_per_sec": rate(len(updates), elapsed), "matches_per_sec": rate(matches, elapsed),
+    }
+
+    sample = updates[:args.scan_updates]
+    started = time.perf_counter()
+    scan_matches = sum(len(naive_match(alerts, *u)) for u in sample)
+    elapsed = time.perf_counter() - started
+    assert scan_matches == sum(len(index.match(*u)) for u in sample)
+    results["per_subscription_scan"] = {
+        "updates": len(sample), "matches": scan_matches, "seconds": round(elapsed, 3),
+        "updates_per_sec": rate(len(sample), elapsed), "matches_per_sec": rate(scan_matches, elapsed),
+    }
+
+    # End to end through SQLite: claim events, match, one bulk Notification insert per batch
+    tmpdir = tempfile.mkdtemp(prefix="kisan_bench_")
+    path = os.path.join(tmpdir, "alerts.db")
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(PriceAlert), [
+            {"id": a, "user_id": u, "crop": c, "mandi": m, "crop_key": c, "mandi_key": m,
+             "direction": d, "threshold": t, "active": True}
+            for a, u, c, m, d, t in alerts
+        ])
+        conn.execute(insert(PriceEvent), [
+            {"crop": c, "mandi": m, "crop_key": c, "mandi_key": m, "old_price": old, "new_price": new}
+            for c, m, old, new in updates[:args.db_updates]
+        ])
+    report = AlertEngine(engine).run_once()
+    report["notifications_per_sec"] = rate(report["notifications"], report["seconds"])
+    results["end_to_end_sqlite"] = report
+    engine.dispose()
+    os.remove(path)
+    os.rmdir(tmpdir)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+# benchmarks/backend_benchmark.py
+# Compares the diagnosis inference backends against the Keras baseline on a folder of sample leaf photos.
+#
+#   python -m app.models.export_model --format tflite --quantization float16     (from kisan_backend/)
+#   python benchmarks/backend_benchmark.py --images samples/leaves --backends keras tflite:float16 tflite:int8 onnx
+#
+# Each backend runs in its own process so load time and memory are not polluted by the others.
+# Reports load time, RSS after load, single-image and batched latency, and top-1 agreement with Keras.
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def percentiles(samples):
+    arr = np.array(samples)
+    return {
+        "p50_ms": round(float(np.percentile(arr, 50)), 3),
+        "p95_ms": round(float(np.percentile(arr, 95)), 3),
+        "mean_ms": round(float(arr.mean()), 3),
+    }
+
+
+def run_backend(spec, image_paths, batch_size, repeats, model_path):
+    from app.models.diagnosis_ml import load_backend, exported_model_path, preprocess_image, MODEL_PATH
+
+    name, _, quantization = spec.partition(":")
+    path = exported_model_path(name, quantization or "float16", model_path or MODEL_PATH)
+    images = np.concatenate([preprocess_image(p) for p in image_paths]).astype(np.float32)
+
+    rss_before = rss_mb()
+    started = time.perf_counter()
+    backend = load_backend(name, path)
+    backend.predict(images[:1])  # first call builds kernels / allocates tensors
+    load_s = time.perf_counter() - started
+    rss_loaded = rss_mb()
+
+    single = []
+    for _ in range(repeats):
+        for i in range(len(images)):
+            t = time.perf_counter()
+            backend.predict(images[i:i + 1])
+            single.append((time.perf_counter() - t) * 1000.0)
+
+    batched = []
+    for _ in range(repeats):
+        for start in range(0, len(images), batch_size):
+            chunk = images[start:start + batch_size]
+            t = time.perf_counter()
+            backend.predict(chunk)
+            batched.append((time.perf_counter() - t) * 1000.0 / len(chunk))
+
+    preds = np.concatenate([backend.predict(images[s:s + batch_size]) for s in range(0, len(images), batch_size)])
+    return {
+        "backend": spec,
+        "path": path,
+        "model_size_mb": round(os.path.getsize(path) / (1024 * 1024), 2),
+        "load_s": round(load_s, 3),
+        "rss_mb": round(rss_loaded, 1),
+        "rss_delta_mb": round(rss_loaded - rss_before, 1),
+        "single_image": percentiles(single),
+        f"batch_{batch_size}_per_image": percentiles(batched),
+        "top1": np.argmax(preds, axis=1).tolist(),
+        "probs": preds.tolist(),
+    }
+
+
+def _worker(queue, *args):
+    try:
+        queue.put(run_backend(*args))
+    except Exception as e:
+        queue.put({"backend": args[0], "error": f"{type(e).__name__}: {e}"})
+
+
+def main():
+    from app.models.export_model import list_images
+
+    parser = argparse.ArgumentParser(description="Latency, memory and top-1 agreement of diagnosis backends")
+    parser.add_argument("--images", required=True, help="folder of sample leaf photos")
+    parser.add_argument("--limit", type=int, default=200)
+    parser.add_argument("--backends", nargs="+", default=["keras", "tflite:float16", "tflite:int8", "onnx"])
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--model-path", help="source .h5 (exported files are looked up next to it)")
+    args = parser.parse_args()
+
+    image_paths = list_images(args.images, args.limit)
+    if not image_paths:
+        raise SystemExit(f"No images found under {args.images}")
+
+    specs = ["keras"] + [b for b in args.backends if b != "keras"]
+    ctx = multiprocessing.get_context("spawn")
+    results = []
+    for spec in specs:
+        queue = ctx.Queue()
+        proc = ctx.Process(target=_worker, args=(queue, spec, image_paths, args.batch_size, args.repeats, args.model_path))
+        proc.start()
+        results.append(queue.get())
+        proc.join()
+
+    baseline = results[0]
+    base_top1 = np.array(baseline.get("top1", []))
+    base_probs = np.array(baseline.get("probs", []))
+    for result in results:
+        if "error" in result:
+            continue
+        top1 = np.array(result.pop("top1"))
+        probs = np.array(result.pop("probs"))
+        if "error" not in baseline:
+            result["top1_agreement"] = round(float(np.mean(top1 == base_top1)), 4)
+            result["max_abs_prob_diff"] = round(float(np.abs(probs - base_probs).max()), 4)
+
+    print(json.dumps({"images": len(image_paths), "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
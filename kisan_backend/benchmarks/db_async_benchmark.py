@@ -0,0 +1,208 @@
+# benchmarks/db_async_benchmark.py
+# Requests/sec of the async database routes vs. the same queries as the old sync routes
+# (def handlers on the threadpool with SessionLocal), served side by side by one uvicorn worker.
+#
+#   python benchmarks/db_async_benchmark.py --concurrency 64 --duration 10
+#
+# Seeds a throwaway SQLite file (or --database-url, which must be disposable), starts the server in
+# a subprocess (--serve) and prints JSON with req/s and latency percentiles per endpoint.
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# (name, sync path, async path, body factory)
+ENDPOINTS = [
+    ("notifications_page", "/sync/notifications", "/notifications", lambda user: {"user_id": user, "limit": 20}),
+    ("unread_count", "/sync/notifications/unread_count", "/notifications/unread_count", lambda user: {"user_id": user}),
+    ("eligible_schemes", "/sync/schemes/eligible", "/schemes/eligible", lambda user: {"user_id": user}),
+]
+
+
+def build_app():
+    # The real async routers plus sync copies of the same queries, as the routes were before
+    import datetime
+
+    from fastapi import APIRouter, Depends, FastAPI
+    from sqlalchemy import func, or_
+    from sqlalchemy.orm import Session
+
+    from app.models.models import Notification, Scheme, SchemeEligibility, User
+    from app.routes import notification_routes, scheme_routes
+    from app.routes.deps import get_db
+
+    sync = APIRouter(prefix="/sync")
+
+    @sync.post("/notifications")
+    def sync_notifications(body: dict, db: Session = Depends(get_db)):
+        notes = (
+            db.query(Notification).filter(Notification.user_id == body["user_id"])
+            .order_by(Notification.id.desc()).limit(body["limit"] + 1).all()
+        )
+        return {"notifications": [{"id": n.id, "type": n.type, "content": n.content, "read": n.read_flag} for n in notes]}
+
+    @sync.post("/notifications/unread_count")
+    def sync_unread_count(body: dict, db: Session = Depends(get_db)):
+        count = db.query(func.count(Notification.id)).filter(
+            Notification.user_id == body["user_id"], Notification.read_flag.is_(False)
+        ).scalar()
+        return {"unread": count}
+
+    @sync.post("/schemes/eligible")
+    def sync_eligible(body: dict, db: Session = Depends(get_db)):
+        user = db.query(User).filter(User.id == body["user_id"]).first()
+        schemes = (
+            db.query(Scheme).join(SchemeEligibility, SchemeEligibility.scheme_id == Scheme.id)
+            .filter(SchemeEligibility.user_id == user.id)
+            .filter(or_(Scheme.deadline.is_(None), Scheme.deadline >= datetime.datetime.utcnow()))
+            .all()
+        )
+        return {"eligible_schemes": [{"id": s.id, "name": s.name, "benefits": s.benefits, "deadline": s.deadline} for s in schemes]}
+
+    app = FastAPI()
+    app.include_router(notification_routes.router)
+    app.include_router(scheme_routes.router)
+    app.include_router(sync)
+
+    @app.get("/healthz")
+    def healthz():
+        return {"status": "ok"}
+
+    return app
+
+
+def seed(users, notifications_per_user, schemes):
+    from sqlalchemy import insert
+
+    from app.models.database import engine
+    from app.models.eligibility import rebuild_all
+    from app.models.models import Base, Notification, Scheme, User
+
+    Base.metadata.create_all(engine)
+    rng = random.Random(1)
+    states = ["Karnataka", "Punjab", "Maharashtra", "Tamil Nadu"]
+    with engine.begin() as conn:
+        conn.execute(insert(User), [
+            {"id": i, "phone": f"+91{i:010d}", "name": f"farmer {i}", "state": rng.choice(states),
+             "land_size": round(rng.uniform(0.5, 10), 1), "crops": "paddy, ragi"}
+            for i in range(1, users + 1)
+        ])
+        conn.execute(insert(Scheme), [
+            {"name": f"scheme {i}", "eligibility_criteria": json.dumps({"state": rng.choice(states), "land_size": {"max": 5}})}
+            for i in range(schemes)
+        ])
+        rows = []
+        for user in range(1, users + 1):
+            rows += [{"user_id": user, "type": "price_alert", "content": "Tomato crossed Rs 2,000",
+                      "read_flag": rng.random() < 0.7} for _ in range(notifications_per_user)]
+        conn.execute(insert(Notification), rows)
+        rebuild_all(conn)
+
+
+async def load(client, path, body_for, users, concurrency, duration):
+    latencies, errors = [], 0
+    deadline = time.perf_counter() + duration
+
+    async def worker(seed):
+        nonlocal errors
+        rng = random.Random(seed)
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            resp = await client.post(path, json=body_for(rng.randint(1, users)))
+            if resp.status_code == 200:
+                latencies.append((time.perf_counter() - started) * 1000.0)
+            else:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    arr = np.array(latencies) if latencies else np.array([0.0])
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "req_per_s": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(float(np.percentile(arr, 50)), 2),
+        "p95_ms": round(float(np.percentile(arr, 95)), 2),
+        "p99_ms": round(float(np.percentile(arr, 99)), 2),
+    }
+
+
+async def run_load(args, base_url):
+    limits = httpx.Limits(max_connections=args.concurrency)
+    results = {}
+    async with httpx.AsyncClient(base_url=base_url, timeout=60.0, limits=limits) as client:
+        for name, sync_path, async_path, body_for in ENDPOINTS:
+            await load(client, async_path, body_for, args.users, args.concurrency, 1.0)  # warm pools and caches
+            await load(client, sync_path, body_for, args.users, args.concurrency, 1.0)
+            results[name] = {
+                "sync": await load(client, sync_path, body_for, args.users, args.concurrency, args.duration),
+                "async": await load(client, async_path, body_for, args.users, args.concurrency, args.duration),
+            }
+            results[name]["speedup"] = round(
+                results[name]["async"]["req_per_s"] / max(results[name]["sync"]["req_per_s"], 1e-9), 2
+            )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sync vs async database routes, requests/sec")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per endpoint and variant")
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--notifications-per-user", type=int, default=50)
+    parser.add_argument("--schemes", type=int, default=50)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--database-url", help="defaults to a temporary SQLite file")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        import uvicorn
+        uvicorn.run(build_app(), host="127.0.0.1", port=args.port, log_level="warning")
+        return
+
+    tmpdir = None
+    url = args.database_url
+    if not url:
+        tmpdir = tempfile.mkdtemp(prefix="kisan_bench_")
+        url = f"sqlite:///{os.path.join(tmpdir, 'bench.db')}"
+    # app.models.database reads DATABASE_URL at import, which happens inside seed() and in the server
+    os.environ["DATABASE_URL"] = url
+    seed(args.users, args.notifications_per_user, args.schemes)
+
+    env = {**os.environ, "ALERTS_ENABLED": "0"}
+    server = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--serve", "--port", str(args.port)], env=env, cwd=ROOT)
+    base_url = f"http://127.0.0.1:{args.port}"
+    try:
+        for _ in range(100):
+            try:
+                if httpx.get(f"{base_url}/healthz").status_code == 200:
+                    break
+            except httpx.HTTPError:
+                time.sleep(0.2)
+        results = asyncio.run(run_load(args, base_url))
+    finally:
+        server.terminate()
+        server.wait()
+    print(json.dumps({"database": url.split("://")[0], "concurrency": args.concurrency, **results}, indent=2))
+
+    if tmpdir:
+        for name in os.listdir(tmpdir):
+            os.remove(os.path.join(tmpdir, name))
+        os.rmdir(tmpdir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+# benchmarks/help_search_benchmark.py
+# Help-history search and paging latency at millions of rows.
+#
+#   python benchmarks/help_search_benchmark.py --rows 2000000 --users 50000 --heavy-user-rows 100000
+#
+# Seeds a throwaway SQLite file (or --database-url, which must be disposable), builds the full-text
+# index the way upgrade_schema does, then times per-user searches through the index against the
+# LIKE scan used without one, and a keyset history page against loading the whole history.
+# User 1 is a heavy user (--heavy-user-rows), reported separately. Prints JSON.
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Farm words first, then filler; drawn Zipf-like so a few words are everywhere and most are rare
+WORDS = (
+    "tomato paddy ragi wheat cotton chilli onion potato maize sugarcane groundnut banana leaf curl blight "
+    "rust wilt blast aphid whitefly borer mildew yellow spots fungus spray neem oil urea potash dap irrigation "
+    "drip sowing harvest seed price mandi loan subsidy insurance soil test rain monsoon storage"
+).split() + [f"w{i}" for i in range(20000)]
+CUM_WEIGHTS = np.cumsum(1.0 / np.arange(1, len(WORDS) + 1) ** 1.05).tolist()
+
+
+def sentence(rng, n):
+    return " ".join(rng.choices(WORDS, cum_weights=CUM_WEIGHTS, k=n))
+
+
+def seed(engine, rows, users, heavy_rows, batch=50000):
+    from sqlalchemy import insert
+
+    from app.models.help_search import ensure_search_index
+    from app.models.models import Base, HelpHistory
+
+    Base.metadata.create_all(engine)
+    rng = random.Random(7)
+    started = time.perf_counter()
+    with engine.begin() as conn:
+        for start in range(0, rows, batch):
+            chunk = []
+            for i in range(start, min(start + batch, rows)):
+                user = 1 if i < heavy_rows else rng.randint(2, users)
+                chunk.append({"user_id": user, "query": sentence(rng, rng.randint(3, 10)), "result": sentence(rng, rng.randint(15, 40))})
+            conn.execute(insert(HelpHistory), chunk)
+    inserted = time.perf_counter() - started
+    # Bulk-load first and index once, as upgrade_schema does for an existing table
+    started = time.perf_counter()
+    with engine.begin() as conn:
+        ensure_search_index(conn)
+    return {"insert_s": round(inserted, 1), "index_build_s": round(time.perf_counter() - started, 1)}
+
+
+def percentiles(latencies):
+    arr = np.array(latencies)
+    return {
+        "queries": len(latencies),
+        "p50_ms": round(float(np.percentile(arr, 50)), 3),
+        "p95_ms": round(float(np.percentile(arr, 95)), 3),
+        "p99_ms": round(float(np.percentile(arr, 99)), 3),
+    }
+
+
+def timed(fn, args):
+    latencies = []
+    for a in args:
+        started = time.perf_counter()
+        fn(*a)
+        latencies.append((time.perf_counter() - started) * 1000.0)
+    return percentiles(latencies)
+
+
+def run(engine, users, samples, limit):
+    from sqlalchemy import select
+
+    from app.models import help_search
+    from app.models.models import HelpHistory
+
+    rng = random.Random(11)
+    dialect = engine.dialect.name
+    results = {}
+    with engine.connect() as conn:
+        class Unindexed:
+            # The same search through the LIKE fallback used when no full-text index exists
+            def __init__(self, conn):
+                self._conn = conn
+                self.dialect = type("Dialect", (), {"name": "none"})()
+
+            def execute(self, *a, **kw):
+                return self._conn.execute(*a, **kw)
+
+        def page(user):
+            conn.execute(select(HelpHistory).where(HelpHistory.user_id == user).order_by(HelpHistory.id.desc()).limit(21)).all()
+
+        def everything(user):
+            conn.execute(select(HelpHistory).where(HelpHistory.user_id == user)).all()
+
+        for label, pick_user in (("typical_user", lambda: rng.randint(2, users)), ("heavy_user", lambda: 1)):
+            picks = [(pick_user(), sentence(rng, rng.randint(1, 3))) for _ in range(samples)]
+            few = picks[:max(samples // 10, 20)]
+            results[label] = {
+                "search_indexed": timed(help_search.search_history, [(conn, u, q, limit) for u, q in picks]),
+                "search_like_scan": timed(help_search.search_history, [(Unindexed(conn), u, q, limit) for u, q in few]),
+                "history_page": timed(page, [(u,) for u, _ in picks]),
+                "history_all": timed(everything, [(u,) for u, _ in few]),
+            }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Help-history full-text search latency")
+    parser.add_argument("--rows", type=int, default=2000000)
+    parser.add_argument("--users", type=int, default=50000)
+    parser.add_argument("--heavy-user-rows", type=int, default=100000)
+    parser.add_argument("--samples", type=int, default=500)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--database-url", help="defaults to a temporary SQLite file")
+    args = parser.parse_args()
+
+    from sqlalchemy import create_engine
+
+    tmpdir = None
+    url = args.database_url
+    if not url:
+        tmpdir = tempfile.mkdtemp(prefix="kisan_bench_")
+        url = f"sqlite:///{os.path.join(tmpdir, 'bench.db')}"
+    engine = create_engine(url)
+    try:
+        build = seed(engine, args.rows, args.users, min(args.heavy_user_rows, args.rows))
+        results = run(engine, args.users, args.samples, args.limit)
+    finally:
+        engine.dispose()
+        if tmpdir:
+            for name in os.listdir(tmpdir):
+                os.remove(os.path.join(tmpdir, name))
+            os.rmdir(tmpdir)
+    print(json.dumps({"database": engine.dialect.name, "rows": args.rows, "users": args.users, **build, **results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
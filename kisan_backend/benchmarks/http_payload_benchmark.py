@@ -0,0 +1,193 @@
+# benchmarks/http_payload_benchmark.py
+# Bytes on the wire and server CPU per response for /market and /schemes/eligible: the POST routes
+# as they were (jsonable_encoder + stdlib json, uncompressed) vs. now (orjson) vs. the cacheable
+# GETs (orjson, gzip/brotli) vs. a conditional GET answered with 304.
+#
+#   python benchmarks/http_payload_benchmark.py --mandis 1000 --schemes 40
+#
+# Seeds a throwaway SQLite file, serves the routers in-process (ASGI, no sockets, so the timings
+# are server CPU) and prints JSON. Brotli rows appear only when the Brotli package is installed.
+import argparse
+import asyncio
+import datetime
+import gzip
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+import httpx
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+USER_ID = 1
+
+
+def seed(mandis, schemes):
+    from sqlalchemy import insert
+
+    from app.models.data_versions import bump_data_version
+    from app.models.database import engine
+    from app.models.eligibility import rebuild_all
+    from app.models.migrations import upgrade_schema
+    from app.models.models import Base, MarketPrice, PriceStats, Scheme, User
+
+    Base.metadata.create_all(engine)
+    upgrade_schema(engine, Base.metadata)
+    rng = random.Random(1)
+    today = datetime.date.today()
+    with engine.begin() as conn:
+        conn.execute(insert(User), [{"id": USER_ID, "phone": "+910000000001", "state": "Karnataka", "land_size": 2.0, "crops": "tomato, ragi"}])
+        conn.execute(insert(MarketPrice), [
+            {"crop": "Tomato", "mandi": f"Mandi {i}", "crop_key": "tomato", "mandi_key": f"mandi {i}",
+             "price": round(rng.uniform(500, 5000), 2), "trend": rng.choice(("up", "down", "stable")), "price_date": today}
+            for i in range(mandis)
+        ])
+        conn.execute(insert(PriceStats), [
+            {"crop_key": "tomato", "mandi_key": f"mandi {i}", "last_date": today, "last_price": 1000.0, "prev_price": 990.0,
+             "change_pct": round(rng.uniform(-10, 10), 2), "change_7d_pct": round(rng.uniform(-20, 20), 2),
+             "mean_7d": round(rng.uniform(500, 5000), 2), "mean_30d": round(rng.uniform(500, 5000), 2),
+             "min_30d": 500.0, "max_30d": 5000.0, "samples_30d": rng.randint(5, 30)}
+            for i in range(mandis)
+        ])
+        conn.execute(insert(Scheme), [
+            {"name": f"Pradhan Mantri scheme {i}", "benefits": "Rs 6,000 per year in three instalments to the bank account",
+             "eligibility_criteria": json.dumps({"state": "Karnataka"}),
+             "deadline": datetime.datetime.utcnow() + datetime.timedelta(days=rng.randint(30, 365))}
+            for i in range(schemes)
+        ])
+        bump_data_version(conn, "market_prices")
+        rebuild_all(conn)
+
+
+def build_before_app():
+    # The POST routes as they were: dicts through jsonable_encoder and the stdlib encoder
+    from fastapi import Depends, FastAPI
+
+    from app.routes.deps import get_async_db
+    from app.routes.market_routes import lookup_market_prices
+    from app.routes.scheme_routes import find_eligible_schemes
+
+    app = FastAPI()
+
+    @app.post("/market")
+    async def market(body: dict, db=Depends(get_async_db)):
+        return {"prices": await db.run_sync(lookup_market_prices, body["crop"], body.get("mandi"))}
+
+    @app.post("/schemes/eligible")
+    async def eligible(body: dict, db=Depends(get_async_db)):
+        return {"eligible_schemes": await find_eligible_schemes(db, body["user_id"])}
+
+    return app
+
+
+def build_app():
+    from fastapi import FastAPI
+    from fastapi.responses import ORJSONResponse
+
+    from app.routes.compression import CompressionMiddleware
+    from app.routes.market_routes import router as market_router
+    from app.routes.scheme_routes import router as scheme_router
+
+    app = FastAPI(default_response_class=ORJSONResponse)
+    app.include_router(market_router)
+    app.include_router(scheme_router)
+    app.add_middleware(CompressionMiddleware)
+    return app
+
+
+async def measure(app, request, n):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        resp = await client.request(**request)  # warm caches
+        wire_bytes = len(resp.content) if "content-encoding" not in resp.headers else int(resp.headers["content-length"])
+        samples = []
+        for _ in range(n):
+            started = time.process_time()
+            resp = await client.request(**request)
+            samples.append((time.process_time() - started) * 1000.0)
+    arr = np.array(samples)
+    return resp, {
+        "status": resp.status_code,
+        "content_encoding": resp.headers.get("content-encoding"),
+        "wire_bytes": wire_bytes,
+        "cpu_ms_p50": round(float(np.percentile(arr, 50)), 3),
+        "cpu_ms_mean": round(float(arr.mean()), 3),
+    }
+
+
+def codec_table(body):
+    """Size and compression CPU of one payload at a few settings."""
+    from app.routes import compression
+
+    rows = {"identity": {"bytes": len(body), "compress_ms": 0.0}}
+    settings = [("gzip-1", lambda b: gzip.compress(b, 1)), ("gzip-6", lambda b: gzip.compress(b, 6)), ("gzip-9", lambda b: gzip.compress(b, 9))]
+    if compression.brotli is not None:
+        settings += [(f"br-{q}", lambda b, q=q: compression.brotli.compress(b, quality=q)) for q in (4, 6, 11)]
+    for name, fn in settings:
+        started = time.perf_counter()
+        for _ in range(20):
+            out = fn(body)
+        rows[name] = {"bytes": len(out), "ratio": round(len(out) / len(body), 3),
+                      "compress_ms": round((time.perf_counter() - started) * 1000.0 / 20, 3)}
+    return rows
+
+
+async def run(args):
+    before, after = build_before_app(), build_app()
+    endpoints = {
+        "market": ({"method": "POST", "url": "/market", "json": {"crop": "tomato"}},
+                   {"method": "GET", "url": "/market", "params": {"crop": "tomato"}}),
+        "schemes_eligible": ({"method": "POST", "url": "/schemes/eligible", "json": {"user_id": USER_ID}},
+                             {"method": "GET", "url": "/schemes/eligible", "params": {"user_id": USER_ID}}),
+    }
+    results = {}
+    for name, (post, get) in endpoints.items():
+        row = {}
+        resp, row["before_post_stdlib_json"] = await measure(before, post, args.requests)
+        _, row["post_orjson"] = await measure(after, {**post, "headers": {"Accept-Encoding": "identity"}}, args.requests)
+        _, row["get_identity"] = await measure(after, {**get, "headers": {"Accept-Encoding": "identity"}}, args.requests)
+        _, row["get_gzip"] = await measure(after, {**get, "headers": {"Accept-Encoding": "gzip"}}, args.requests)
+        br, row["get_br"] = await measure(after, {**get, "headers": {"Accept-Encoding": "br, gzip"}}, args.requests)
+        if row["get_br"]["content_encoding"] != "br":
+            del row["get_br"]
+        _, row["get_304"] = await measure(after, {**get, "headers": {"If-None-Match": br.headers["etag"]}}, args.requests)
+        row["codecs"] = codec_table(resp.content)
+        base = row["before_post_stdlib_json"]
+        best = row.get("get_br") or row["get_gzip"]
+        variants = {"before": base, "orjson": row["get_identity"], "compressed": best, "not_modified": row["get_304"]}
+        row["summary"] = {
+            "wire_bytes": {k: v["wire_bytes"] for k, v in variants.items()},
+            "cpu_ms_p50": {k: v["cpu_ms_p50"] for k, v in variants.items()},
+            "wire_saving_compressed": round(1 - best["wire_bytes"] / base["wire_bytes"], 3),
+        }
+        results[name] = row
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Payload size and CPU of cacheable GETs vs. the POST routes")
+    parser.add_argument("--mandis", type=int, default=1000, help="mandis pricing the benchmark crop")
+    parser.add_argument("--schemes", type=int, default=40, help="schemes the benchmark user is eligible for")
+    parser.add_argument("--requests", type=int, default=300, help="per variant")
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix="kisan_bench_")
+    # app.models.database reads DATABASE_URL at import, which happens inside seed()
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmpdir, 'payload.db')}"
+    try:
+        seed(args.mandis, args.schemes)
+        results = asyncio.run(run(args))
+    finally:
+        for name in os.listdir(tmpdir):
+            os.remove(os.path.join(tmpdir, name))
+        os.rmdir(tmpdir)
+    print(json.dumps({"mandis": args.mandis, "schemes": args.schemes, **results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,407 @@
+# benchmarks/load_suite.py
+# End-to-end load suite: every router in app/main.py, served by one uvicorn worker against a seeded
+# throwaway database, with the CNN replaced by a fake model of the same input/output shape.
+#
+#   python benchmarks/load_suite.py --scale small --out results.json            (from kisan_backend/)
+#   python benchmarks/load_suite.py --scale medium --compare results.json       (exit 1 on regressions)
+#   python benchmarks/load_suite.py --database-url postgresql://localhost/kisan_bench --reset
+#
+# Each endpoint is loaded on its own for --duration seconds at --concurrency, then all of them
+# together in a weighted "mixed" run. Output is JSON with p50/p95/p99 latency and throughput per
+# endpoint; --compare flags endpoints whose p95 rose or throughput fell by more than --tolerance.
+# Firebase is never called: the server accepts "bench-<uid>" ID tokens. The SSE stream has its own
+# benchmark (sse_connections.py). --database-url must point at a disposable database.
+import argparse
+import asyncio
+import datetime
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+import numpy as np
+from PIL import Image
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SECRET_KEY = "load-suite-secret"
+
+SCALES = {
+    "small": dict(users=1_000, crops=50, mandis=500, notifications_per_user=20, help_per_user=5, schemes=30, alerts=2_000),
+    "medium": dict(users=20_000, crops=150, mandis=2_000, notifications_per_user=50, help_per_user=20, schemes=100, alerts=50_000),
+    "large": dict(users=200_000, crops=300, mandis=7_000, notifications_per_user=100, help_per_user=40, schemes=300, alerts=500_000),
+}
+
+STATES = ["Karnataka", "Punjab", "Maharashtra", "Tamil Nadu", "Uttar Pradesh", "Bihar"]
+HELP_WORDS = "tomato paddy ragi wheat leaf curl blight wilt aphid spray neem urea price mandi loan subsidy insurance soil rain".split()
+
+
+class FakeModel:
+    """Stands in for the CNN: same (N, 224, 224, 3) float32 input, one probability row per image."""
+
+    def __init__(self, classes, base_ms=0.0, per_image_ms=0.0):
+        self.classes = classes
+        self.base_ms = base_ms
+        self.per_image_ms = per_image_ms
+
+    def predict(self, batch):
+        if batch.ndim != 4 or batch.shape[1:] != (224, 224, 3):
+            raise ValueError(f"Unexpected batch shape {batch.shape}")
+        delay = (self.base_ms + self.per_image_ms * len(batch)) / 1000.0
+        if delay:
+            time.sleep(delay)
+        # Deterministic per image, from its mean pixel value
+        logits = np.outer(batch.reshape(len(batch), -1).mean(axis=1), np.arange(1, self.classes + 1))
+        exp = np.exp(logits - logits.max(axis=1, keepdims=True))
+        return exp / exp.sum(axis=1, keepdims=True)
+
+
+def seed(sizes, rng_seed=1):
+    """Fill the database named by DATABASE_URL; returns the ids and names the load generator needs."""
+    from sqlalchemy import insert
+
+    from app.models.database import engine
+    from app.models.eligibility import rebuild_all
+    from app.models.mandi_geo import upsert_mandi_locations
+    from app.models.migrations import upgrade_schema
+    from app.models.models import (
+        Base, HelpHistory, MarketPrice, Notification, PriceAlert, Scheme, User, normalize_key,
+    )
+
+    Base.metadata.create_all(engine)
+    upgrade_schema(engine, Base.metadata)
+    rng = random.Random(rng_seed)
+    crops = [f"crop {i}" for i in range(sizes["crops"])]
+    mandis = [f"mandi {i}" for i in range(sizes["mandis"])]
+    today = datetime.date.today()
+    started = time.perf_counter()
+    with engine.begin() as conn:
+        conn.execute(insert(User), [
+            {"id": i, "phone": f"+91{i:010d}", "name": f"farmer {i}", "firebase_uid": f"bench-{i}",
+             "state": rng.choice(STATES), "district": f"district {rng.randrange(200)}",
+             "village": f"village {rng.randrange(20000)}", "land_size": round(rng.uniform(0.5, 10), 1),
+             "crops": ", ".join(rng.sample(crops, 2)), "language": "kn"}
+            for i in range(1, sizes["users"] + 1)
+        ])
+        upsert_mandi_locations(conn, [
+            {"mandi": m, "latitude": rng.uniform(8.0, 37.0), "longitude": rng.uniform(68.0, 97.0)} for m in mandis
+        ])
+        # Each crop trades at a random fifth of the mandis
+        prices = []
+        for crop in crops:
+            for mandi in rng.sample(mandis, max(1, len(mandis) // 5)):
+                prices.append({"crop": crop, "mandi": mandi, "crop_key": normalize_key(crop), "mandi_key": normalize_key(mandi),
+                               "price": round(rng.uniform(500, 5000), 2), "trend": rng.choice(("up", "down", "stable")),
+                               "price_date": today})
+        for i in range(0, len(prices), 20_000):
+            conn.execute(insert(MarketPrice), prices[i:i + 20_000])
+        conn.execute(insert(Scheme), [
+            {"name": f"scheme {i}", "benefits": "Rs 6,000 per year",
+             "eligibility_criteria": json.dumps({"state": rng.choice(STATES), "land_size": {"max": rng.choice((2, 5, 10))}})}
+            for i in range(sizes["schemes"])
+        ])
+        conn.execute(insert(PriceAlert), [
+            {"user_id": rng.randint(1, sizes["users"]), "crop": c, "crop_key": normalize_key(c), "mandi": None, "mandi_key": None,
+             "direction": rng.choice(("above", "below")), "threshold": round(rng.uniform(500, 5000)), "active": True}
+            for c in (rng.choice(crops) for _ in range(sizes["alerts"]))
+        ])
+        for table, per_user, make in (
+            (Notification, sizes["notifications_per_user"], lambda u: {
+                "user_id": u, "type": "price_alert", "content": "crop 1 at mandi 2 has risen above Rs 2,000",
+                "read_flag": rng.random() < 0.7}),
+            (HelpHistory, sizes["help_per_user"], lambda u: {
+                "user_id": u, "query": " ".join(rng.choices(HELP_WORDS, k=5)), "result": " ".join(rng.choices(HELP_WORDS, k=30))}),
+        ):
+            rows = []
+            for user in range(1, sizes["users"] + 1):
+                rows += [make(user) for _ in range(per_user)]
+                if len(rows) >= 50_000:
+                    conn.execute(insert(table), rows)
+                    rows = []
+            if rows:
+                conn.execute(insert(table), rows)
+        rebuild_all(conn)
+    return {"crops": crops, "mandis": mandis, "seed_s": round(time.perf_counter() - started, 1)}
+
+
+def make_images(n, rng_seed=2):
+    rng = np.random.default_rng(rng_seed)
+    images = []
+    for _ in range(n):
+        buf = io.BytesIO()
+        Image.fromarray(rng.integers(0, 256, size=(480, 640, 3), dtype=np.uint8)).save(buf, format="JPEG", quality=85)
+        images.append(buf.getvalue())
+    return images
+
+
+def scenarios(world, images):
+    """name -> (weight in the mixed run, request factory(rng) -> httpx request kwargs)."""
+    from jose import jwt
+
+    tokens = {}
+    per_user = max(world["notifications_per_user"], 1)
+
+    def auth(user):
+        if user not in tokens:
+            claims = {"sub": str(user), "exp": int(time.time()) + 24 * 3600}
+            tokens[user] = {"Authorization": f"Bearer {jwt.encode(claims, SECRET_KEY, algorithm='HS256')}"}
+        return tokens[user]
+
+    def user(rng):
+        return rng.randint(1, world["users"])
+
+    def crop(rng):
+        return rng.choice(world["crops"])
+
+    def image(rng):
+        return rng.choice(images)
+
+    return {
+        "healthz": (1, lambda rng: {"method": "GET", "url": "/healthz"}),
+        "readyz": (1, lambda rng: {"method": "GET", "url": "/readyz"}),
+        "login": (2, lambda rng: {"method": "POST", "url": "/auth/login", "headers": {"Authorization": f"Bearer bench-{user(rng)}"}}),
+        "profile": (5, lambda rng: {"method": "GET", "url": "/user/profile", "headers": auth(user(rng))}),
+        "profile_update": (1, lambda rng: (lambda u: {"method": "PUT", "url": "/user/profile/update", "headers": auth(u),
+                                                      "json": {"language": rng.choice(("kn", "hi", "ta"))}})(user(rng))),
+        "market": (20, lambda rng: {"method": "POST", "url": "/market", "json": {"crop": crop(rng)}}),
+        "market_get": (10, lambda rng: {"method": "GET", "url": "/market", "params": {"crop": crop(rng)}}),
+        "market_mandi": (5, lambda rng: {"method": "POST", "url": "/market",
+                                         "json": {"crop": crop(rng), "mandi": rng.choice(world["mandis"])}}),
+        "market_nearest": (10, lambda rng: {"method": "POST", "url": "/market/nearest", "json": {
+            "crop": crop(rng), "latitude": rng.uniform(8.0, 37.0), "longitude": rng.uniform(68.0, 97.0), "k": 5}}),
+        "predict": (5, lambda rng: {"method": "POST", "url": "/predict", "files": {"image": ("leaf.jpg", image(rng), "image/jpeg")}}),
+        "predict_batch": (1, lambda rng: {"method": "POST", "url": "/predict/batch",
+                                          "files": [("images", (f"{i}.jpg", image(rng), "image/jpeg")) for i in range(8)]}),
+        "schemes_eligible": (8, lambda rng: {"method": "POST", "url": "/schemes/eligible", "json": {"user_id": user(rng)}}),
+        "schemes_eligible_get": (4, lambda rng: {"method": "GET", "url": "/schemes/eligible", "params": {"user_id": user(rng)}}),
+        "schemes_apply": (1, lambda rng: {"method": "POST", "url": "/schemes/apply", "json": {"user_id": user(rng), "scheme_id": 1}}),
+        "notifications": (15, lambda rng: {"method": "POST", "url": "/notifications", "json": {"user_id": user(rng), "limit": 20}}),
+        "notifications_get": (5, lambda rng: {"method": "GET", "url": "/notifications", "params": {"user_id": user(rng), "limit": 20}}),
+        "unread_count": (15, lambda rng: {"method": "POST", "url": "/notifications/unread_count", "json": {"user_id": user(rng)}}),
+        # Seeded notification ids run consecutively per user
+        "mark_read": (2, lambda rng: (lambda u: {"method": "POST", "url": "/notifications/mark_read", "json": {
+            "user_id": u, "notification_ids": [(u - 1) * per_user + rng.randint(1, per_user)]}})(user(rng))),
+        "mark_all_read": (2, lambda rng: {"method": "POST", "url": "/notifications/mark_all_read", "json": {"user_id": user(rng)}}),
+        "alerts_create": (1, lambda rng: {"method": "POST", "url": "/alerts", "json": {
+            "user_id": user(rng), "crop": crop(rng), "direction": "above", "threshold": rng.randint(500, 5000)}}),
+        "alerts_list": (3, lambda rng: {"method": "POST", "url": "/alerts/list", "json": {"user_id": user(rng)}}),
+        "help_history": (3, lambda rng: {"method": "POST", "url": "/help/history", "json": {"user_id": user(rng)}}),
+        "help_search": (3, lambda rng: {"method": "POST", "url": "/help/search",
+                                        "json": {"user_id": user(rng), "q": " ".join(rng.sample(HELP_WORDS, 2))}}),
+        "voice_agent": (5, lambda rng: {"method": "POST", "url": "/voice-agent", "json": {"user_id": user(rng), "intents": [
+            {"intent": "market", "parameters": {"crop": crop(rng)}}, {"intent": "schemes", "parameters": {}}]}}),
+        "metrics": (0, lambda rng: {"method": "GET", "url": "/metrics"}),
+    }
+
+
+def summarize(latencies, errors, elapsed, statuses):
+    arr = np.array(latencies) if latencies else np.array([0.0])
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "status_codes": dict(sorted(statuses.items())),
+        "req_per_s": round(len(latencies) / elapsed, 1) if elapsed > 0 else 0.0,
+        "p50_ms": round(float(np.percentile(arr, 50)), 2),
+        "p95_ms": round(float(np.percentile(arr, 95)), 2),
+        "p99_ms": round(float(np.percentile(arr, 99)), 2),
+        "max_ms": round(float(arr.max()), 2),
+    }
+
+
+async def load(client, factories, concurrency, duration, seed):
+    """Closed-loop load: each worker sends its next request as soon as the previous one returns."""
+    latencies, statuses = [], {}
+    errors = 0
+    deadline = time.perf_counter() + duration
+    names = list(factories)
+    weights = [factories[n][0] for n in names]
+
+    async def worker(i):
+        nonlocal errors
+        rng = random.Random(seed * 1000 + i)
+        while time.perf_counter() < deadline:
+            name = rng.choices(names, weights=weights)[0] if len(names) > 1 else names[0]
+            request = factories[name][1](rng)
+            started = time.perf_counter()
+            try:
+                resp = await client.request(**request)
+            except httpx.HTTPError:
+                errors += 1
+                continue
+            statuses[resp.status_code] = statuses.get(resp.status_code, 0) + 1
+            if resp.status_code < 400:
+                latencies.append((time.perf_counter() - started) * 1000.0)
+            else:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    return summarize(latencies, errors, time.perf_counter() - started, statuses)
+
+
+async def run_load(args, base_url, world):
+    all_scenarios = scenarios(world, make_images(args.images))
+    selected = args.only or list(all_scenarios)
+    unknown = set(selected) - set(all_scenarios)
+    if unknown:
+        raise SystemExit(f"unknown endpoints {sorted(unknown)}; choose from {sorted(all_scenarios)}")
+    limits = httpx.Limits(max_connections=args.concurrency)
+    results = {}
+    async with httpx.AsyncClient(base_url=base_url, timeout=60.0, limits=limits) as client:
+        for n, name in enumerate(selected):
+            factories = {name: all_scenarios[name]}
+            await load(client, factories, args.concurrency, args.warmup, seed=n)
+            results[name] = await load(client, factories, args.concurrency, args.duration, seed=n)
+        if not args.only:
+            mixed = {name: s for name, s in all_scenarios.items() if s[0] > 0}
+            results["mixed"] = await load(client, mixed, args.concurrency, args.duration * 3, seed=len(selected))
+    return results
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for name, current in results.items():
+        before = baseline.get("endpoints", {}).get(name)
+        if not before:
+            continue
+        if before["p95_ms"] > 0 and current["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            regressions.append({"endpoint": name, "metric": "p95_ms", "before": before["p95_ms"], "after": current["p95_ms"]})
+        if before["req_per_s"] > 0 and current["req_per_s"] < before["req_per_s"] * (1 - tolerance):
+            regressions.append({"endpoint": name, "metric": "req_per_s", "before": before["req_per_s"], "after": current["req_per_s"]})
+    return regressions
+
+
+def serve(args):
+    # Runs in the server subprocess: the real app, with Firebase and the CNN faked
+    import firebase_admin
+    firebase_admin._apps.setdefault("[DEFAULT]", None)  # skip credential loading in auth_utils
+
+    import uvicorn
+    from app.main import app
+    from app.models import diagnosis_ml
+    from app.routes import login_routes
+
+    def verify_bench_token(token):
+        if not token.startswith("bench-"):
+            raise ValueError("not a load-suite token")
+        return {"uid": token, "phone_number": f"+91{int(token[6:]):010d}"}
+
+    login_routes.verify_firebase_token = verify_bench_token
+    diagnosis_ml.model = FakeModel(len(diagnosis_ml.CLASS_NAMES), args.fake_model_ms, args.fake_model_per_image_ms)
+    diagnosis_ml._state.update(status="ready", load_s=0.0, warmup_s=0.0)
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load every API route against a seeded database")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small")
+    for name in SCALES["small"]:
+        parser.add_argument(f"--{name.replace('_', '-')}", type=int, help=f"override the scale's {name}")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per endpoint (the mixed run takes 3x)")
+    parser.add_argument("--warmup", type=float, default=1.0)
+    parser.add_argument("--only", nargs="*", help="endpoints to run (default: all, plus the mixed run)")
+    parser.add_argument("--images", type=int, default=32, help="distinct photos sent to /predict (fewer = more cache hits)")
+    parser.add_argument("--fake-model-ms", type=float, default=20.0, help="simulated cost of one forward pass")
+    parser.add_argument("--fake-model-per-image-ms", type=float, default=2.0)
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--database-url", help="defaults to a temporary SQLite file")
+    parser.add_argument("--reset", action="store_true", help="drop all tables in --database-url first")
+    parser.add_argument("--out", help="also write the JSON report here")
+    parser.add_argument("--compare", help="earlier report; exit 1 if any endpoint regressed")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed p95 rise / throughput drop for --compare")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args)
+        return
+
+    sizes = {k: getattr(args, k) if getattr(args, k) is not None else v for k, v in SCALES[args.scale].items()}
+    tmpdir = None
+    url = args.database_url
+    if not url:
+        tmpdir = tempfile.mkdtemp(prefix="kisan_bench_")
+        url = f"sqlite:///{os.path.join(tmpdir, 'bench.db')}"
+    # /predict files every photo in the upload store; keep them out of the repo's static/uploads
+    upload_dir = tempfile.mkdtemp(prefix="kisan_bench_uploads_")
+    # app.models.database reads these at import, here (seed) and in the server
+    os.environ.update({"DATABASE_URL": url, "SECRET_KEY": SECRET_KEY, "ALERTS_ENABLED": "0", "UPLOAD_DIR": upload_dir})
+    if args.reset:
+        from app.models.database import engine
+        from app.models.models import Base
+        Base.metadata.drop_all(engine)
+    world = seed(sizes)
+    world.update(users=sizes["users"], notifications_per_user=sizes["notifications_per_user"])
+
+    server = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), "--serve", "--port", str(args.port),
+         "--fake-model-ms", str(args.fake_model_ms), "--fake-model-per-image-ms", str(args.fake_model_per_image_ms)],
+        cwd=ROOT,
+    )
+    base_url = f"http://127.0.0.1:{args.port}"
+    try:
+        for _ in range(150):
+            try:
+                if httpx.get(f"{base_url}/healthz").status_code == 200:
+                    break
+            except httpx.HTTPError:
+                pass
+            if server.poll() is not None:
+                raise SystemExit("server exited during startup")
+            time.sleep(0.2)
+        results = asyncio.run(run_load(args, base_url, world))
+    finally:
+        server.terminate()
+        server.wait()
+
+    report = {
+        "meta": {
+            "git": git_revision(),
+            "python": platform.python_version(),
+            "database": url.split("://")[0],
+            "scale": args.scale,
+            "sizes": sizes,
+            "seed_s": world["seed_s"],
+            "concurrency": args.concurrency,
+            "duration_s": args.duration,
+            "fake_model_ms": [args.fake_model_ms, args.fake_model_per_image_ms],
+        },
+        "endpoints": results,
+    }
+    exit_code = 0
+    if args.compare:
+        with open(args.compare) as f:
+            report["regressions"] = compare(results, json.load(f), args.tolerance)
+        exit_code = 1 if report["regressions"] else 0
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+
+    if tmpdir:
+        for name in os.listdir(tmpdir):
+            os.remove(os.path.join(tmpdir, name))
+        os.rmdir(tmpdir)
+    shutil.rmtree(upload_dir)
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
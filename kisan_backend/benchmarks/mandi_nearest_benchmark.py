@@ -0,0 +1,87 @@
+# benchmarks/mandi_nearest_benchmark.py
+# k-nearest mandi lookup: the grid index used by /market/nearest vs. scanning every mandi.
+#
+#   python benchmarks/mandi_nearest_benchmark.py --mandis 7000 --k 5
+#
+# Places --mandis random mandis inside India's bounding box (the whole country's APMC count is
+# ~7,000), checks that the grid returns exactly the brute-force answer, and prints per-query
+# latency percentiles (microseconds) as JSON. Pure in-memory; no database needed.
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.mandi_geo import GridIndex, haversine_km  # noqa: E402
+
+LAT_RANGE, LON_RANGE = (8.0, 37.0), (68.0, 97.0)
+
+
+def brute_force(points, lat, lon, k, max_km=None):
+    scored = [(haversine_km(lat, lon, plat, plon), item) for plat, plon, item in points]
+    if max_km is not None:
+        scored = [s for s in scored if s[0] <= max_km]
+    scored.sort(key=lambda s: s[0])
+    return scored[:k]
+
+
+def percentiles_us(latencies):
+    arr = np.array(latencies) * 1e6
+    return {
+        "p50_us": round(float(np.percentile(arr, 50)), 1),
+        "p95_us": round(float(np.percentile(arr, 95)), 1),
+        "p99_us": round(float(np.percentile(arr, 99)), 1),
+    }
+
+
+def timed(fn, queries):
+    latencies = []
+    for q in queries:
+        started = time.perf_counter()
+        fn(*q)
+        latencies.append(time.perf_counter() - started)
+    return percentiles_us(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Grid vs. brute-force k-nearest mandis")
+    parser.add_argument("--mandis", type=int, default=7000)
+    parser.add_argument("--queries", type=int, default=5000)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--max-km", type=float, default=None)
+    parser.add_argument("--grid-deg", type=float, default=0.5)
+    args = parser.parse_args()
+
+    rng = random.Random(3)
+    points = [(rng.uniform(*LAT_RANGE), rng.uniform(*LON_RANGE), i) for i in range(args.mandis)]
+    started = time.perf_counter()
+    index = GridIndex(points, cell_deg=args.grid_deg)
+    build_ms = (time.perf_counter() - started) * 1000.0
+    queries = [(rng.uniform(*LAT_RANGE), rng.uniform(*LON_RANGE), args.k, args.max_km) for _ in range(args.queries)]
+
+    mismatches = 0
+    for q in queries[:500]:
+        expected = [item for _, item in brute_force(points, *q)]
+        if [item for _, item in index.nearest(*q)] != expected:
+            mismatches += 1
+
+    print(json.dumps({
+        "mandis": args.mandis,
+        "k": args.k,
+        "max_km": args.max_km,
+        "grid_deg": args.grid_deg,
+        "build_ms": round(build_ms, 2),
+        "checked_against_brute_force": min(500, len(queries)),
+        "mismatches": mismatches,
+        "grid": timed(index.nearest, queries),
+        "brute_force": timed(lambda *q: brute_force(points, *q), queries[:max(len(queries) // 20, 50)]),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
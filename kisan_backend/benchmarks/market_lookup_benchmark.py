@@ -0,0 +1,121 @@
+# benchmarks/market_lookup_benchmark.py
+# /market lookup latency on a large market_prices table: the old ilike scan vs. the
+# normalized-key index vs. the read-through cache.
+#
+#   python benchmarks/market_lookup_benchmark.py --rows 1000000
+#
+# Seeds a throwaway SQLite file (or --database-url) and prints JSON with p50/p95 per strategy.
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.models import Base, MarketPrice, normalize_key  # noqa: E402
+from app.routes import market_routes  # noqa: E402
+
+
+def seed(engine, rows, crops, mandis, chunk=50_000):
+    rng = random.Random(42)
+    trends = ["up", "down", "stable"]
+    with engine.begin() as conn:
+        for start in range(0, rows, chunk):
+            batch = []
+            for _ in range(min(chunk, rows - start)):
+                crop, mandi = rng.choice(crops), rng.choice(mandis)
+                batch.append({
+                    "crop": crop, "mandi": mandi, "crop_key": normalize_key(crop), "mandi_key": normalize_key(mandi),
+                    "price": round(rng.uniform(500, 9000), 2), "trend": rng.choice(trends),
+                })
+            conn.execute(insert(MarketPrice), batch)
+
+
+def timed(fn, queries, repeats=1):
+    samples = []
+    for _ in range(repeats):
+        for crop, mandi in queries:
+            start = time.perf_counter()
+            fn(crop, mandi)
+            samples.append((time.perf_counter() - start) * 1000.0)
+    arr = np.array(samples)
+    return {
+        "queries": len(samples),
+        "p50_ms": round(float(np.percentile(arr, 50)), 4),
+        "p95_ms": round(float(np.percentile(arr, 95)), 4),
+        "mean_ms": round(float(arr.mean()), 4),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="market_prices lookup latency before/after indexing and caching")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--crops", type=int, default=300)
+    parser.add_argument("--mandis", type=int, default=3000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--scan-queries", type=int, default=20, help="the ilike scan is slow; sample fewer")
+    parser.add_argument("--database-url", help="defaults to a temporary SQLite file")
+    args = parser.parse_args()
+
+    tmpdir = None
+    url = args.database_url
+    if not url:
+        tmpdir = tempfile.mkdtemp(prefix="kisan_bench_")
+        url = f"sqlite:///{os.path.join(tmpdir, 'market.db')}"
+    engine = create_engine(url)
+    Base.metadata.drop_all(engine, tables=[MarketPrice.__table__])
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+
+    crops = [f"Crop {i}" for i in range(args.crops)]
+    mandis = [f"Mandi {i}" for i in range(args.mandis)]
+    started = time.perf_counter()
+    seed(engine, args.rows, crops, mandis)
+    seed_s = time.perf_counter() - started
+
+    rng = random.Random(7)
+    # Mixed-case input, as typed/spoken by users
+    pair_queries = [(rng.choice(crops).upper(), rng.choice(mandis).lower()) for _ in range(args.queries)]
+    crop_queries = [(rng.choice(crops).lower(), None) for _ in range(args.queries)]
+
+    db = Session()
+
+    def ilike_scan(crop, mandi):
+        query = db.query(MarketPrice).filter(MarketPrice.crop.ilike(crop))
+        if mandi:
+            query = query.filter(MarketPrice.mandi.ilike(mandi))
+        return query.all()
+
+    def indexed(crop, mandi):
+        market_routes.invalidate_market_cache()
+        return market_routes.lookup_market_prices(db, crop, mandi)
+
+    def cached(crop, mandi):
+        return market_routes.lookup_market_prices(db, crop, mandi)
+
+    results = {"rows": args.rows, "seed_s": round(seed_s, 2)}
+    for name, queries in (("crop_and_mandi", pair_queries), ("crop_only", crop_queries)):
+        results[name] = {
+            "before_ilike_scan": timed(ilike_scan, queries[:args.scan_queries]),
+            "after_indexed": timed(indexed, queries),
+        }
+        for crop, mandi in queries:
+            cached(crop, mandi)  # fill the cache
+        results[name]["after_cached"] = timed(cached, queries, repeats=5)
+    db.close()
+    print(json.dumps(results, indent=2))
+
+    if tmpdir:
+        os.remove(os.path.join(tmpdir, "market.db"))
+        os.rmdir(tmpdir)
+
+
+if __name__ == "__main__":
+    main()
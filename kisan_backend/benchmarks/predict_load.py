@@ -0,0 +1,108 @@
+# benchmarks/predict_load.py
+# Saturates /predict while probing /market, to check that diagnoses don't stall the rest of the API.
+#
+#   uvicorn app.main:app --port 8000          (in another shell, from kisan_backend/)
+#   python benchmarks/predict_load.py --base-url http://127.0.0.1:8000 --predict-concurrency 32
+#
+# /market latency is measured twice: once idle (baseline) and once with /predict saturated.
+# With predictions running on the event loop the loaded p95 jumps to roughly one predict call;
+# with the executor path it should stay close to the baseline.
+import argparse
+import asyncio
+import io
+import json
+import time
+
+import httpx
+import numpy as np
+from PIL import Image
+
+
+def make_jpeg(size=(640, 480), seed=0):
+    rng = np.random.default_rng(seed)
+    pixels = rng.integers(0, 256, size=(size[1], size[0], 3), dtype=np.uint8)
+    buf = io.BytesIO()
+    Image.fromarray(pixels).save(buf, format="JPEG", quality=85)
+    return buf.getvalue()
+
+
+def summarize(samples):
+    if not samples:
+        return {"count": 0}
+    arr = np.array(samples)
+    return {
+        "count": len(samples),
+        "p50_ms": round(float(np.percentile(arr, 50)), 2),
+        "p95_ms": round(float(np.percentile(arr, 95)), 2),
+        "p99_ms": round(float(np.percentile(arr, 99)), 2),
+        "max_ms": round(float(arr.max()), 2),
+    }
+
+
+async def probe_market(client, crop, duration, interval):
+    samples = []
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        resp = await client.post("/market", json={"crop": crop})
+        resp.raise_for_status()
+        samples.append((time.perf_counter() - start) * 1000.0)
+        await asyncio.sleep(interval)
+    return samples
+
+
+async def hammer_predict(client, image_bytes, stop, counters):
+    while not stop.is_set():
+        start = time.perf_counter()
+        resp = await client.post("/predict", files={"image": ("leaf.jpg", image_bytes, "image/jpeg")})
+        if resp.status_code == 200:
+            counters["ok"] += 1
+            counters["latency"].append((time.perf_counter() - start) * 1000.0)
+        else:
+            counters["failed"] += 1
+
+
+async def run(args):
+    image_bytes = make_jpeg()
+    limits = httpx.Limits(max_connections=args.predict_concurrency + 4)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=60.0, limits=limits) as client:
+        baseline = await probe_market(client, args.crop, args.duration, args.interval)
+
+        stop = asyncio.Event()
+        counters = {"ok": 0, "failed": 0, "latency": []}
+        workers = [
+            asyncio.create_task(hammer_predict(client, image_bytes, stop, counters))
+            for _ in range(args.predict_concurrency)
+        ]
+        await asyncio.sleep(args.warmup)
+        started = time.perf_counter()
+        loaded = await probe_market(client, args.crop, args.duration, args.interval)
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+    return {
+        "market_idle": summarize(baseline),
+        "market_under_predict_load": summarize(loaded),
+        "predict": {
+            **summarize(counters["latency"]),
+            "failed": counters["failed"],
+            "throughput_rps": round(counters["ok"] / max(elapsed + args.warmup, 1e-9), 2),
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="/market latency while /predict is saturated")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--crop", default="tomato")
+    parser.add_argument("--predict-concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per /market probe phase")
+    parser.add_argument("--interval", type=float, default=0.05, help="pause between /market probes")
+    parser.add_argument("--warmup", type=float, default=2.0, help="seconds of /predict load before probing")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+# benchmarks/price_stats_benchmark.py
+# Rolling price aggregates: the incremental refresh ingest runs for the keys it touched vs. the
+# full backfill over all history.
+#
+#   python benchmarks/price_stats_benchmark.py --keys 5000 --days 120 --gap-share 0.2
+#
+# Seeds --days of price history per crop/mandi on a throwaway SQLite file (or --database-url),
+# with --gap-share of the keys going quiet so their new quote lands 45 days after the previous
+# one. Ingests that last day through refresh_stats, checks every key's PriceStats against what
+# backfill_stats computes from the full history, and prints timings and mismatches as JSON.
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+from sqlalchemy import create_engine, insert, select
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.models import Base, PriceHistory, PriceStats  # noqa: E402
+from app.models.price_history import backfill_stats, record_history, refresh_stats  # noqa: E402
+
+GAP_DAYS = 45
+
+
+def seed(engine, keys, days, gap_keys, start, chunk=50_000):
+    # Everything before the ingested day; gap keys stop GAP_DAYS before it
+    rng = random.Random(11)
+    rows = []
+    with engine.begin() as conn:
+        for crop_key, mandi_key in keys:
+            last_day = days - 1 - (GAP_DAYS if (crop_key, mandi_key) in gap_keys else 1)
+            price = rng.uniform(800, 6000)
+            for d in range(last_day + 1):
+                if rng.random() < 0.3:
+                    continue  # mandis don't report every day
+                price = max(100.0, price * rng.uniform(0.95, 1.05))
+                rows.append({"crop_key": crop_key, "mandi_key": mandi_key,
+                             "price_date": start + timedelta(days=d), "price": round(price, 2)})
+                if len(rows) >= chunk:
+                    conn.execute(insert(PriceHistory), rows)
+                    rows = []
+        if rows:
+            conn.execute(insert(PriceHistory), rows)
+
+
+def snapshot(engine):
+    columns = [c for c in PriceStats.__table__.columns]
+    with engine.connect() as conn:
+        return {(r.crop_key, r.mandi_key): tuple(r) for r in conn.execute(select(*columns))}
+
+
+def same_stats(a, b):
+    # Means are summed in a different order over a shorter fetch, so the 4th decimal can differ
+    if a is None or b is None:
+        return a is b
+    return all(
+        math.isclose(x, y, abs_tol=1e-3) if isinstance(x, float) and isinstance(y, float) else x == y
+        for x, y in zip(a, b)
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Incremental price stats vs. a full backfill")
+    parser.add_argument("--keys", type=int, default=5000, help="crop/mandi pairs")
+    parser.add_argument("--days", type=int, default=120)
+    parser.add_argument("--gap-share", type=float, default=0.2, help=f"share of keys quoted {GAP_DAYS} days after their previous quote")
+    parser.add_argument("--database-url", help="defaults to a temporary SQLite file")
+    args = parser.parse_args()
+    if args.days <= GAP_DAYS:
+        parser.error(f"--days must be more than {GAP_DAYS}")
+
+    tmpdir = None
+    url = args.database_url
+    if not url:
+        tmpdir = tempfile.mkdtemp(prefix="kisan_bench_")
+        url = f"sqlite:///{os.path.join(tmpdir, 'bench.db')}"
+    engine = create_engine(url)
+    try:
+        Base.metadata.create_all(engine)
+        rng = random.Random(5)
+        keys = [(f"crop{i % 300}", f"mandi{i}") for i in range(args.keys)]
+        gap_keys = set(rng.sample(keys, int(len(keys) * args.gap_share)))
+        start = date(2024, 1, 1)
+        seed(engine, keys, args.days, gap_keys, start)
+
+        today = start + timedelta(days=args.days - 1)
+        day = [{"crop_key": c, "mandi_key": m, "price_date": today, "price": round(rng.uniform(800, 6000), 2)} for c, m in keys]
+        started = time.perf_counter()
+        with engine.begin() as conn:
+            record_history(conn, day)
+            refresh_stats(conn, keys, today)
+        incremental_s = time.perf_counter() - started
+        incremental = snapshot(engine)
+
+        backfill = backfill_stats(engine)
+        full = snapshot(engine)
+
+        mismatched = [k for k in keys if not same_stats(incremental.get(k), full.get(k))]
+        print(json.dumps({
+            "keys": args.keys,
+            "days": args.days,
+            "gap_keys": len(gap_keys),
+            "incremental_refresh_s": round(incremental_s, 3),
+            "backfill": backfill,
+            "mismatches": len(mismatched),
+            "gap_key_mismatches": sum(1 for k in mismatched if k in gap_keys),
+        }, indent=2))
+        if mismatched:
+            sys.exit(1)
+    finally:
+        engine.dispose()
+        if tmpdir:
+            for name in os.listdir(tmpdir):
+                os.remove(os.path.join(tmpdir, name))
+            os.rmdir(tmpdir)
+
+
+if __name__ == "__main__":
+    main()
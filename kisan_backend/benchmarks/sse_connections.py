@@ -0,0 +1,184 @@
+# benchmarks/sse_connections.py
+# How many idle /notifications/stream connections one worker holds, and what they cost.
+#
+#   uvicorn app.main:app --port 8000          (in another shell, from kisan_backend/; one worker)
+#   python benchmarks/sse_connections.py --connections 5000 --server-pid <uvicorn pid>
+#
+# Opens the streams with raw sockets (a client library per connection would be the bottleneck),
+# holds them for --hold seconds and counts heartbeats, then reports server-side connections from
+# /notifications/stream/stats and, with --server-pid, the worker's RSS per connection.
+# With --database-url, inserts one notification per sampled user and times its delivery.
+# Raise the open-file limit on both sides first (ulimit -n).
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from urllib.parse import urlsplit
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def rss_kb(pid):
+    if not pid:
+        return None
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return None
+
+
+async def http_get_json(host, port, path):
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n".encode())
+    await writer.drain()
+    raw = await reader.read()
+    writer.close()
+    return json.loads(raw.split(b"\r\n\r\n", 1)[1])
+
+
+class Stream:
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.connected = False
+        self.connect_ms = None
+        self.heartbeats = 0
+        self.received = {}  # notification id -> perf_counter at arrival
+        self.error = None
+
+    async def run(self, host, port, stop):
+        started = time.perf_counter()
+        try:
+            reader, writer = await asyncio.open_connection(host, port)
+            writer.write(
+                f"GET /notifications/stream?user_id={self.user_id} HTTP/1.1\r\nHost: {host}\r\n"
+                f"Accept: text/event-stream\r\n\r\n".encode()
+            )
+            await writer.drain()
+            status = await reader.readline()
+            if b" 200 " not in status:
+                raise RuntimeError(status.decode().strip())
+            self.connected = True
+            self.connect_ms = (time.perf_counter() - started) * 1000.0
+            stopped = asyncio.ensure_future(stop.wait())
+            try:
+                while True:
+                    read = asyncio.ensure_future(reader.readline())
+                    await asyncio.wait({read, stopped}, return_when=asyncio.FIRST_COMPLETED)
+                    if not read.done():
+                        read.cancel()
+                        break
+                    line = read.result()
+                    if not line:
+                        raise RuntimeError("server closed the stream")
+                    if line.startswith(b": ping"):
+                        self.heartbeats += 1
+                    elif line.startswith(b"id: "):
+                        self.received[int(line[4:])] = time.perf_counter()
+            finally:
+                stopped.cancel()
+                writer.close()
+        except Exception as e:
+            self.error = repr(e)
+
+
+def insert_notifications(database_url, user_ids):
+    from sqlalchemy import create_engine, insert
+    from app.models.models import Notification
+
+    engine = create_engine(database_url)
+    with engine.begin() as conn:
+        result = conn.execute(
+            insert(Notification).returning(Notification.id, Notification.user_id),
+            [{"user_id": u, "type": "benchmark", "content": "ping", "read_flag": False} for u in user_ids],
+        )
+        rows = result.all()
+    engine.dispose()
+    return rows
+
+
+async def run(args):
+    url = urlsplit(args.base_url)
+    host, port = url.hostname, url.port or 80
+    baseline_rss = rss_kb(args.server_pid)
+
+    stop = asyncio.Event()
+    streams = [Stream(args.first_user_id + i) for i in range(args.connections)]
+    tasks = []
+    started = time.perf_counter()
+    for i in range(0, len(streams), args.ramp_batch):
+        tasks += [asyncio.create_task(s.run(host, port, stop)) for s in streams[i:i + args.ramp_batch]]
+        await asyncio.sleep(0.05)
+    while time.perf_counter() - started < args.connect_timeout and sum(s.connected or bool(s.error) for s in streams) < len(streams):
+        await asyncio.sleep(0.2)
+    ramp_s = time.perf_counter() - started
+
+    server_stats = await http_get_json(host, port, "/notifications/stream/stats")
+    loaded_rss = rss_kb(args.server_pid)
+
+    delivery = None
+    if args.database_url:
+        sample = [s for s in streams if s.connected][:args.deliver_sample]
+        by_user = {s.user_id: s for s in sample}
+        sent_at = time.perf_counter()
+        rows = await asyncio.to_thread(insert_notifications, args.database_url, list(by_user))
+        deadline = time.perf_counter() + args.deliver_timeout
+        while time.perf_counter() < deadline and any(r.id not in by_user[r.user_id].received for r in rows):
+            await asyncio.sleep(0.05)
+        latencies = [(by_user[r.user_id].received[r.id] - sent_at) * 1000.0 for r in rows if r.id in by_user[r.user_id].received]
+        delivery = {"sent": len(rows), "delivered": len(latencies)}
+        if latencies:
+            arr = np.array(latencies)
+            delivery.update({
+                "p50_ms": round(float(np.percentile(arr, 50)), 1),
+                "p95_ms": round(float(np.percentile(arr, 95)), 1),
+                "max_ms": round(float(arr.max()), 1),
+            })
+
+    await asyncio.sleep(args.hold)
+    stop.set()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    connected = [s for s in streams if s.connected]
+    errors = [s.error for s in streams if s.error]
+    connect_ms = np.array([s.connect_ms for s in connected]) if connected else np.array([0.0])
+    result = {
+        "requested": args.connections,
+        "connected": len(connected),
+        "dropped_or_failed": len(errors),
+        "sample_errors": sorted(set(errors))[:5],
+        "ramp_s": round(ramp_s, 2),
+        "connect_p50_ms": round(float(np.percentile(connect_ms, 50)), 1),
+        "connect_p95_ms": round(float(np.percentile(connect_ms, 95)), 1),
+        "heartbeats_per_stream": round(sum(s.heartbeats for s in connected) / max(len(connected), 1), 2),
+        "server": server_stats,
+        "delivery": delivery,
+    }
+    if baseline_rss and loaded_rss:
+        result["server_rss_mb"] = {"idle": round(baseline_rss / 1024, 1), "loaded": round(loaded_rss / 1024, 1)}
+        result["server_kb_per_connection"] = round((loaded_rss - baseline_rss) / max(len(connected), 1), 1)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent idle SSE connections held by one worker")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--connections", type=int, default=5000)
+    parser.add_argument("--first-user-id", type=int, default=1)
+    parser.add_argument("--ramp-batch", type=int, default=500, help="connections opened per 50ms step")
+    parser.add_argument("--connect-timeout", type=float, default=60.0)
+    parser.add_argument("--hold", type=float, default=20.0, help="seconds to keep the streams idle")
+    parser.add_argument("--server-pid", type=int, help="uvicorn worker pid, for RSS (same host only)")
+    parser.add_argument("--database-url", help="the server's database, to measure delivery latency")
+    parser.add_argument("--deliver-sample", type=int, default=200)
+    parser.add_argument("--deliver-timeout", type=float, default=10.0)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
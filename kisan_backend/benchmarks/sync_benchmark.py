@@ -0,0 +1,138 @@
+# benchmarks/sync_benchmark.py
+# What a reconnecting phone pays: a full sync of market prices, schemes and notifications vs. a
+# delta sync after --changes rows changed, at a few table sizes, with the payload encoded as the
+# old per-row JSON objects, /sync's tabular JSON and tabular msgpack (each also gzipped).
+#
+#   python benchmarks/sync_benchmark.py --sizes 1000,10000,50000 --changes 50
+#
+# Seeds a throwaway SQLite file per size and prints JSON. Times are server-side query + encode.
+import argparse
+import datetime
+import gzip
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+import msgpack
+import orjson
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+USER_ID = 1
+PAGE = 5000
+
+
+def seed(engine, prices, rng):
+    from sqlalchemy import insert
+
+    from app.models.migrations import upgrade_schema
+    from app.models.models import Base, MarketPrice, Notification, Scheme, User
+
+    Base.metadata.create_all(engine)
+    upgrade_schema(engine, Base.metadata)
+    today = datetime.date.today()
+    with engine.begin() as conn:
+        conn.execute(insert(User), [{"id": USER_ID, "phone": "+910000000001"}])
+        conn.execute(insert(MarketPrice), [
+            {"crop": f"Crop {i % 40}", "mandi": f"Mandi {i // 40}", "crop_key": f"crop {i % 40}", "mandi_key": f"mandi {i // 40}",
+             "price": round(rng.uniform(500, 5000), 2), "trend": rng.choice(("up", "down", "stable")), "price_date": today}
+            for i in range(prices)
+        ])
+        conn.execute(insert(Scheme), [
+            {"name": f"Scheme {i}", "benefits": "Rs 6,000 per year in three instalments", "docs_needed": "Aadhaar, land record",
+             "eligibility_criteria": "{}", "deadline": datetime.datetime(2027, 3, 31)}
+            for i in range(max(prices // 500, 10))
+        ])
+        conn.execute(insert(Notification), [
+            {"user_id": USER_ID, "type": "price_alert", "content": f"Tomato crossed Rs {i}", "read_flag": False}
+            for i in range(max(prices // 200, 20))
+        ])
+
+
+def change_rows(engine, count, rng):
+    from sqlalchemy import text
+
+    with engine.begin() as conn:
+        ids = [r[0] for r in conn.execute(text("SELECT id FROM market_prices ORDER BY random() LIMIT :n"), {"n": count})]
+        for row_id in ids:
+            conn.execute(text("UPDATE market_prices SET price = :p WHERE id = :id"), {"p": round(rng.uniform(500, 5000), 2), "id": row_id})
+        conn.execute(text("UPDATE notifications SET read_flag = 1 WHERE id = (SELECT min(id) FROM notifications)"))
+        conn.execute(text("DELETE FROM schemes WHERE id = (SELECT max(id) FROM schemes)"))
+
+
+def as_objects(page):
+    # The old shape: every row a dict repeating its keys
+    return {name: [dict(zip(s["columns"], r)) for r in s["rows"]] for name, s in page["changes"].items()}
+
+
+def sync_all(engine, cursor):
+    """Drain every page from cursor; returns (pages, cursor, seconds)."""
+    from app.models.sync import changes
+
+    pages = []
+    started = time.perf_counter()
+    while True:
+        with engine.connect() as conn:
+            page = changes(conn, USER_ID, cursor, PAGE)
+        pages.append(page)
+        cursor = page["cursor"]
+        if not page["has_more"]:
+            return pages, cursor, time.perf_counter() - started
+
+
+def encodings(pages):
+    out = {}
+    for name, encode in (("json_objects", lambda p: orjson.dumps(as_objects(p))), ("json_tabular", orjson.dumps), ("msgpack", msgpack.packb)):
+        started = time.perf_counter()
+        bodies = [encode(p) for p in pages]
+        encode_ms = (time.perf_counter() - started) * 1000.0
+        out[name] = {"bytes": sum(map(len, bodies)), "gzip_bytes": sum(len(gzip.compress(b, 6)) for b in bodies),
+                     "encode_ms": round(encode_ms, 2)}
+    return out
+
+
+def rows_in(pages):
+    return sum(len(s["rows"]) for p in pages for s in p["changes"].values()) + sum(len(p["deleted"]["rows"]) for p in pages)
+
+
+def run_size(prices, changes, rng):
+    from sqlalchemy import create_engine
+
+    tmpdir = tempfile.mkdtemp(prefix="kisan_bench_")
+    path = os.path.join(tmpdir, "sync.db")
+    engine = create_engine(f"sqlite:///{path}")
+    try:
+        seed(engine, prices, rng)
+        full, cursor, full_s = sync_all(engine, None)
+        change_rows(engine, changes, rng)
+        delta, _, delta_s = sync_all(engine, cursor)
+        return {
+            "full": {"pages": len(full), "rows": rows_in(full), "query_ms": round(full_s * 1000.0, 2), **encodings(full)},
+            "delta": {"pages": len(delta), "rows": rows_in(delta), "query_ms": round(delta_s * 1000.0, 2), **encodings(delta)},
+        }
+    finally:
+        engine.dispose()
+        for name in os.listdir(tmpdir):
+            os.remove(os.path.join(tmpdir, name))
+        os.rmdir(tmpdir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Full vs. delta sync cost and payload size")
+    parser.add_argument("--sizes", default="1000,10000,50000", help="comma-separated market_prices row counts")
+    parser.add_argument("--changes", type=int, default=50, help="price rows updated between the two syncs")
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    results = {}
+    for size in (int(s) for s in args.sizes.split(",")):
+        results[size] = run_size(size, args.changes, rng)
+    print(json.dumps({"changes": args.changes, "page_rows": PAGE, "by_table_size": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
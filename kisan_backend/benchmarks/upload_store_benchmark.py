@@ -0,0 +1,109 @@
+# benchmarks/upload_store_benchmark.py
+# Storing /predict uploads: the old path (await image.read(), then write under the client's
+# filename) vs. the content-addressed store (chunked copy, hashed, deduplicated). Reports peak
+# Python memory per upload, time per upload, and files/bytes on disk after a workload where
+# --duplicate-ratio of the uploads re-send an earlier photo under the same name ("image.jpg").
+#
+#   python benchmarks/upload_store_benchmark.py --uploads 200 --size-kb 2048 --duplicate-ratio 0.3
+#
+# Works on spooled temp files like the ones Starlette hands to UploadFile; prints JSON.
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def make_uploads(count, size, duplicate_ratio, rng):
+    photos = []
+    for _ in range(count):
+        if photos and rng.random() < duplicate_ratio:
+            photos.append(rng.choice(photos))
+        else:
+            # JPEG magic so the store files it as .jpg; the rest is incompressible noise
+            photos.append(b"\xff\xd8\xff" + rng.randbytes(size - 3))
+    return photos
+
+
+def spooled(data):
+    # What UploadFile wraps: in memory up to 1 MB, then a temp file
+    f = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    f.write(data)
+    f.seek(0)
+    return f
+
+
+async def store_before(fileobj, upload_dir):
+    from starlette.datastructures import UploadFile
+
+    image = UploadFile(fileobj, filename="image.jpg")
+    os.makedirs(upload_dir, exist_ok=True)
+    with open(os.path.join(upload_dir, image.filename), "wb") as f:
+        f.write(await image.read())
+
+
+async def store_after(fileobj, store, max_bytes):
+    await asyncio.to_thread(store.save, fileobj, max_bytes)
+
+
+def disk_usage(path):
+    files = total = 0
+    for dirpath, _, names in os.walk(path):
+        for name in names:
+            files += 1
+            total += os.path.getsize(os.path.join(dirpath, name))
+    return files, total
+
+
+def run(photos, store_one):
+    tracemalloc.start()
+    peaks, started = [], time.perf_counter()
+    for data in photos:
+        fileobj = spooled(data)  # built outside the measured peak
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        asyncio.run(store_one(fileobj))
+        peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+    elapsed = time.perf_counter() - started
+    tracemalloc.stop()
+    return {"ms_per_upload": round(elapsed * 1000.0 / len(photos), 3), "peak_kb_per_upload": round(max(peaks) / 1024, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Old upload save vs. the content-addressed store")
+    parser.add_argument("--uploads", type=int, default=200)
+    parser.add_argument("--size-kb", type=int, default=2048, help="bytes per photo, in KiB")
+    parser.add_argument("--duplicate-ratio", type=float, default=0.3, help="share of uploads re-sending an earlier photo")
+    args = parser.parse_args()
+
+    from app.models.upload_store import UploadStore
+
+    photos = make_uploads(args.uploads, args.size_kb * 1024, args.duplicate_ratio, random.Random(1))
+    workdir = tempfile.mkdtemp(prefix="kisan_bench_")
+    try:
+        before_dir = os.path.join(workdir, "before")
+        store = UploadStore(os.path.join(workdir, "after"))
+        before = run(photos, lambda f: store_before(f, before_dir))
+        before["files"], before["bytes_on_disk"] = disk_usage(before_dir)
+        after = run(photos, lambda f: store_after(f, store, args.size_kb * 1024))
+        after["files"], after["bytes_on_disk"] = disk_usage(store.root)
+        after.update(store.stats())
+    finally:
+        shutil.rmtree(workdir)
+    print(json.dumps({
+        "uploads": args.uploads, "size_kb": args.size_kb, "distinct_photos": len(set(map(id, photos))),
+        # "before" keeps one file: every upload named image.jpg overwrote the last
+        "before": before, "after": after,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()